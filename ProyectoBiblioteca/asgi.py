@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProyectoBiblioteca.settings')
 
 application = get_asgi_application()
+
+# El índice del autocompletado se construye al arrancar cada proceso web, no
+# en la primera petición que lo usa
+from sril.autocompletado import precargar_indice  # noqa: E402
+
+precargar_indice()
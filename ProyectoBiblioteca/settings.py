@@ -81,6 +81,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'sril.middleware.RegistroConsultasMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -161,3 +162,61 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Páginas que se leen de cada PDF (repartidas por todo el documento) para
+# estimar las palabras por página y el tiempo de lectura
+PAGINAS_MUESTRA_LECTURA = 8
+
+# Libros por página en el catálogo (también se puede elegir 12, 24, 48 o 96)
+LIBROS_POR_PAGINA = 24
+
+# Ids que se ordenan por relevancia en cada búsqueda (sril/busqueda.py): en el
+# catálogo y solo dentro de los PDFs. El total y las facetas cuentan todas las
+# coincidencias; la lista avisa cuando muestra solo las más relevantes
+BUSQUEDA_MAXIMO_CATALOGO = 1000
+BUSQUEDA_MAXIMO_CONTENIDO = 200
+
+# Registro de consultas SQL por petición (cabeceras X-Consultas / X-Tiempo-SQL
+# e informe de consultas repetidas). Solo para desarrollo y staging
+REGISTRO_CONSULTAS = DEBUG
+# Presupuesto para las vistas que no declaran uno con @presupuesto_consultas
+PRESUPUESTO_CONSULTAS = None
+# A partir de cuántas repeticiones de la misma consulta se avisa
+UMBRAL_CONSULTAS_REPETIDAS = 3
+
+# Caché de página completa para visitantes anónimos (home, catálogo y detalle).
+# Las señales invalidan las páginas afectadas; una página caducada se sigue
+# sirviendo hasta CACHE_PAGINAS_STALE_SEGUNDOS mientras se regenera
+CACHE_PAGINAS_ACTIVA = True
+CACHE_PAGINAS_SEGUNDOS = 300
+CACHE_PAGINAS_STALE_SEGUNDOS = 3600
+
+# Caducidad de los conteos de categorías del catálogo (sril/facetas.py): las
+# señales solo invalidan la caché del proceso que hizo el cambio
+FACETAS_CATALOGO_SEGUNDOS = 300
+
+# Vecinos precalculados por libro en la tabla LibroSimilar (sril/similares.py)
+SIMILARES_POR_LIBRO = 12
+
+# Vecinos por libro del filtrado colaborativo (manage.py recalcular_vecinos_colaborativos)
+VECINOS_COLABORATIVOS_POR_LIBRO = 20
+
+# Listas de recomendaciones materializadas: el worker (manage.py
+# refrescar_recomendaciones) recalcula un usuario cuando lleva estos segundos
+# sin cambiar sus puntuaciones, preferencias o historial
+RECOMENDACIONES_ESPERA_SEGUNDOS = 10
+
+# Índice de vectores de contenido (sril/vectores.py), compartido entre procesos
+# con memmap: manage.py reconstruir_vectores lo crea
+INDICE_VECTORES_DIR = os.path.join(BASE_DIR, 'indices', 'vectores')
+VECTORES_DIMENSIONES = 128
+VECTORES_TERMINOS = 20000
+
+# Puntuación híbrida de las recomendaciones (sril/hibrido.py): interés del
+# usuario en las categorías, rating bayesiano, popularidad y novedad
+PESOS_RECOMENDACION = {'interes': 0.45, 'rating': 0.30, 'popularidad': 0.15, 'recencia': 0.10}
+# Puntuaciones "virtuales" con la media global que suavizan el rating de cada libro
+RECOMENDACION_PUNTUACIONES_PREVIAS = 10
+RECOMENDACION_VIDA_MEDIA_DIAS = 180
+# Antigüedad máxima de los arrays del catálogo que guarda cada proceso
+RECOMENDACION_CATALOGO_SEGUNDOS = 600
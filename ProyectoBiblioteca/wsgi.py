@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProyectoBiblioteca.settings')
 
 application = get_wsgi_application()
+
+# El índice del autocompletado se construye al arrancar cada proceso web, no
+# en la primera petición que lo usa
+from sril.autocompletado import precargar_indice  # noqa: E402
+
+precargar_indice()
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from .admin_site import mi_biblioteca_admin
-from .models import Usuario, Categoria, Libro, PreferenciaUsuario, Puntuacion, HistorialLectura, LibroCategoria
+from .models import Usuario, Categoria, Libro, PreferenciaUsuario, Puntuacion, HistorialLectura, LibroCategoria, TareaProcesamiento, LoteTareas
 from django.utils.html import format_html
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import path, reverse
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import AdminPasswordChangeForm
 
@@ -38,18 +41,18 @@ class LibroCategoriaInline(admin.TabularInline):
     extra = 1
 
 class LibroAdmin(admin.ModelAdmin):
-    list_display = ('titulo', 'autor', 'numero_paginas', 'disponible_descarga', 'tiene_archivo', 'tiene_portada', 'activo')
-    list_filter = ('activo', 'disponible_descarga', 'categorias', 'fecha_publicacion')
+    list_display = ('titulo', 'autor', 'numero_paginas', 'rating_avg', 'disponible_descarga', 'tiene_archivo', 'tiene_portada', 'estado_procesamiento', 'activo')
+    list_filter = ('activo', 'disponible_descarga', 'estado_procesamiento', 'categorias', 'fecha_publicacion')
     search_fields = ('titulo', 'autor', 'isbn')
     inlines = [LibroCategoriaInline]
-    readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'info_archivo', 'vista_previa_portada')
+    readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'info_archivo', 'vista_previa_portada', 'estado_procesamiento')
     
     fieldsets = (
         ('Información Básica', {
             'fields': ('titulo', 'autor', 'isbn', 'sinopsis')
         }),
         ('Archivos', {
-            'fields': ('archivo_pdf', 'disponible_descarga', 'portada', 'vista_previa_portada', 'info_archivo')
+            'fields': ('archivo_pdf', 'disponible_descarga', 'portada', 'vista_previa_portada', 'info_archivo', 'estado_procesamiento')
         }),
         ('Detalles', {
             'fields': ('fecha_publicacion', 'editorial')
@@ -86,9 +89,9 @@ class LibroAdmin(admin.ModelAdmin):
     def vista_previa_portada(self, obj):
         if obj.portada:
             try:
-                # Usar la URL correcta para el admin
-                from django.conf import settings
-                portada_url = obj.portada.url
+                # Usar el derivado reducido para la vista previa del admin
+                from .portadas import url_derivado, ANCHOS_PORTADA
+                portada_url = url_derivado(obj.portada, ANCHOS_PORTADA['admin'], 'jpg')
                 
                 return format_html(
                     '''
@@ -119,7 +122,7 @@ class LibroAdmin(admin.ModelAdmin):
                     <div style="font-size: 48px; color: #6c757d;">📚</div>
                     <div style="color: #6c757d; margin-top: 16px;">
                         <strong>Portada no generada</strong><br>
-                        <small>Se creará automáticamente al guardar con un PDF</small>
+                        <small>Se creará en segundo plano al guardar con un PDF</small>
                     </div>
                 </div>
                 '''
@@ -127,27 +130,62 @@ class LibroAdmin(admin.ModelAdmin):
     vista_previa_portada.short_description = 'Vista Previa de Portada'
     
     def regenerar_portadas(self, request, queryset):
-        """Acción para regenerar portadas de libros seleccionados"""
-        count = 0
-        for libro in queryset:
-            if libro.archivo_pdf:
-                try:
-                    # Lógica simple de regeneración - eliminar portada existente
-                    if libro.portada:
-                        libro.portada.delete(save=False)
-                    # La portada se regenerará automáticamente al guardar
-                    libro.save()
-                    count += 1
-                    self.message_user(request, f"Portada regenerada para: {libro.titulo}")
-                except Exception as e:
-                    self.message_user(request, f"Error con {libro.titulo}: {str(e)}", level='ERROR')
-            else:
-                self.message_user(request, f"{libro.titulo} no tiene PDF", level='WARNING')
+        """Encolar las portadas como un lote y mostrar su progreso"""
+        from .tareas import encolar_lote
         
-        self.message_user(request, f"Procesadas {count} portadas")
+        con_pdf = queryset.exclude(archivo_pdf='').exclude(archivo_pdf__isnull=True).only('pk')
+        sin_pdf = queryset.count() - con_pdf.count()
+        if sin_pdf:
+            self.message_user(request, f"{sin_pdf} libros sin PDF se omitieron", level='WARNING')
+        if not con_pdf.exists():
+            return None
+        
+        # Se ignora la caché por huella para volver a renderizar solo la portada
+        lote = encolar_lote(
+            con_pdf,
+            descripcion=f"Regenerar portadas ({con_pdf.count()} libros)",
+            etapas=['portada'],
+            usuario=request.user,
+        )
+        self.message_user(request, f"Encoladas {lote.tareas.count()} portadas en el lote #{lote.pk}")
+        return HttpResponseRedirect(reverse(f'{self.admin_site.name}:sril_libro_lote', args=[lote.pk]))
     
     regenerar_portadas.short_description = " Regenerar portadas desde PDF"
     
+    def get_urls(self):
+        urls = [
+            path('lotes/<int:lote_id>/', self.admin_site.admin_view(self.progreso_lote_view),
+                 name='sril_libro_lote'),
+            path('lotes/<int:lote_id>/estado/', self.admin_site.admin_view(self.estado_lote_view),
+                 name='sril_libro_lote_estado'),
+        ]
+        return urls + super().get_urls()
+    
+    def progreso_lote_view(self, request, lote_id):
+        """Página de progreso de un lote; se actualiza sola consultando estado_lote_view"""
+        lote = get_object_or_404(LoteTareas, pk=lote_id)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"Lote #{lote.pk}: {lote.descripcion}",
+            'lote': lote,
+            'resumen': lote.resumen(),
+            'url_estado': reverse(f'{self.admin_site.name}:sril_libro_lote_estado', args=[lote.pk]),
+            'opts': self.model._meta,
+        }
+        return render(request, 'admin/sril/lote_progreso.html', context)
+    
+    def estado_lote_view(self, request, lote_id):
+        """Estado del lote en JSON: conteos por estado y libros que fallaron"""
+        lote = get_object_or_404(LoteTareas, pk=lote_id)
+        fallos = lote.tareas.filter(estado='FALLIDO').values('libro_id', 'libro__titulo', 'error')
+        return JsonResponse({
+            **lote.resumen(),
+            'fallos': [
+                {'libro_id': fallo['libro_id'], 'titulo': fallo['libro__titulo'], 'error': fallo['error']}
+                for fallo in fallos
+            ],
+        })
+    
     def activar_descargas(self, request, queryset):
         """Activar descargas para libros seleccionados"""
         updated = queryset.update(disponible_descarga=True)
@@ -164,18 +202,11 @@ class LibroAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         """Manejar el guardado del modelo"""
-        # Guardar primero el objeto
         super().save_model(request, obj, form, change)
         
-        # Generar portada si hay PDF pero no portada
-        if obj.archivo_pdf and not obj.portada:
-            self.message_user(request, "Generando portada desde PDF...")
-            try:
-                obj.generar_portada_desde_pdf()
-                obj.save()
-                self.message_user(request, "Portada generada exitosamente")
-            except Exception as e:
-                self.message_user(request, f"Error generando portada: {str(e)}", level='ERROR')
+        # El PDF se procesa en segundo plano (manage.py procesar_tareas)
+        if obj.estado_procesamiento == 'PENDIENTE':
+            self.message_user(request, "Procesamiento del PDF en cola: los metadatos y la portada se generarán en segundo plano")
 
 class CategoriaAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'total_libros', 'descripcion_corta')
@@ -199,6 +230,23 @@ class PreferenciaUsuarioAdmin(admin.ModelAdmin):
     list_filter = ('nivel_interes', 'categoria')
     search_fields = ('usuario__nombre', 'categoria__nombre')
 
+class TareaProcesamientoAdmin(admin.ModelAdmin):
+    list_display = ('libro', 'estado', 'forzar', 'lote', 'intentos', 'fecha_creacion', 'fecha_inicio', 'fecha_fin')
+    list_filter = ('estado', 'fecha_creacion')
+    search_fields = ('libro__titulo', 'error')
+    readonly_fields = ('libro', 'lote', 'intentos', 'error', 'fecha_creacion', 'fecha_inicio', 'fecha_fin')
+
+class LoteTareasAdmin(admin.ModelAdmin):
+    list_display = ('descripcion', 'creado_por', 'fecha_creacion', 'progreso')
+    readonly_fields = ('descripcion', 'creado_por', 'fecha_creacion')
+    
+    def progreso(self, obj):
+        url = reverse(f'{self.admin_site.name}:sril_libro_lote', args=[obj.pk])
+        resumen = obj.resumen()
+        return format_html('<a href="{}">{}/{} ({} fallidas)</a>',
+                           url, resumen['terminadas'], resumen['total'], resumen['estados']['FALLIDO'])
+    progreso.short_description = 'Progreso'
+
 class HistorialLecturaAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'libro', 'estado', 'porcentaje_lectura', 'fecha_inicio')
     list_filter = ('estado', 'fecha_inicio')
@@ -214,4 +262,6 @@ mi_biblioteca_admin.register(Libro, LibroAdmin)
 mi_biblioteca_admin.register(Categoria, CategoriaAdmin)
 mi_biblioteca_admin.register(Puntuacion, PuntuacionAdmin)
 mi_biblioteca_admin.register(PreferenciaUsuario, PreferenciaUsuarioAdmin)
-mi_biblioteca_admin.register(HistorialLectura, HistorialLecturaAdmin)
\ No newline at end of file
+mi_biblioteca_admin.register(HistorialLectura, HistorialLecturaAdmin)
+mi_biblioteca_admin.register(TareaProcesamiento, TareaProcesamientoAdmin)
+mi_biblioteca_admin.register(LoteTareas, LoteTareasAdmin)
\ No newline at end of file
@@ -32,15 +32,10 @@ class MiBibliotecaAdminSite(admin.AdminSite):
         )['avg_puntuacion'] or 0
         
         # Libros sin puntuación
-        libros_sin_puntuacion = Libro.objects.annotate(
-            num_puntuaciones=Count('puntuaciones')
-        ).filter(num_puntuaciones=0).count()
+        libros_sin_puntuacion = Libro.objects.filter(rating_count=0).count()
         
         # Libros mejor puntuados (top 10)
-        libros_mejor_puntuados = Libro.objects.annotate(
-            avg_rating=Avg('puntuaciones__puntuacion'),
-            num_ratings=Count('puntuaciones')
-        ).filter(num_ratings__gte=1).order_by('-avg_rating')[:10]
+        libros_mejor_puntuados = Libro.objects.filter(rating_count__gte=1).order_by('-rating_avg')[:10]
         
         # Usuarios más activos (más puntuaciones)
         usuarios_activos = Usuario.objects.annotate(
@@ -0,0 +1,238 @@
+# sril/autocompletado.py
+"""
+Índice de prefijos en memoria para el autocompletado del buscador.
+
+Cada proceso web lo construye con una sola consulta al arrancar
+(``precargar_indice`` desde ``wsgi.py``/``asgi.py``, en segundo plano) y
+después lo parchean las señales de ``Libro`` y ``Puntuacion``; cada tecla del
+buscador se resuelve en memoria, sin consultas a la base de datos. Si alguna
+petición llega antes, espera a que termine la construcción.
+
+Las claves (título y autor completos y cada una de sus palabras, sin tildes)
+están en una lista ordenada: un prefijo es un tramo contiguo que se localiza
+con ``bisect``. Sobre la popularidad de cada entrada hay un árbol de máximos,
+así que las N más populares de un tramo se sacan en O(N log n) aunque el
+prefijo coincida con decenas de miles de entradas.
+
+Los libros creados o renombrados después de construir el índice van a una
+lista pequeña de entradas extra; cuando crece demasiado se reconstruye a
+partir de los datos en memoria.
+
+El índice es local a cada proceso: con varios procesos cada uno aplica los
+cambios que hace él mismo y el resto los ve al reiniciar.
+"""
+import heapq
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+
+TIPOS = ('titulo', 'autor')
+LIMITE_EXTRA = 5000
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para que "jose" encuentre "José" """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+
+def _claves(texto):
+    """El texto completo y cada una de sus palabras, normalizados"""
+    completo = normalizar(texto)
+    if not completo:
+        return set()
+    return {completo, *completo.split()}
+
+
+def _entradas_libro(libro_id, titulo, autor):
+    return [(clave, 0, libro_id) for clave in _claves(titulo)] + \
+           [(clave, 1, libro_id) for clave in _claves(autor)]
+
+
+class _ArbolMaximos:
+    """Árbol de segmentos con el máximo de cada nodo; las hojas son las entradas"""
+
+    def __init__(self, valores):
+        self.tamano = 1
+        while self.tamano < max(1, len(valores)):
+            self.tamano *= 2
+        self.nodos = array('i', [-1]) * (2 * self.tamano)
+        self.nodos[self.tamano:self.tamano + len(valores)] = array('i', valores)
+        for nodo in range(self.tamano - 1, 0, -1):
+            self.nodos[nodo] = max(self.nodos[2 * nodo], self.nodos[2 * nodo + 1])
+
+    def fijar(self, posicion, valor):
+        nodo = self.tamano + posicion
+        self.nodos[nodo] = valor
+        nodo //= 2
+        while nodo:
+            self.nodos[nodo] = max(self.nodos[2 * nodo], self.nodos[2 * nodo + 1])
+            nodo //= 2
+
+    def mayores(self, inicio, fin):
+        """Posiciones de ``[inicio, fin)`` de mayor a menor valor (sin las anuladas, -1)"""
+        # A igual valor sale antes el nodo de mayor índice (el más profundo), así
+        # se baja directo a una hoja en lugar de recorrer los empates nivel a nivel
+        nodos = self.nodos
+        monticulo = []
+        izquierda, derecha = inicio + self.tamano, fin + self.tamano
+        while izquierda < derecha:
+            if izquierda & 1:
+                monticulo.append((-nodos[izquierda], -izquierda))
+                izquierda += 1
+            if derecha & 1:
+                derecha -= 1
+                monticulo.append((-nodos[derecha], -derecha))
+            izquierda //= 2
+            derecha //= 2
+        heapq.heapify(monticulo)
+        while monticulo:
+            valor, nodo = heapq.heappop(monticulo)
+            nodo = -nodo
+            if valor > 0:
+                return
+            if nodo >= self.tamano:
+                yield nodo - self.tamano
+            else:
+                heapq.heappush(monticulo, (-nodos[2 * nodo], -2 * nodo))
+                heapq.heappush(monticulo, (-nodos[2 * nodo + 1], -2 * nodo - 1))
+
+
+class IndicePrefijos:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.construido = False
+        self._cargar({})
+
+    def construir(self, libros):
+        """Cargar desde un iterable de ``(id, titulo, autor, popularidad)``"""
+        self._cargar({libro_id: [titulo, autor, popularidad] for libro_id, titulo, autor, popularidad in libros})
+        self.construido = True
+
+    def _cargar(self, datos):
+        entradas = []
+        for libro_id, (titulo, autor, _) in datos.items():
+            entradas.extend(_entradas_libro(libro_id, titulo, autor))
+        entradas.sort()
+
+        posiciones = {}
+        for posicion, (_, _, libro_id) in enumerate(entradas):
+            posiciones.setdefault(libro_id, []).append(posicion)
+
+        with self._lock:
+            self._libros = datos                  # libro_id -> [titulo, autor, popularidad]
+            self._claves = [entrada[0] for entrada in entradas]
+            self._tipos = array('b', (entrada[1] for entrada in entradas))
+            self._ids = array('q', (entrada[2] for entrada in entradas))
+            self._posiciones = posiciones         # libro_id -> posiciones en la lista base
+            self._arbol = _ArbolMaximos([datos[entrada[2]][2] for entrada in entradas])
+            self._extra = []                      # entradas de libros nuevos o renombrados
+
+    def actualizar(self, libro_id, titulo, autor, popularidad):
+        with self._lock:
+            self._quitar(libro_id)
+            self._libros[libro_id] = [titulo, autor, popularidad]
+            for entrada in _entradas_libro(libro_id, titulo, autor):
+                insort(self._extra, entrada)
+            if len(self._extra) > LIMITE_EXTRA:
+                self._cargar(self._libros)
+
+    def eliminar(self, libro_id):
+        with self._lock:
+            self._quitar(libro_id)
+            self._libros.pop(libro_id, None)
+
+    def ajustar_popularidad(self, libro_id, delta):
+        with self._lock:
+            datos = self._libros.get(libro_id)
+            if datos is None:
+                return
+            datos[2] = max(0, datos[2] + delta)
+            for posicion in self._posiciones.get(libro_id, ()):
+                self._arbol.fijar(posicion, datos[2])
+
+    def _quitar(self, libro_id):
+        # Las entradas base se anulan en el árbol; las extra se borran de la lista
+        for posicion in self._posiciones.pop(libro_id, ()):
+            self._arbol.fijar(posicion, -1)
+        datos = self._libros.get(libro_id)
+        if datos is not None:
+            for entrada in _entradas_libro(libro_id, datos[0], datos[1]):
+                posicion = bisect_left(self._extra, entrada)
+                if posicion < len(self._extra) and self._extra[posicion] == entrada:
+                    del self._extra[posicion]
+
+    def completar(self, prefijo, limite=8):
+        """
+        Las ``limite`` sugerencias más populares que empiezan por ``prefijo``.
+        Los autores se agrupan: su popularidad es la del más puntuado de sus libros.
+        """
+        prefijo = normalizar(prefijo)
+        if not prefijo:
+            return []
+        tope = prefijo + '\uffff'
+
+        with self._lock:
+            candidatos = {}
+            inicio = bisect_left(self._claves, prefijo)
+            fin = bisect_left(self._claves, tope, lo=inicio)
+            # El árbol entrega de más a menos popular: con ``limite`` sugerencias
+            # distintas ninguna entrada base restante puede superarlas
+            for posicion in self._arbol.mayores(inicio, fin):
+                self._agregar(candidatos, self._tipos[posicion], self._ids[posicion])
+                if len(candidatos) >= limite:
+                    break
+
+            posicion = bisect_left(self._extra, (prefijo,))
+            while posicion < len(self._extra) and self._extra[posicion][0] < tope:
+                _, tipo, libro_id = self._extra[posicion]
+                self._agregar(candidatos, tipo, libro_id)
+                posicion += 1
+
+        return heapq.nlargest(limite, candidatos.values(), key=lambda c: (c['popularidad'], -len(c['texto'])))
+
+    def _agregar(self, candidatos, tipo, libro_id):
+        titulo, autor, popularidad = self._libros[libro_id]
+        clave = (0, libro_id) if tipo == 0 else (1, autor)
+        actual = candidatos.get(clave)
+        if actual is None or popularidad > actual['popularidad']:
+            candidatos[clave] = {
+                'texto': titulo if tipo == 0 else autor,
+                'tipo': TIPOS[tipo],
+                'libro_id': libro_id if tipo == 0 else None,
+                'popularidad': popularidad,
+            }
+
+
+indice = IndicePrefijos()
+_lock_construccion = threading.Lock()
+
+
+def obtener_indice():
+    """El índice del proceso, construido con una consulta en el primer uso"""
+    if not indice.construido:
+        with _lock_construccion:
+            if not indice.construido:
+                from .models import Libro
+                indice.construir(
+                    Libro.objects.filter(activo=True).values_list('id', 'titulo', 'autor', 'rating_count').iterator()
+                )
+    return indice
+
+
+def precargar_indice():
+    """Construir el índice en un hilo aparte para no retrasar el arranque del servidor"""
+    def construir():
+        from django.db import DatabaseError, connection
+
+        try:
+            obtener_indice()
+        except DatabaseError as e:
+            # Sin migrar todavía: se construirá con el primer autocompletado
+            print(f"⚠️ Índice de autocompletado no precargado: {e}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=construir, name='precarga-autocompletado', daemon=True).start()
@@ -0,0 +1,201 @@
+# sril/busqueda.py
+"""
+Búsqueda de texto completo con SQLite FTS5.
+
+Hay dos índices, ambos con rowid = id del libro:
+
+- ``sril_libro_fts``: título, autor, editorial y sinopsis. Es de contenido
+  externo sobre ``sril_libro`` y lo mantienen triggers (migración 0010).
+- ``sril_libro_contenido_fts``: la sinopsis y la capa de texto de cada PDF.
+  El texto se extrae en segundo plano en la etapa ``texto`` del pipeline; la
+  sinopsis se sincroniza con señales.
+
+Los dos ignoran tildes (``remove_diacritics``). En bases de datos que no son
+SQLite todas las funciones son no-ops.
+
+El ranking por BM25 se corta en ``BUSQUEDA_MAXIMO_CATALOGO`` y
+``BUSQUEDA_MAXIMO_CONTENIDO`` ids (ordenar todo el resultado no sirve para
+paginar). El total y las facetas se cuentan aparte sobre todas las
+coincidencias con ``filtro_coincidencias``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+TABLA_CATALOGO = 'sril_libro_fts'
+TABLA_CONTENIDO = 'sril_libro_contenido_fts'
+
+# Pesos BM25 por columna: titulo, autor, editorial, sinopsis
+PESOS_CATALOGO = (10.0, 5.0, 2.0, 1.0)
+
+# Pesos BM25 por columna: sinopsis, contenido
+PESOS_CONTENIDO = (2.0, 1.0)
+
+# Marcadores que FTS5 pone alrededor de los términos en el fragmento
+_INICIO, _FIN = '\x02', '\x03'
+
+
+def fts_disponible():
+    return connection.vendor == 'sqlite'
+
+
+def consulta_fts(texto, prefijo=False):
+    """
+    Convertir lo que escribió el usuario en una consulta FTS5 segura:
+    cada palabra entre comillas (sin operadores) y todas obligatorias.
+    """
+    palabras = re.findall(r'\w+', texto or '')
+    if not palabras:
+        return ''
+    sufijo = '*' if prefijo else ''
+    return ' '.join(f'"{palabra}"{sufijo}' for palabra in palabras)
+
+
+def indexar_contenido(libro_id, sinopsis, contenido):
+    """Reemplazar la fila del libro en el índice de contenido"""
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_CONTENIDO} WHERE rowid = %s', [libro_id])
+        cursor.execute(
+            f'INSERT INTO {TABLA_CONTENIDO} (rowid, sinopsis, contenido) VALUES (%s, %s, %s)',
+            [libro_id, sinopsis or '', contenido or '']
+        )
+
+
+def actualizar_sinopsis(libro_id, sinopsis):
+    """Actualizar solo la sinopsis, conservando el texto del PDF ya indexado"""
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {TABLA_CONTENIDO} SET sinopsis = %s WHERE rowid = %s',
+            [sinopsis or '', libro_id]
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                f'INSERT INTO {TABLA_CONTENIDO} (rowid, sinopsis, contenido) VALUES (%s, %s, %s)',
+                [libro_id, sinopsis or '', '']
+            )
+
+
+def contenido_indexado(libro_id):
+    """Texto del PDF ya indexado para un libro (o None)"""
+    if not fts_disponible():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT contenido FROM {TABLA_CONTENIDO} WHERE rowid = %s', [libro_id])
+        fila = cursor.fetchone()
+    return fila[0] if fila and fila[0] else None
+
+
+def eliminar_del_indice(libro_id):
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_CONTENIDO} WHERE rowid = %s', [libro_id])
+
+
+def buscar_catalogo(texto, limite=None):
+    """
+    Buscar en título, autor, editorial y sinopsis. Cada palabra se trata como
+    prefijo ("cien años" encuentra "Cien años de soledad" y "centenario" no).
+    Devuelve los ids de los libros ordenados por BM25.
+    """
+    consulta = consulta_fts(texto, prefijo=True)
+    if not consulta or not fts_disponible():
+        return []
+    if limite is None:
+        limite = getattr(settings, 'BUSQUEDA_MAXIMO_CATALOGO', 1000)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''SELECT rowid FROM {TABLA_CATALOGO}
+                WHERE {TABLA_CATALOGO} MATCH %s
+                ORDER BY bm25({TABLA_CATALOGO}, %s, %s, %s, %s)
+                LIMIT %s''',
+            [consulta, *PESOS_CATALOGO, limite]
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar_libros(texto):
+    """
+    Ranking combinado para el buscador: primero las coincidencias en los
+    datos del catálogo y después las que solo aparecen dentro del PDF.
+    Devuelve None si FTS5 no está disponible.
+    """
+    if not fts_disponible():
+        return None
+    ids = buscar_catalogo(texto)
+    vistos = set(ids)
+    ids.extend(libro_id for libro_id in buscar_contenido(texto) if libro_id not in vistos)
+    return ids
+
+
+def buscar_contenido(texto, limite=None):
+    """
+    Buscar en sinopsis y contenido de los PDFs.
+    Devuelve los ids de los libros encontrados, ordenados por relevancia.
+    """
+    consulta = consulta_fts(texto)
+    if not consulta or not fts_disponible():
+        return []
+    if limite is None:
+        limite = getattr(settings, 'BUSQUEDA_MAXIMO_CONTENIDO', 200)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''SELECT rowid FROM {TABLA_CONTENIDO}
+                WHERE {TABLA_CONTENIDO} MATCH %s
+                ORDER BY bm25({TABLA_CONTENIDO}, %s, %s)
+                LIMIT %s''',
+            [consulta, *PESOS_CONTENIDO, limite]
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def filtro_coincidencias(texto):
+    """
+    ``Q`` con todos los libros que coinciden con ``texto`` en cualquiera de
+    los dos índices, sin el corte del ranking: para contar el total y las
+    facetas con una subconsulta. None si FTS5 no está disponible.
+    """
+    if not fts_disponible():
+        return None
+    catalogo, contenido = consulta_fts(texto, prefijo=True), consulta_fts(texto)
+    if not catalogo:
+        return Q(pk__in=[])
+    return Q(pk__in=RawSQL(
+        f'''SELECT rowid FROM {TABLA_CATALOGO} WHERE {TABLA_CATALOGO} MATCH %s
+            UNION SELECT rowid FROM {TABLA_CONTENIDO} WHERE {TABLA_CONTENIDO} MATCH %s''',
+        [catalogo, contenido]
+    ))
+
+
+def fragmentos_contenido(texto, libro_ids):
+    """
+    Fragmento HTML con los términos resaltados para cada libro de ``libro_ids``.
+    ``snippet()`` recorre el texto completo de cada PDF, así que solo se pide
+    para los libros que se van a mostrar.
+    """
+    consulta = consulta_fts(texto)
+    libro_ids = list(libro_ids)
+    if not consulta or not libro_ids or not fts_disponible():
+        return {}
+    marcadores = ', '.join(['%s'] * len(libro_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''SELECT rowid, snippet({TABLA_CONTENIDO}, -1, %s, %s, '…', 24)
+                FROM {TABLA_CONTENIDO}
+                WHERE {TABLA_CONTENIDO} MATCH %s AND rowid IN ({marcadores})''',
+            [_INICIO, _FIN, consulta, *libro_ids]
+        )
+        return {libro_id: fragmento_html(fragmento) for libro_id, fragmento in cursor.fetchall()}
+
+
+def fragmento_html(fragmento):
+    """Escapar el fragmento y resaltar los términos encontrados con <mark>"""
+    return escape(fragmento).replace(_INICIO, '<mark>').replace(_FIN, '</mark>')
@@ -0,0 +1,175 @@
+# sril/cache_paginas.py
+"""
+Caché de página completa para visitantes anónimos.
+
+Solo se cachean las peticiones GET sin cookie de sesión ni mensajes
+pendientes: sin sesión no hay usuario autenticado, así que la página es la
+misma para todos y ni siquiera hace falta consultar la sesión. Los usuarios
+autenticados siguen con el renderizado dinámico.
+
+Invalidación por etiquetas: cada página guarda la versión de sus etiquetas
+(``catalogo``, ``categorias``, ``libro:<id>``) en el momento de generarse y
+las señales suben esas versiones cuando cambian ``Libro``, ``Puntuacion``,
+``Categoria`` o ``LibroCategoria``. Una página con alguna etiqueta más nueva
+ya no es fresca.
+
+Stale-while-revalidate: una página caducada o invalidada se sigue sirviendo
+durante ``CACHE_PAGINAS_STALE_SEGUNDOS`` mientras una sola petición (la que
+consigue el candado en la caché) la regenera.
+
+Las versiones viven en la caché de Django: con varios procesos (servidor y
+worker) hace falta un backend compartido en ``CACHES`` para que los cambios
+de uno invaliden las páginas del otro; con la caché local por defecto cada
+proceso solo ve sus propios cambios y ``CACHE_PAGINAS_SEGUNDOS`` acota el
+desfase.
+
+Las respuestas llevan ``Vary: Cookie`` y la clave incluye las cabeceras de
+``Vary`` que declare la vista, como hace ``django.middleware.cache``.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re, patch_vary_headers
+
+PREFIJO = 'sril:pagina'
+SEGUNDOS_CANDADO = 30
+
+
+def _ajuste(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+# Versiones de etiquetas
+
+def _clave_etiqueta(etiqueta):
+    return f'{PREFIJO}:etiqueta:{etiqueta}'
+
+
+def versiones_etiquetas(etiquetas):
+    """``{etiqueta: versión}``; las que aún no existen empiezan en 0"""
+    claves = {_clave_etiqueta(etiqueta): etiqueta for etiqueta in etiquetas}
+    guardadas = cache.get_many(list(claves))
+    return {etiqueta: guardadas.get(clave, 0) for clave, etiqueta in claves.items()}
+
+
+def invalidar_etiquetas(*etiquetas):
+    """Subir la versión de las etiquetas: las páginas que las usan dejan de ser frescas"""
+    for etiqueta in etiquetas:
+        clave = _clave_etiqueta(etiqueta)
+        # add() crea la etiqueta si no existía; incr() es atómico en los backends habituales
+        if not cache.add(clave, 1, None):
+            try:
+                cache.incr(clave)
+            except ValueError:
+                cache.set(clave, 1, None)
+
+
+def etiquetar_pagina(request, *etiquetas):
+    """Añadir etiquetas desde la vista (p. ej. los libros similares de un detalle)"""
+    if hasattr(request, '_etiquetas_pagina'):
+        request._etiquetas_pagina.update(etiquetas)
+
+
+# Claves de página
+
+def _es_cacheable(request):
+    return (
+        _ajuste('CACHE_PAGINAS_ACTIVA', True)
+        and request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and 'messages' not in request.COOKIES
+    )
+
+
+def _clave_url(request):
+    return hashlib.sha256(request.build_absolute_uri().encode('utf-8')).hexdigest()
+
+
+def _clave_pagina(request, url, cabeceras):
+    valores = '|'.join(request.META.get('HTTP_' + cabecera.upper().replace('-', '_'), '') for cabecera in cabeceras)
+    return f"{PREFIJO}:{url}:{hashlib.sha256(valores.encode('utf-8')).hexdigest()}"
+
+
+def _cabeceras_vary(response):
+    if not response.has_header('Vary'):
+        return []
+    return sorted({
+        cabecera.strip().lower() for cabecera in cc_delim_re.split(response['Vary'])
+        if cabecera.strip() and cabecera.strip().lower() != 'cookie'
+    })
+
+
+def _respuesta_desde_cache(entrada, estado):
+    response = HttpResponse(entrada['contenido'], status=entrada['estado'])
+    for cabecera, valor in entrada['cabeceras'].items():
+        response[cabecera] = valor
+    response['X-Cache-Pagina'] = estado
+    return response
+
+
+def cache_pagina_anonima(*etiquetas):
+    """
+    Decorador de vista. Las ``etiquetas`` pueden incluir ``{argumento}`` de la
+    URL, p. ej. ``@cache_pagina_anonima('libro:{libro_id}', 'categorias')``.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not _es_cacheable(request):
+                return vista(request, *args, **kwargs)
+
+            frescura = _ajuste('CACHE_PAGINAS_SEGUNDOS', 300)
+            margen = _ajuste('CACHE_PAGINAS_STALE_SEGUNDOS', 3600)
+            url = _clave_url(request)
+            clave_vary = f'{PREFIJO}:vary:{url}'
+            clave_candado = f'{PREFIJO}:candado:{url}'
+            candado = False
+
+            cabeceras = cache.get(clave_vary)
+            entrada = cache.get(_clave_pagina(request, url, cabeceras)) if cabeceras is not None else None
+            if entrada is not None:
+                edad = time.time() - entrada['creado']
+                vigente = versiones_etiquetas(entrada['etiquetas']) == entrada['etiquetas']
+                if vigente and edad < frescura:
+                    return _respuesta_desde_cache(entrada, 'HIT')
+                # Caducada o invalidada: solo una petición la regenera, el resto
+                # recibe la copia anterior mientras tanto
+                candado = cache.add(clave_candado, 1, SEGUNDOS_CANDADO)
+                if not candado:
+                    return _respuesta_desde_cache(entrada, 'STALE')
+
+            # Versiones tomadas antes de renderizar: un cambio durante el
+            # renderizado deja la página ya marcada como no fresca
+            request._etiquetas_pagina = {etiqueta.format(**kwargs) for etiqueta in etiquetas}
+            versiones_previas = versiones_etiquetas(request._etiquetas_pagina)
+            try:
+                response = vista(request, *args, **kwargs)
+                patch_vary_headers(response, ('Cookie',))
+                if (response.status_code == 200 and not response.cookies
+                        and not getattr(response, 'streaming', False)
+                        and 'private' not in response.get('Cache-Control', '')
+                        and 'no-store' not in response.get('Cache-Control', '')):
+                    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                        response.render()
+                    nuevas = request._etiquetas_pagina - set(versiones_previas)
+                    versiones_previas.update(versiones_etiquetas(nuevas))
+                    cabeceras = _cabeceras_vary(response)
+                    cache.set(clave_vary, cabeceras, frescura + margen)
+                    cache.set(_clave_pagina(request, url, cabeceras), {
+                        'contenido': response.content,
+                        'estado': response.status_code,
+                        'cabeceras': {clave: valor for clave, valor in response.items()},
+                        'creado': time.time(),
+                        'etiquetas': versiones_previas,
+                    }, frescura + margen)
+                response['X-Cache-Pagina'] = 'MISS'
+                return response
+            finally:
+                if candado:
+                    cache.delete(clave_candado)
+        return envoltura
+    return decorador
@@ -0,0 +1,169 @@
+# sril/colaborativo.py
+"""
+Filtrado colaborativo ítem-ítem sobre ``Puntuacion``.
+
+Fuera de línea (``manage.py recalcular_vecinos_colaborativos``) se monta la
+matriz dispersa usuarios × libros con NumPy/SciPy y se calcula la similitud
+coseno ajustada entre libros: a cada puntuación se le resta la media de su
+usuario, así que un usuario que lo puntúa todo alto no hace parecidos a
+todos los libros. La similitud se encoge según los usuarios en común
+(``n / (n + ENCOGIMIENTO)``) para que dos libros con un solo lector
+compartido no salgan idénticos. Los mejores vecinos de cada libro se
+guardan en ``VecinoColaborativo``.
+
+En línea, ``candidatos_usuario`` predice la puntuación de los libros
+vecinos de los que el usuario ya puntuó: dos consultas por índice y unas
+sumas en Python, sin NumPy, para que el servidor web no lo necesite.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+ENCOGIMIENTO = 10
+MINIMO_USUARIOS_COMUNES = 2
+# Centro de la escala hacia el que se suaviza la media de usuarios con pocas puntuaciones
+PUNTUACION_NEUTRA = 3.0
+PUNTUACIONES_PREVIAS = 2
+
+
+def vecinos_por_libro():
+    return getattr(settings, 'VECINOS_COLABORATIVOS_POR_LIBRO', 20)
+
+
+def matriz_puntuaciones():
+    """
+    ``(matriz, usuario_ids, libro_ids)``: matriz CSR usuarios × libros con las
+    puntuaciones de libros activos y los ids de cada fila y columna.
+    """
+    import numpy as np
+    from scipy import sparse
+    from django.db.models import FloatField
+    from django.db.models.functions import Cast
+    from .models import Puntuacion
+
+    filas = list(Puntuacion.objects.filter(libro__activo=True).values_list(
+        'usuario_id', 'libro_id', Cast('puntuacion', FloatField())
+    ).iterator(chunk_size=10000))
+    if not filas:
+        return sparse.csr_matrix((0, 0)), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    usuarios, libros, valores = (np.array(columna) for columna in zip(*filas))
+    usuario_ids, fila = np.unique(usuarios, return_inverse=True)
+    libro_ids, columna = np.unique(libros, return_inverse=True)
+    matriz = sparse.csr_matrix(
+        (valores.astype(np.float64), (fila, columna)), shape=(len(usuario_ids), len(libro_ids))
+    )
+    return matriz, usuario_ids, libro_ids
+
+
+def calcular_vecinos(matriz, k, bloque=500):
+    """
+    Generador de ``(columna, [(columna_vecino, similitud, usuarios_comunes)])``
+    con los ``k`` vecinos de similitud positiva de cada columna de ``matriz``.
+    Se procesa por bloques de ``bloque`` libros para acotar la memoria.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    matriz = matriz.tocsr()
+    # Coseno ajustado: centrar cada usuario en su media
+    conteos = np.diff(matriz.indptr)
+    medias = np.divide(
+        np.asarray(matriz.sum(axis=1)).ravel(), conteos,
+        out=np.zeros(matriz.shape[0]), where=conteos > 0
+    )
+    centrada = matriz.copy()
+    centrada.data = centrada.data - np.repeat(medias, conteos)
+
+    normas = np.sqrt(np.asarray(centrada.multiply(centrada).sum(axis=0)).ravel())
+    inversas = np.divide(1.0, normas, out=np.zeros_like(normas), where=normas > 0)
+    normalizada = (centrada @ sparse.diags(inversas)).tocsr()
+    leidos = matriz.copy()
+    leidos.data = np.ones_like(leidos.data)
+
+    por_libro = normalizada.T.tocsr()
+    leidos_por_libro = leidos.T.tocsr()
+    for inicio in range(0, matriz.shape[1], bloque):
+        similitudes = (por_libro[inicio:inicio + bloque] @ normalizada).tocsr()
+        comunes = (leidos_por_libro[inicio:inicio + bloque] @ leidos).tocsr()
+        similitudes.sort_indices()
+        comunes.sort_indices()
+        for desplazamiento in range(similitudes.shape[0]):
+            columna = inicio + desplazamiento
+            desde, hasta = similitudes.indptr[desplazamiento], similitudes.indptr[desplazamiento + 1]
+            indices, valores = similitudes.indices[desde:hasta], similitudes.data[desde:hasta]
+            c_desde, c_hasta = comunes.indptr[desplazamiento], comunes.indptr[desplazamiento + 1]
+            c_indices, c_valores = comunes.indices[c_desde:c_hasta], comunes.data[c_desde:c_hasta]
+            # Los valores no nulos de similitud siempre tienen lectores en común
+            n = c_valores[np.searchsorted(c_indices, indices)]
+            valores = valores * n / (n + ENCOGIMIENTO)
+            validos = (valores > 0) & (n >= MINIMO_USUARIOS_COMUNES) & (indices != columna)
+            indices, valores, n = indices[validos], valores[validos], n[validos]
+            if len(valores) > k:
+                mejores = np.argpartition(-valores, k)[:k]
+                indices, valores, n = indices[mejores], valores[mejores], n[mejores]
+            orden = np.argsort(-valores, kind='stable')
+            yield columna, [
+                (int(indices[i]), float(valores[i]), int(n[i])) for i in orden
+            ]
+
+
+def recalcular_vecinos_colaborativos(bloque=500, tamano_lote=5000):
+    """Reconstruir ``VecinoColaborativo``; devuelve ``(libros, filas)``"""
+    from .models import VecinoColaborativo
+
+    matriz, _, libro_ids = matriz_puntuaciones()
+    filas = []
+    for columna, vecinos in calcular_vecinos(matriz, vecinos_por_libro(), bloque=bloque):
+        libro_id = int(libro_ids[columna])
+        filas.extend(
+            VecinoColaborativo(
+                libro_id=libro_id, vecino_id=int(libro_ids[otra]),
+                similitud=round(similitud, 6), usuarios_comunes=comunes,
+            )
+            for otra, similitud, comunes in vecinos
+        )
+
+    with transaction.atomic():
+        VecinoColaborativo.objects.all().delete()
+        VecinoColaborativo.objects.bulk_create(filas, batch_size=tamano_lote)
+    return len(libro_ids), len(filas)
+
+
+def candidatos_usuario(usuario_id, limite=50):
+    """
+    Libros que el usuario aún no puntuó, como ``[(libro_id, prediccion)]``
+    de mayor a menor puntuación prevista (escala 1-5).
+
+    La predicción es la media del usuario más la media de sus desviaciones
+    en los libros vecinos, ponderada por similitud. El ``+ 1`` del
+    denominador acerca a la media las predicciones con poco apoyo.
+    """
+    from .models import Puntuacion, VecinoColaborativo
+
+    puntuadas = {
+        libro_id: float(puntuacion)
+        for libro_id, puntuacion in Puntuacion.objects.filter(usuario_id=usuario_id).values_list('libro_id', 'puntuacion')
+    }
+    if not puntuadas:
+        return []
+    media = (sum(puntuadas.values()) + PUNTUACIONES_PREVIAS * PUNTUACION_NEUTRA) / (len(puntuadas) + PUNTUACIONES_PREVIAS)
+
+    numerador, denominador = defaultdict(float), defaultdict(float)
+    ids = list(puntuadas)
+    for inicio in range(0, len(ids), 900):
+        for libro_id, vecino_id, similitud in VecinoColaborativo.objects.filter(
+            libro_id__in=ids[inicio:inicio + 900], vecino__activo=True
+        ).values_list('libro_id', 'vecino_id', 'similitud'):
+            if vecino_id in puntuadas:
+                continue
+            numerador[vecino_id] += similitud * (puntuadas[libro_id] - media)
+            denominador[vecino_id] += similitud
+
+    predicciones = [
+        (libro_id, min(5.0, max(1.0, media + numerador[libro_id] / (denominador[libro_id] + 1))))
+        for libro_id in numerador
+    ]
+    predicciones.sort(key=lambda candidato: (-candidato[1], candidato[0]))
+    return predicciones[:limite]
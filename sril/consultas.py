@@ -0,0 +1,154 @@
+# sril/consultas.py
+"""
+Registro de consultas SQL por petición, para desarrollo y staging.
+
+``RegistroConsultas`` se engancha a las conexiones con
+``connection.execute_wrapper`` y anota cada sentencia con su duración, una
+huella (el SQL sin valores concretos, con las listas ``IN (...)`` colapsadas)
+y su origen: la línea de plantilla que la disparó, si la consulta salió de
+un ``{{ libro.categorias.all }}`` o similar, y si no el primer marco del
+código de la aplicación.
+
+Las huellas repetidas dentro de una misma petición son el síntoma típico de
+un N+1: la misma consulta lanzada una vez por cada tarjeta o fila.
+"""
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+# Presupuesto de consultas declarado en una vista con @presupuesto_consultas
+ATRIBUTO_PRESUPUESTO = 'presupuesto_consultas'
+
+_DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+_ESTE_ARCHIVO = os.path.abspath(__file__)
+
+_RE_LISTA_IN = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+# Control de transacción, no consultas: dentro de un TestCase cada
+# transaction.atomic() exterior se convierte en un savepoint
+_SAVEPOINTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def presupuesto_consultas(maximo):
+    """Declarar cuántas consultas puede hacer una vista como mucho"""
+    def decorador(vista):
+        setattr(vista, ATRIBUTO_PRESUPUESTO, maximo)
+        return vista
+    return decorador
+
+
+def huella_sql(sql):
+    """SQL normalizado para agrupar sentencias que solo difieren en sus valores"""
+    sql = _RE_LISTA_IN.sub('IN (...)', sql)
+    sql = _RE_CADENA.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    return _RE_ESPACIOS.sub(' ', sql).strip()
+
+
+def origen_consulta():
+    """
+    ``(plantilla, linea, etiqueta)`` del nodo de plantilla que se estaba
+    renderizando, o ``(archivo, linea, funcion)`` del primer marco de la app.
+    """
+    codigo_app = None
+    marco = sys._getframe(2)
+    while marco is not None:
+        # Cada nodo de plantilla se renderiza dentro de Node.render_annotated
+        if marco.f_code.co_name == 'render_annotated':
+            nodo = marco.f_locals.get('self')
+            token = getattr(nodo, 'token', None)
+            if token is not None:
+                origen = getattr(nodo, 'origin', None)
+                nombre = getattr(origen, 'template_name', None) or getattr(origen, 'name', '?')
+                return (str(nombre), token.lineno, token.contents[:80])
+        archivo = marco.f_code.co_filename
+        if codigo_app is None and archivo.startswith(_DIRECTORIO_APP) and archivo != _ESTE_ARCHIVO:
+            codigo_app = (os.path.relpath(archivo, os.path.dirname(_DIRECTORIO_APP)),
+                          marco.f_lineno, marco.f_code.co_name)
+        marco = marco.f_back
+    return codigo_app or ('?', 0, '')
+
+
+class RegistroConsultas:
+    """Contexto que registra todas las consultas ejecutadas mientras está activo"""
+
+    def __init__(self, alias=None):
+        self.alias = alias
+        self.consultas = []
+        self._pila = None
+
+    def __enter__(self):
+        self._pila = ExitStack()
+        conexiones = [connections[self.alias]] if self.alias else connections.all()
+        for conexion in conexiones:
+            self._pila.enter_context(conexion.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc):
+        self._pila.close()
+        return False
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append({
+                'sql': sql,
+                'huella': huella_sql(sql),
+                'tiempo': time.perf_counter() - inicio,
+                'origen': origen_consulta(),
+            })
+
+    @property
+    def total(self):
+        return len(self.consultas)
+
+    @property
+    def total_presupuesto(self):
+        """Las consultas que cuentan para el presupuesto: todas menos los savepoints"""
+        return sum(1 for consulta in self.consultas if not consulta['sql'].lstrip().upper().startswith(_SAVEPOINTS))
+
+    @property
+    def tiempo_total(self):
+        return sum(consulta['tiempo'] for consulta in self.consultas)
+
+    def repetidas(self, minimo=2):
+        """
+        Huellas que se ejecutaron al menos ``minimo`` veces, de más a menos
+        repetida, con los orígenes que las dispararon.
+        """
+        grupos = {}
+        for consulta in self.consultas:
+            grupo = grupos.setdefault(consulta['huella'], {'veces': 0, 'tiempo': 0.0, 'origenes': {}})
+            grupo['veces'] += 1
+            grupo['tiempo'] += consulta['tiempo']
+            grupo['origenes'][consulta['origen']] = grupo['origenes'].get(consulta['origen'], 0) + 1
+        return sorted(
+            ((huella, grupo) for huella, grupo in grupos.items() if grupo['veces'] >= minimo),
+            key=lambda item: item[1]['veces'], reverse=True
+        )
+
+    def informe(self, titulo='', maximo_repetidas=5, todas=False):
+        """
+        Resumen legible: totales y las huellas repetidas con su origen; con
+        ``todas`` también cada consulta en orden de ejecución.
+        """
+        lineas = [f"{titulo} {self.total} consultas, {self.tiempo_total * 1000:.1f} ms de SQL".strip()]
+        for huella, grupo in self.repetidas()[:maximo_repetidas]:
+            lineas.append(f"   🔁 {grupo['veces']}x ({grupo['tiempo'] * 1000:.1f} ms) {huella[:160]}")
+            for (archivo, linea, detalle), veces in grupo['origenes'].items():
+                lineas.append(f"      ↳ {archivo}:{linea} {detalle} ({veces}x)")
+        if todas:
+            for numero, consulta in enumerate(self.consultas, 1):
+                archivo, linea, detalle = consulta['origen']
+                lineas.append(f"   {numero:>3}. {consulta['huella'][:120]}")
+                lineas.append(f"        ↳ {archivo}:{linea} {detalle}")
+        return '\n'.join(lineas)
@@ -0,0 +1,89 @@
+# sril/facetas.py
+"""
+Facetas de categoría para el catálogo.
+
+Los conteos por categoría del conjunto de resultados salen de una única
+consulta agrupada sobre la tabla intermedia ``LibroCategoria`` (en lugar de
+un COUNT por categoría), y el filtro por varias categorías se resuelve con
+una subconsulta sobre la misma tabla, sin JOIN que duplique libros.
+
+Los conteos del catálogo completo (el listado sin búsqueda) se guardan en
+la caché de Django y las señales los invalidan cuando cambian las
+categorías de un libro o los libros activos. La caché es de cada proceso y
+las escrituras masivas (``bulk_create``, ``update()``) no envían señales,
+así que además caducan a los ``FACETAS_CATALOGO_SEGUNDOS``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Categoria, Libro, LibroCategoria
+
+MODOS = ('alguna', 'todas')
+CLAVE_CACHE_CATALOGO = 'sril:facetas:catalogo'
+
+
+def leer_categorias(valores):
+    """Ids de categoría válidos de ``request.GET.getlist('categoria')``"""
+    ids = []
+    for valor in valores:
+        try:
+            ids.append(int(valor))
+        except (TypeError, ValueError):
+            continue
+    return sorted(set(ids))
+
+
+def filtrar_por_categorias(libros, categoria_ids, modo='alguna'):
+    """
+    Libros con alguna (OR) o con todas (AND) las categorías indicadas.
+    """
+    if not categoria_ids:
+        return libros
+    relaciones = LibroCategoria.objects.filter(categoria_id__in=categoria_ids)
+    if modo == 'todas' and len(categoria_ids) > 1:
+        relaciones = relaciones.values('libro_id').annotate(
+            total=Count('categoria_id')
+        ).filter(total=len(categoria_ids))
+    return libros.filter(id__in=relaciones.values('libro_id'))
+
+
+def contar_por_categoria(libros):
+    """
+    ``{categoria_id: número de libros}`` para un queryset de libros o una
+    lista de ids, en una sola consulta agrupada.
+    """
+    if isinstance(libros, (list, set, tuple)):
+        if not libros:
+            return {}
+        relaciones = LibroCategoria.objects.filter(libro_id__in=libros)
+    else:
+        relaciones = LibroCategoria.objects.filter(libro_id__in=libros.order_by().values('id'))
+    return dict(
+        relaciones.order_by().values('categoria_id').annotate(total=Count('libro_id'))
+        .values_list('categoria_id', 'total')
+    )
+
+
+def conteos_catalogo():
+    """Conteos por categoría de todos los libros activos (cacheados)"""
+    conteos = cache.get(CLAVE_CACHE_CATALOGO)
+    if conteos is None:
+        conteos = contar_por_categoria(Libro.objects.filter(activo=True))
+        cache.set(CLAVE_CACHE_CATALOGO, conteos, getattr(settings, 'FACETAS_CATALOGO_SEGUNDOS', 300))
+    return conteos
+
+
+def invalidar_conteos_catalogo():
+    cache.delete(CLAVE_CACHE_CATALOGO)
+
+
+def facetas_categorias(conteos, seleccionadas=()):
+    """Todas las categorías con su conteo y si están marcadas, para la plantilla"""
+    seleccionadas = set(seleccionadas)
+    facetas = []
+    for categoria in Categoria.objects.only('id', 'nombre').order_by('nombre'):
+        categoria.total = conteos.get(categoria.id, 0)
+        categoria.seleccionada = categoria.id in seleccionadas
+        facetas.append(categoria)
+    return facetas
@@ -0,0 +1,151 @@
+# sril/hibrido.py
+"""
+Puntuación híbrida de libros para las recomendaciones, en una sola pasada
+vectorizada con NumPy sobre todo el catálogo activo:
+
+    score = interes * PESOS['interes'] + rating * PESOS['rating']
+          + popularidad * PESOS['popularidad'] + recencia * PESOS['recencia']
+
+  - ``interes``: media del nivel de interés del usuario (1-5, escalado a
+    0-1) en las categorías del libro; una categoría sin preferencia cuenta 0.
+  - ``rating``: media bayesiana, ``(C * media_global + suma) / (C + n)``
+    escalada a 0-1. Un libro con una sola puntuación de 5 queda cerca de la
+    media global; hacen falta muchas para alejarse de ella.
+  - ``popularidad``: ``log(1 + n)`` relativo al libro más puntuado.
+  - ``recencia``: decae a la mitad cada ``RECOMENDACION_VIDA_MEDIA_DIAS``
+    desde que el libro entró en el catálogo.
+
+Los arrays del catálogo (ratings, fechas y la matriz dispersa libros ×
+categorías) se cargan una vez por proceso y se renuevan cada
+``RECOMENDACION_CATALOGO_SEGUNDOS``: las listas las calcula el worker y unos
+minutos de desfase en los ratings no cambian el orden de forma apreciable.
+Con el catálogo cargado, puntuar a un usuario son unas pocas operaciones
+sobre arrays (~1-2 ms con 100k libros).
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+PESOS_POR_DEFECTO = {'interes': 0.45, 'rating': 0.30, 'popularidad': 0.15, 'recencia': 0.10}
+
+
+def _ajuste(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def pesos():
+    return {**PESOS_POR_DEFECTO, **_ajuste('PESOS_RECOMENDACION', {})}
+
+
+class CatalogoPuntuable:
+    """Arrays por libro activo, ordenados por id"""
+
+    def __init__(self):
+        import numpy as np
+        from scipy import sparse
+        from .models import Libro, LibroCategoria
+
+        filas = list(Libro.objects.filter(activo=True).order_by('id').values_list(
+            'id', 'rating_sum', 'rating_count', 'fecha_creacion'
+        ).iterator(chunk_size=10000))
+        self.ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+        suma = np.array([float(fila[1] or 0) for fila in filas])
+        conteo = np.array([fila[2] or 0 for fila in filas], dtype=np.float64)
+
+        previas = _ajuste('RECOMENDACION_PUNTUACIONES_PREVIAS', 10)
+        media = suma.sum() / conteo.sum() if conteo.sum() else 3.0
+        self.rating = ((previas * media + suma) / (previas + conteo) / 5).astype(np.float32)
+        maximo = math.log1p(conteo.max()) if len(conteo) and conteo.max() > 0 else 1.0
+        self.popularidad = (np.log1p(conteo) / maximo).astype(np.float32)
+
+        ahora = timezone.now()
+        dias = np.array([(ahora - fila[3]).total_seconds() / 86400 if fila[3] else 0 for fila in filas])
+        vida_media = _ajuste('RECOMENDACION_VIDA_MEDIA_DIAS', 180)
+        self.recencia = np.exp2(-np.maximum(dias, 0) / vida_media).astype(np.float32)
+
+        relaciones = list(LibroCategoria.objects.filter(libro__activo=True).values_list('libro_id', 'categoria_id'))
+        self.columnas = {categoria_id: columna for columna, categoria_id in enumerate(sorted({c for _, c in relaciones}))}
+        if relaciones:
+            libro_ids = np.array([libro_id for libro_id, _ in relaciones], dtype=np.int64)
+            posiciones = np.searchsorted(self.ids, libro_ids)
+            posiciones = np.minimum(posiciones, len(self.ids) - 1)
+            validas = self.ids[posiciones] == libro_ids
+            columnas = np.array([self.columnas[c] for _, c in relaciones], dtype=np.int64)
+            categorias = sparse.csr_matrix(
+                (np.ones(validas.sum(), dtype=np.float32), (posiciones[validas], columnas[validas])),
+                shape=(len(self.ids), len(self.columnas)),
+            )
+            # Filas divididas por su número de categorías: el producto con el
+            # vector de intereses da directamente la media
+            por_libro = np.asarray(categorias.sum(axis=1)).ravel()
+            self.categorias = (sparse.diags(np.divide(
+                1.0, por_libro, out=np.zeros_like(por_libro), where=por_libro > 0
+            ).astype(np.float32)) @ categorias).tocsr()
+        else:
+            self.categorias = sparse.csr_matrix((len(self.ids), 0), dtype=np.float32)
+        self.creado = time.monotonic()
+
+    def filas(self, libro_ids):
+        """Posiciones en los arrays de los ``libro_ids`` que están en el catálogo"""
+        import numpy as np
+
+        if not isinstance(libro_ids, np.ndarray):
+            libro_ids = np.fromiter(libro_ids, dtype=np.int64)
+        if not len(libro_ids) or not len(self.ids):
+            return np.array([], dtype=np.int64)
+        posiciones = np.minimum(np.searchsorted(self.ids, libro_ids), len(self.ids) - 1)
+        return posiciones[self.ids[posiciones] == libro_ids]
+
+    def activos(self, libro_ids):
+        """Los ``libro_ids`` que están en el catálogo activo, sin consultar la base de datos"""
+        return {int(libro_id) for libro_id in self.ids[self.filas(libro_ids)]}
+
+    def puntuar(self, intereses, excluir=(), limite=20, solo_con_interes=False, pesos_usados=None):
+        """
+        ``[(libro_id, score)]`` de los ``limite`` mejores libros para un usuario
+        con ``intereses`` ``{categoria_id: nivel 1-5}``, sin los de ``excluir``
+        (cualquier iterable de ids o un array de NumPy).
+        Con ``solo_con_interes`` se descartan los libros sin ninguna categoría
+        de interés.
+        """
+        import numpy as np
+
+        if not len(self.ids):
+            return []
+        w = pesos_usados or pesos()
+        vector = np.zeros(len(self.columnas), dtype=np.float32)
+        for categoria_id, nivel in intereses.items():
+            columna = self.columnas.get(categoria_id)
+            if columna is not None:
+                vector[columna] = nivel / 5
+        interes = self.categorias @ vector
+
+        score = (
+            w['interes'] * interes + w['rating'] * self.rating
+            + w['popularidad'] * self.popularidad + w['recencia'] * self.recencia
+        )
+        if solo_con_interes:
+            score[interes <= 0] = -np.inf
+        score[self.filas(excluir)] = -np.inf
+
+        limite = min(limite, len(score))
+        mejores = np.argpartition(-score, limite - 1)[:limite]
+        mejores = mejores[np.argsort(-score[mejores], kind='stable')]
+        return [(int(self.ids[fila]), float(score[fila])) for fila in mejores if np.isfinite(score[fila])]
+
+
+_catalogo = None
+_bloqueo = threading.Lock()
+
+
+def catalogo():
+    """El catálogo del proceso, recargado cuando supera su antigüedad máxima"""
+    global _catalogo
+    segundos = _ajuste('RECOMENDACION_CATALOGO_SEGUNDOS', 600)
+    with _bloqueo:
+        if _catalogo is None or time.monotonic() - _catalogo.creado > segundos:
+            _catalogo = CatalogoPuntuable()
+        return _catalogo
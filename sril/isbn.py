@@ -0,0 +1,42 @@
+# sril/isbn.py
+"""
+Normalización de ISBN a ISBN-13 (solo dígitos).
+
+``Libro.isbn`` guarda lo que se escribió (con o sin guiones, ISBN-10 o
+ISBN-13); ``Libro.isbn13`` guarda la forma normalizada con índice único,
+así que "84-376-0494-X", "843760494X" y "978-84-376-0494-7" encuentran el
+mismo libro con una sola búsqueda por índice.
+"""
+import re
+
+_SEPARADORES = re.compile(r'[\s\-‐-―.]')
+_ISBN10 = re.compile(r'\d{9}[\dX]')
+_ISBN13 = re.compile(r'97[89]\d{10}')
+
+
+def _digito_isbn13(doce):
+    suma = sum(int(digito) * (3 if posicion % 2 else 1) for posicion, digito in enumerate(doce))
+    return str((10 - suma % 10) % 10)
+
+
+def _isbn10_valido(isbn):
+    suma = sum((10 - posicion) * (10 if caracter == 'X' else int(caracter)) for posicion, caracter in enumerate(isbn))
+    return suma % 11 == 0
+
+
+def normalizar_isbn(texto):
+    """
+    ISBN-13 de ``texto`` (ISBN-10 o ISBN-13, con o sin separadores), o None
+    si no es un ISBN válido.
+    """
+    if not texto:
+        return None
+    compacto = _SEPARADORES.sub('', texto.strip()).upper()
+    if compacto.startswith('ISBN'):
+        compacto = compacto[4:].lstrip(':')
+    if _ISBN13.fullmatch(compacto):
+        return compacto if _digito_isbn13(compacto[:12]) == compacto[12] else None
+    if _ISBN10.fullmatch(compacto) and _isbn10_valido(compacto):
+        doce = '978' + compacto[:9]
+        return doce + _digito_isbn13(doce)
+    return None
@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from sril.models import Libro, CacheMetadatosPdf
+from sril.pipeline import marcar_etapa
+from sril.procesamiento_pdf import calcular_huella
+
+
+class Command(BaseCommand):
+    help = 'Calcula la huella SHA-256 de los PDFs que aún no la tienen y siembra la caché de metadatos'
+
+    def handle(self, *args, **options):
+        libros = Libro.objects.filter(huella_pdf__isnull=True).exclude(archivo_pdf='').exclude(archivo_pdf__isnull=True)
+        total = 0
+        for libro in libros.iterator():
+            if not os.path.exists(libro.archivo_pdf.path):
+                self.stdout.write(self.style.WARNING(f"⚠️ Falta el archivo de: {libro.titulo}"))
+                continue
+
+            libro.huella_pdf = calcular_huella(libro.archivo_pdf.path)
+            marcar_etapa(libro, 'huella')
+            # Lo que el libro ya tiene no se rehace (ni se reemplaza su portada) al guardarlo
+            if libro.numero_paginas > 0:
+                marcar_etapa(libro, 'metadatos')
+            if libro.portada:
+                marcar_etapa(libro, 'portada')
+            libro.save(update_fields=['huella_pdf', 'etapas_completadas'])
+
+            # Solo metadatos: las portadas existentes pueden ser placeholders por título
+            if libro.numero_paginas > 0:
+                CacheMetadatosPdf.objects.get_or_create(
+                    huella=libro.huella_pdf,
+                    defaults={
+                        'numero_paginas': libro.numero_paginas,
+                        'tiempo_lectura_promedio': libro.tiempo_lectura_promedio,
+                    }
+                )
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Huellas calculadas: {total}"))
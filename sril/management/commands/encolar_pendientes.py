@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from sril.models import Libro
+from sril.pipeline import etapas_pendientes
+
+
+class Command(BaseCommand):
+    help = ('Encola el procesamiento de los libros con etapas del pipeline pendientes '
+            '(por ejemplo, la indexación del texto de PDFs ya existentes)')
+
+    def handle(self, *args, **options):
+        libros = Libro.objects.exclude(archivo_pdf='').exclude(archivo_pdf__isnull=True)
+        total = 0
+        for libro in libros.iterator():
+            if not etapas_pendientes(libro):
+                continue
+            libro.encolar_procesamiento()
+            Libro.objects.filter(pk=libro.pk).update(estado_procesamiento='PENDIENTE')
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Libros encolados: {total}"))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sril.models import Libro
+from sril.portadas import generar_derivados
+
+
+class Command(BaseCommand):
+    help = ('Crea las versiones reducidas WebP/JPEG que falten de las portadas existentes. '
+            'Las páginas sirven la portada original hasta que existen')
+
+    def handle(self, *args, **options):
+        libros = Libro.objects.exclude(portada='').exclude(portada__isnull=True).only('id', 'portada').order_by('id')
+
+        inicio = time.perf_counter()
+        vistas = set()
+        portadas = derivados = 0
+        for libro in libros.iterator(chunk_size=500):
+            # Las portadas de la caché por huella son compartidas
+            if libro.portada.name in vistas:
+                continue
+            vistas.add(libro.portada.name)
+            creados = generar_derivados(libro.portada)
+            if creados:
+                portadas += 1
+                derivados += creados
+
+        transcurrido = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {derivados} derivados creados para {portadas} portadas en {transcurrido:.1f} s"
+        ))
@@ -0,0 +1,250 @@
+import csv
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from sril.cache_paginas import invalidar_etiquetas
+from sril.facetas import invalidar_conteos_catalogo
+from sril.isbn import normalizar_isbn
+from sril.models import Libro, Categoria, LibroCategoria, CacheMetadatosPdf, TareaProcesamiento
+from sril.pipeline import marcar_etapa, etapas_pendientes
+from sril.portadas import generar_derivados
+from sril.procesamiento_pdf import inicializar_importacion, procesar_archivo_importacion, PAGINAS_MUESTRA
+from sril.similares import recalcular_similares
+from sril.vectores import actualizar_vectores, reconstruir_vectores
+
+
+class Command(BaseCommand):
+    help = ('Importa PDFs en bloque desde un directorio o un manifiesto CSV '
+            '(titulo, autor, isbn, categorias, path). Se puede reanudar: '
+            'los PDFs cuya huella ya está en el catálogo se omiten.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('origen', help='Directorio con PDFs o archivo CSV')
+        parser.add_argument(
+            '--procesos', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+            help='Número de procesos para extraer metadatos y portadas'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=200,
+            help='Libros por cada bulk_create'
+        )
+        parser.add_argument(
+            '--paginas-muestra', type=int,
+            default=getattr(settings, 'PAGINAS_MUESTRA_LECTURA', PAGINAS_MUESTRA),
+            help='Páginas muestreadas por PDF para estimar el tiempo de lectura'
+        )
+
+    def handle(self, *args, **options):
+        entradas = self._leer_entradas(options['origen'])
+        if not entradas:
+            raise CommandError('No se encontraron PDFs para importar')
+
+        huellas = set(
+            Libro.objects.exclude(huella_pdf__isnull=True).values_list('huella_pdf', flat=True)
+        )
+        # Comparados ya normalizados: el mismo ISBN con otros guiones o en ISBN-10 es un duplicado
+        isbns = {
+            normalizar_isbn(isbn) or isbn
+            for isbn in Libro.objects.exclude(isbn__isnull=True).values_list('isbn', flat=True)
+        }
+        self.stdout.write(f"📚 {len(entradas)} PDFs en el origen, {len(huellas)} huellas ya en el catálogo")
+
+        por_ruta = {entrada['path']: entrada for entrada in entradas}
+        contexto = multiprocessing.get_context('spawn')
+        connections.close_all()
+
+        self.importados = self.omitidos = self.fallidos = 0
+        self.nuevos_ids = []
+        self.inicio = time.perf_counter()
+        lote = []
+
+        with ProcessPoolExecutor(max_workers=max(1, options['procesos']), mp_context=contexto,
+                                 initializer=inicializar_importacion,
+                                 initargs=(huellas, options['paginas_muestra'])) as pool:
+            resultados = pool.map(procesar_archivo_importacion, list(por_ruta), chunksize=4)
+            for resultado in resultados:
+                entrada = por_ruta[resultado['ruta']]
+                if resultado['error']:
+                    self.fallidos += 1
+                    self.stdout.write(self.style.ERROR(f"❌ {resultado['ruta']}: {resultado['error']}"))
+                    continue
+
+                isbn = entrada.get('isbn') or None
+                if isbn:
+                    isbn = normalizar_isbn(isbn) or isbn
+                # Omitir duplicados del catálogo y de esta misma importación
+                if resultado['omitido'] or resultado['huella'] in huellas or (isbn and isbn in isbns):
+                    self.omitidos += 1
+                    continue
+
+                huellas.add(resultado['huella'])
+                if isbn:
+                    isbns.add(isbn)
+                lote.append((entrada, resultado))
+
+                if len(lote) >= options['lote']:
+                    self._guardar_lote(lote, len(entradas))
+                    lote = []
+
+        if lote:
+            self._guardar_lote(lote, len(entradas))
+
+        if self.importados:
+            # bulk_create no envía señales: páginas cacheadas, conteos de
+            # categorías y vecinos se rehacen de una vez
+            invalidar_etiquetas('catalogo', 'categorias')
+            invalidar_conteos_catalogo()
+            reescritas, _ = recalcular_similares()
+            self.stdout.write(f"🔗 Libros similares recalculados: {reescritas} listas actualizadas")
+            # Los libros nuevos aún no tienen puntuaciones: sin su vector de
+            # contenido no aparecerían en ninguna recomendación
+            if actualizar_vectores(self.nuevos_ids):
+                self.stdout.write(f"🧭 Vectores de contenido añadidos: {len(self.nuevos_ids)}")
+            else:
+                self.stdout.write(f"🧭 Índice de vectores creado: {reconstruir_vectores()} libros")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Importación terminada: {self.importados} importados, "
+            f"{self.omitidos} omitidos, {self.fallidos} con error "
+            f"({self._velocidad():.1f} libros/s)"
+        ))
+
+    def _leer_entradas(self, origen):
+        """Leer el manifiesto CSV o listar los PDFs de un directorio"""
+        if os.path.isdir(origen):
+            entradas = []
+            for raiz, _, archivos in os.walk(origen):
+                for nombre in sorted(archivos):
+                    if nombre.lower().endswith('.pdf'):
+                        entradas.append({'path': os.path.abspath(os.path.join(raiz, nombre))})
+            return entradas
+
+        if not os.path.isfile(origen):
+            raise CommandError(f'No existe el origen: {origen}')
+
+        base = os.path.dirname(os.path.abspath(origen))
+        entradas = []
+        with open(origen, newline='', encoding='utf-8-sig') as archivo:
+            for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+                fila = {clave.strip().lower(): (valor or '').strip() for clave, valor in fila.items() if clave}
+                if not fila.get('path'):
+                    self.stdout.write(self.style.WARNING(f"⚠️ Fila {numero} sin path, se omite"))
+                    continue
+                ruta = fila['path'] if os.path.isabs(fila['path']) else os.path.join(base, fila['path'])
+                if not os.path.isfile(ruta):
+                    self.stdout.write(self.style.WARNING(f"⚠️ Fila {numero}: no existe {ruta}"))
+                    continue
+                fila['path'] = os.path.abspath(ruta)
+                entradas.append(fila)
+        return entradas
+
+    def _guardar_lote(self, lote, total):
+        """Copiar archivos y escribir libros, caché y categorías del lote con bulk_create"""
+        libros = []
+        caches = []
+        # Archivos copiados por este lote: si la inserción falla (o se
+        # interrumpe), se borran para no dejar huérfanos en el almacenamiento
+        copiados = []
+        try:
+            for entrada, resultado in lote:
+                metadatos = resultado['metadatos']
+                nombre_base = os.path.splitext(os.path.basename(entrada['path']))[0]
+
+                libro = Libro(
+                    titulo=(entrada.get('titulo') or metadatos.get('titulo') or nombre_base)[:255],
+                    autor=(entrada.get('autor') or metadatos.get('autor') or 'Desconocido')[:255],
+                    isbn=entrada.get('isbn') or None,
+                    # bulk_create no pasa por Libro.save()
+                    isbn13=normalizar_isbn(entrada.get('isbn')),
+                    numero_paginas=resultado['paginas'],
+                    huella_pdf=resultado['huella'],
+                    estado_procesamiento='COMPLETADO',
+                )
+                libro.tiempo_lectura_promedio = libro._calcular_tiempo_lectura(resultado['palabras_por_pagina'])
+
+                with open(entrada['path'], 'rb') as pdf:
+                    libro.archivo_pdf.name = default_storage.save(
+                        f"libros/pdfs/{os.path.basename(entrada['path'])}", File(pdf)
+                    )
+                copiados.append(libro.archivo_pdf.name)
+
+                marcar_etapa(libro, 'huella')
+                marcar_etapa(libro, 'metadatos')
+
+                cache = CacheMetadatosPdf(
+                    huella=resultado['huella'],
+                    numero_paginas=libro.numero_paginas,
+                    tiempo_lectura_promedio=libro.tiempo_lectura_promedio,
+                )
+                if resultado['portada']:
+                    nombre_portada = f"{CacheMetadatosPdf.DIRECTORIO_PORTADAS}{resultado['huella']}.jpg"
+                    if not default_storage.exists(nombre_portada):
+                        copiados.append(default_storage.save(nombre_portada, ContentFile(resultado['portada'])))
+                    cache.portada.name = nombre_portada
+                    libro.portada.name = nombre_portada
+                    marcar_etapa(libro, 'portada')
+
+                # El worker completa lo que falte: placeholder sin página
+                # rasterizada e indexación del texto
+                if etapas_pendientes(libro):
+                    libro.estado_procesamiento = 'PENDIENTE'
+
+                libros.append(libro)
+                caches.append(cache)
+
+            with transaction.atomic():
+                CacheMetadatosPdf.objects.bulk_create(caches, ignore_conflicts=True)
+                libros = Libro.objects.bulk_create(libros)
+
+                relaciones = []
+                categorias = self._categorias_por_nombre(entrada for entrada, _ in lote)
+                for libro, (entrada, _) in zip(libros, lote):
+                    for nombre in self._nombres_categorias(entrada):
+                        relaciones.append(LibroCategoria(libro=libro, categoria=categorias[nombre]))
+                LibroCategoria.objects.bulk_create(relaciones, ignore_conflicts=True)
+
+                TareaProcesamiento.objects.bulk_create([
+                    TareaProcesamiento(libro=libro)
+                    for libro in libros if libro.estado_procesamiento == 'PENDIENTE'
+                ])
+        except BaseException:
+            for nombre in copiados:
+                default_storage.delete(nombre)
+            raise
+
+        # Versiones reducidas para srcset, una vez por portada compartida
+        for portada in {libro.portada.name: libro.portada for libro in libros if libro.portada}.values():
+            generar_derivados(portada)
+
+        self.importados += len(libros)
+        self.nuevos_ids.extend(libro.pk for libro in libros)
+        self.stdout.write(
+            f"📦 Lote guardado: {len(libros)} libros | "
+            f"{self.importados + self.omitidos + self.fallidos}/{total} | "
+            f"{self._velocidad():.1f} libros/s"
+        )
+
+    def _nombres_categorias(self, entrada):
+        return [nombre.strip() for nombre in re.split(r'[;|]', entrada.get('categorias', '')) if nombre.strip()]
+
+    def _categorias_por_nombre(self, entradas):
+        """Crear las categorías que falten y devolver un mapa nombre -> Categoria"""
+        nombres = {nombre for entrada in entradas for nombre in self._nombres_categorias(entrada)}
+        if not nombres:
+            return {}
+        Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in nombres], ignore_conflicts=True)
+        return {categoria.nombre: categoria for categoria in Categoria.objects.filter(nombre__in=nombres)}
+
+    def _velocidad(self):
+        transcurrido = time.perf_counter() - self.inicio
+        return self.importados / transcurrido if transcurrido > 0 else 0.0
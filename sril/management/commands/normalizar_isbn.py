@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sril.isbn import normalizar_isbn
+from sril.models import Libro
+
+
+class Command(BaseCommand):
+    help = (
+        'Rellena Libro.isbn13 (ISBN-13 normalizado) de los libros que aún no lo tienen. '
+        'Se puede interrumpir y volver a lanzar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Libros por cada bulk_update'
+        )
+
+    def handle(self, *args, **options):
+        # Los ISBN-13 ya ocupados, para no romper el índice único con duplicados
+        ocupados = set(Libro.objects.exclude(isbn13__isnull=True).values_list('isbn13', flat=True))
+        pendientes = Libro.objects.filter(isbn13__isnull=True).exclude(isbn__isnull=True).exclude(isbn='')
+
+        lote, normalizados, invalidos, duplicados = [], 0, 0, 0
+        # Se leen antes de escribir: en SQLite no conviene actualizar la tabla
+        # que se está recorriendo con el mismo cursor
+        for libro in list(pendientes.only('id', 'titulo', 'isbn').order_by('id')):
+            isbn13 = normalizar_isbn(libro.isbn)
+            if isbn13 is None:
+                invalidos += 1
+                continue
+            if isbn13 in ocupados:
+                duplicados += 1
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️ ISBN duplicado ({libro.isbn} → {isbn13}): {libro.titulo} (id {libro.pk})"
+                ))
+                continue
+            ocupados.add(isbn13)
+            libro.isbn13 = isbn13
+            lote.append(libro)
+            if len(lote) >= options['lote']:
+                normalizados += self._guardar(lote)
+                lote = []
+        if lote:
+            normalizados += self._guardar(lote)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ ISBN normalizados: {normalizados} | no válidos: {invalidos} | duplicados: {duplicados}"
+        ))
+
+    def _guardar(self, lote):
+        with transaction.atomic():
+            Libro.objects.bulk_update(lote, ['isbn13'])
+        return len(lote)
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from sril.tareas import reclamar_tareas, liberar_tareas_atascadas, ejecutar_tarea, inicializar_proceso
+from sril.vectores import procesar_pendientes as procesar_vectores
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker que procesa en segundo plano los PDFs encolados (metadatos y portadas) '
+        'y los vectores de contenido de los libros que las señales marcaron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+            help='Número de procesos del pool'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando la cola está vacía'
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Vaciar la cola y terminar en lugar de quedarse escuchando'
+        )
+        parser.add_argument(
+            '--minutos-atascada', type=int, default=30,
+            help='Minutos tras los cuales una tarea en PROCESANDO se vuelve a encolar'
+        )
+
+    def handle(self, *args, **options):
+        procesos = max(1, options['procesos'])
+        liberadas = liberar_tareas_atascadas(options['minutos_atascada'])
+        if liberadas:
+            self.stdout.write(f"♻️ {liberadas} tareas atascadas devueltas a la cola")
+
+        # 'spawn' evita heredar las conexiones abiertas del proceso padre
+        contexto = multiprocessing.get_context('spawn')
+        connections.close_all()
+
+        self.stdout.write(f"🚀 Worker iniciado con {procesos} procesos")
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto,
+                                 initializer=inicializar_proceso) as pool:
+            try:
+                while True:
+                    vectores = self._procesar_vectores()
+                    tareas = reclamar_tareas(procesos * 2)
+                    if not tareas:
+                        if vectores:
+                            continue
+                        if options['una_vez']:
+                            break
+                        time.sleep(options['intervalo'])
+                        continue
+
+                    for tarea_id, exito, error in pool.map(ejecutar_tarea, tareas):
+                        if exito:
+                            self.stdout.write(self.style.SUCCESS(f"✅ Tarea {tarea_id} completada"))
+                        else:
+                            self.stdout.write(self.style.ERROR(f"❌ Tarea {tarea_id} fallida: {error}"))
+            except KeyboardInterrupt:
+                self.stdout.write("⏹️ Worker detenido")
+
+    def _procesar_vectores(self):
+        try:
+            libros = procesar_vectores()
+        except ImportError:
+            # Sin numpy/scipy las marcas se quedan para cuando estén instalados
+            return 0
+        if libros:
+            self.stdout.write(self.style.SUCCESS(f"🧭 {libros} vectores de contenido actualizados"))
+        return libros
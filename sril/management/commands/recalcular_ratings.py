@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from sril.models import Libro, Puntuacion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las puntuaciones los agregados rating_count, rating_sum y rating_avg de cada libro'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Libros por cada bulk_update'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Una sola consulta agrupada con los valores reales
+            agregados = {
+                fila['libro_id']: (fila['conteo'], fila['suma'])
+                for fila in Puntuacion.objects.values('libro_id').annotate(
+                    conteo=Count('id'), suma=Sum('puntuacion')
+                )
+            }
+
+            corregidos = []
+            for libro in Libro.objects.select_for_update().only('rating_count', 'rating_sum', 'rating_avg'):
+                conteo, suma = agregados.get(libro.pk, (0, 0))
+                promedio = round(suma / conteo, 2) if conteo else 0
+                if (libro.rating_count, libro.rating_sum, libro.rating_avg) != (conteo, suma, promedio):
+                    libro.rating_count, libro.rating_sum, libro.rating_avg = conteo, suma, promedio
+                    corregidos.append(libro)
+
+            Libro.objects.bulk_update(corregidos, ['rating_count', 'rating_sum', 'rating_avg'],
+                                      batch_size=options['lote'])
+            # Las tarjetas cacheadas de esos libros muestran el rating anterior
+            Libro.invalidar_tarjetas([libro.pk for libro in corregidos])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Agregados corregidos en {len(corregidos)} libros"))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sril.similares import procesar_pendientes, recalcular_similares, vecinos_por_libro
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye la tabla de libros similares (LibroSimilar) de todo el catálogo. '
+        'Con --pendientes hace de worker: revisa solo las listas afectadas por los libros '
+        'que las señales marcaron al cambiar sus categorías o su visibilidad. El recálculo '
+        'completo conviene tras importaciones masivas y de vez en cuando para recoger los '
+        'cambios de rating'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Filas por cada inserción (o libros marcados por pasada con --pendientes)'
+        )
+        parser.add_argument(
+            '--pendientes', action='store_true',
+            help='Atender los libros marcados en lugar de recalcular todo el catálogo'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5.0,
+            help='Segundos de espera cuando no hay libros marcados'
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Con --pendientes: atender los marcados y terminar en lugar de quedarse escuchando'
+        )
+
+    def handle(self, *args, **options):
+        if options['pendientes']:
+            self._worker(options)
+            return
+
+        inicio = time.perf_counter()
+        reescritas, filas = recalcular_similares(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {reescritas} listas actualizadas, {filas} vecinos en total "
+            f"(hasta {vecinos_por_libro()} por libro) en {time.perf_counter() - inicio:.1f}s"
+        ))
+
+    def _worker(self, options):
+        lote = max(1, options['lote'])
+        self.stdout.write("🚀 Worker de libros similares iniciado")
+        try:
+            while True:
+                inicio = time.perf_counter()
+                libros, reescritas = procesar_pendientes(lote)
+                if libros:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"✅ {libros} libros cambiados: {reescritas} listas reescritas "
+                        f"en {time.perf_counter() - inicio:.1f}s"
+                    ))
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("⏹️ Worker detenido")
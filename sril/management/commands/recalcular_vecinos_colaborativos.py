@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sril.colaborativo import recalcular_vecinos_colaborativos, vecinos_por_libro
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye la tabla de vecinos colaborativos (similitud coseno ajustada entre libros '
+        'según las puntuaciones). Requiere numpy y scipy'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bloque', type=int, default=500,
+            help='Libros por cada producto de matrices (acota la memoria)'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Filas por cada bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            libros, filas = recalcular_vecinos_colaborativos(bloque=options['bloque'], tamano_lote=options['lote'])
+        except ImportError as e:
+            raise CommandError(f'Faltan dependencias ({e}): pip install -r requirements.txt')
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {filas} vecinos guardados para {libros} libros puntuados "
+            f"(hasta {vecinos_por_libro()} por libro) en {time.perf_counter() - inicio:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sril.vectores import reconstruir_vectores
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el índice de vectores de contenido (TF-IDF de título y sinopsis + categorías). '
+        'Las altas y ediciones se aplican solas; conviene ejecutarlo de vez en cuando para '
+        'recoger el vocabulario nuevo. Requiere numpy y scipy'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            libros = reconstruir_vectores()
+        except ImportError as e:
+            raise CommandError(f'Faltan dependencias ({e}): pip install -r requirements.txt')
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Índice de vectores reconstruido con {libros} libros en {time.perf_counter() - inicio:.1f}s"
+        ))
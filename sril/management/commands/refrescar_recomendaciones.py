@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sril.models import Usuario
+from sril.recomendaciones import refrescar_pendientes, refrescar_usuarios
+
+
+class Command(BaseCommand):
+    help = 'Worker que recalcula las listas de recomendaciones de los usuarios con cambios'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=100,
+            help='Usuarios por cada pasada'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando no hay usuarios pendientes'
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Atender los pendientes y terminar en lugar de quedarse escuchando'
+        )
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Recalcular las listas de todos los usuarios activos y terminar'
+        )
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        if options['todos']:
+            usuario_ids = list(Usuario.objects.filter(activo=True).order_by('pk').values_list('pk', flat=True))
+            for inicio in range(0, len(usuario_ids), lote):
+                refrescar_usuarios(usuario_ids[inicio:inicio + lote])
+                self.stdout.write(f"📦 {min(inicio + lote, len(usuario_ids))}/{len(usuario_ids)} usuarios")
+            self.stdout.write(self.style.SUCCESS(f"✅ Listas recalculadas: {len(usuario_ids)}"))
+            return
+
+        self.stdout.write("🚀 Worker de recomendaciones iniciado")
+        try:
+            while True:
+                refrescados = refrescar_pendientes(lote)
+                if refrescados:
+                    self.stdout.write(self.style.SUCCESS(f"✅ {refrescados} listas recalculadas"))
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("⏹️ Worker detenido")
@@ -0,0 +1,60 @@
+import time
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from sril.cache_paginas import invalidar_etiquetas
+from sril.models import Libro
+from sril.portadas import generar_derivados, renderizar_placeholders
+
+
+class Command(BaseCommand):
+    help = 'Regenera en lote las portadas placeholder (y las que falten con --sin-portada)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Portadas por lote')
+        parser.add_argument(
+            '--sin-portada', action='store_true',
+            help='Incluir también los libros que no tienen ninguna portada'
+        )
+
+    def handle(self, *args, **options):
+        filtro = Q(portada__contains='portada_placeholder_')
+        if options['sin_portada']:
+            filtro |= Q(portada='') | Q(portada__isnull=True)
+        libros = Libro.objects.filter(filtro).only('id', 'titulo', 'autor', 'portada').order_by('id')
+
+        inicio = time.perf_counter()
+        total = 0
+        lote = []
+        for libro in libros.iterator(chunk_size=options['lote']):
+            lote.append(libro)
+            if len(lote) >= options['lote']:
+                total += self._procesar_lote(lote)
+                lote = []
+        if lote:
+            total += self._procesar_lote(lote)
+
+        transcurrido = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total} portadas placeholder regeneradas en {transcurrido:.1f} s"
+        ))
+
+    def _procesar_lote(self, lote):
+        imagenes = renderizar_placeholders((libro.id, libro.titulo, libro.autor) for libro in lote)
+        campo = Libro._meta.get_field('portada')
+        for libro in lote:
+            nombre = campo.generate_filename(libro, libro.nombre_portada_placeholder)
+            # Se reescribe con el mismo nombre en lugar de acumular sufijos
+            if campo.storage.exists(nombre):
+                campo.storage.delete(nombre)
+            libro.portada.name = campo.storage.save(nombre, ContentFile(imagenes[libro.id]))
+            generar_derivados(libro.portada)
+        Libro.objects.bulk_update(lote, ['portada'])
+        # bulk_update no envía señales: las tarjetas y páginas cacheadas
+        # seguirían mostrando la portada anterior
+        Libro.invalidar_tarjetas([libro.pk for libro in lote])
+        invalidar_etiquetas('catalogo', *(f'libro:{libro.pk}' for libro in lote))
+        self.stdout.write(f"📦 Lote de {len(lote)} portadas")
+        return len(lote)
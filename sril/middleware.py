@@ -0,0 +1,49 @@
+# sril/middleware.py
+from django.conf import settings
+
+from .consultas import ATRIBUTO_PRESUPUESTO, RegistroConsultas
+
+
+class RegistroConsultasMiddleware:
+    """
+    Registrar las consultas de cada petición (solo con
+    ``REGISTRO_CONSULTAS`` activo, por defecto en DEBUG).
+
+    Añade las cabeceras ``X-Consultas`` y ``X-Tiempo-SQL`` e imprime un
+    informe cuando la vista supera su presupuesto o repite consultas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, 'REGISTRO_CONSULTAS', settings.DEBUG)
+        self.presupuesto_defecto = getattr(settings, 'PRESUPUESTO_CONSULTAS', None)
+        self.umbral_repeticiones = getattr(settings, 'UMBRAL_CONSULTAS_REPETIDAS', 3)
+
+    def __call__(self, request):
+        if not self.activo:
+            return self.get_response(request)
+
+        with RegistroConsultas() as registro:
+            response = self.get_response(request)
+            # Las respuestas de plantilla se renderizan aquí; las consultas
+            # perezosas de la plantilla cuentan para la vista
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                response.render()
+
+        presupuesto = getattr(request, '_presupuesto_consultas', self.presupuesto_defecto)
+        response['X-Consultas'] = str(registro.total)
+        response['X-Tiempo-SQL'] = f"{registro.tiempo_total * 1000:.1f}ms"
+
+        excedido = presupuesto is not None and registro.total_presupuesto > presupuesto
+        repetidas = registro.repetidas(self.umbral_repeticiones)
+        if excedido or repetidas:
+            icono = '🚨' if excedido else '⚠️'
+            limite = f" (presupuesto {presupuesto})" if presupuesto is not None else ''
+            print(registro.informe(f"{icono} {request.method} {request.path}{limite}:"))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        presupuesto = getattr(view_func, ATRIBUTO_PRESUPUESTO, None)
+        if presupuesto is not None:
+            request._presupuesto_consultas = presupuesto
+        return None
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0003_remove_libro_sril_libro_titulo_751fe7_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaProcesamiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea de Procesamiento',
+                'verbose_name_plural': 'Tareas de Procesamiento',
+                'ordering': ['fecha_creacion'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='libro',
+            options={'ordering': ['titulo'], 'verbose_name': 'Libro', 'verbose_name_plural': 'Libros'},
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('FALLIDO', 'Fallido')], default='COMPLETADO', help_text='Estado de la extracción de metadatos y portada del PDF', max_length=20, verbose_name='Procesamiento del PDF'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='activo',
+            field=models.BooleanField(default=True, verbose_name='Activo'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='archivo_pdf',
+            field=models.FileField(blank=True, help_text='Subir archivo PDF del libro', null=True, upload_to='libros/pdfs/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf'])], verbose_name='Archivo PDF'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='autor',
+            field=models.CharField(max_length=255, verbose_name='Autor'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='categorias',
+            field=models.ManyToManyField(through='sril.LibroCategoria', to='sril.categoria', verbose_name='Categorías'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='disponible_descarga',
+            field=models.BooleanField(default=False, help_text='¿Está disponible para descarga?', verbose_name='Disponible para descarga'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='editorial',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Editorial'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='fecha_creacion',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='fecha_publicacion',
+            field=models.DateField(blank=True, null=True, verbose_name='Fecha de publicación'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='isbn',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True, verbose_name='ISBN'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='numero_paginas',
+            field=models.PositiveIntegerField(default=0, verbose_name='Número de páginas'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='portada',
+            field=models.ImageField(blank=True, help_text='Portada generada automáticamente desde el PDF', null=True, upload_to='libros/portadas/', verbose_name='Portada'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='sinopsis',
+            field=models.TextField(blank=True, null=True, verbose_name='Sinopsis'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='tiempo_lectura_promedio',
+            field=models.PositiveIntegerField(default=0, help_text='Tiempo promedio de lectura en minutos', verbose_name='Tiempo de lectura'),
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='titulo',
+            field=models.CharField(max_length=255, verbose_name='Título'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['titulo'], name='sril_libro_titulo_751fe7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['autor'], name='sril_libro_autor_e53e3d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['fecha_publicacion'], name='sril_libro_fecha_p_c9179c_idx'),
+        ),
+        migrations.AddField(
+            model_name='tareaprocesamiento',
+            name='libro',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tareas_procesamiento', to='sril.libro'),
+        ),
+        migrations.AddIndex(
+            model_name='tareaprocesamiento',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='sril_tareap_estado_8d4824_idx'),
+        ),
+    ]
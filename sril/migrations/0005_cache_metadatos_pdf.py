@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0004_procesamiento_en_segundo_plano'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheMetadatosPdf',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=64, unique=True)),
+                ('numero_paginas', models.PositiveIntegerField(default=0)),
+                ('tiempo_lectura_promedio', models.PositiveIntegerField(default=0)),
+                ('portada', models.ImageField(blank=True, null=True, upload_to='libros/portadas/cache/')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Caché de PDF',
+                'verbose_name_plural': 'Caché de PDFs',
+            },
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='huella_pdf',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 del archivo PDF', max_length=64, null=True, verbose_name='Huella del PDF'),
+        ),
+        migrations.AddField(
+            model_name='tareaprocesamiento',
+            name='forzar',
+            field=models.BooleanField(default=False, help_text='Ignorar la caché por huella y volver a procesar el PDF'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0005_cache_metadatos_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='etapas_completadas',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versión del PDF procesada por cada etapa del pipeline', verbose_name='Etapas completadas'),
+        ),
+    ]
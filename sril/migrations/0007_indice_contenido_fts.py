@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    # FTS5 solo existe en SQLite; en otros motores la búsqueda usa icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS sril_libro_contenido_fts "
+        "USING fts5(sinopsis, contenido, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS sril_libro_contenido_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0006_etapas_pipeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
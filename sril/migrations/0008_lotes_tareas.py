@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0007_indice_contenido_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareaprocesamiento',
+            name='etapas',
+            field=models.JSONField(blank=True, default=list, help_text='Etapas que se repiten con forzar (vacío = todas)'),
+        ),
+        migrations.CreateModel(
+            name='LoteTareas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descripcion', models.CharField(max_length=255)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lote de Tareas',
+                'verbose_name_plural': 'Lotes de Tareas',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tareaprocesamiento',
+            name='lote',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tareas', to='sril.lotetareas'),
+        ),
+    ]
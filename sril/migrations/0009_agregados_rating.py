@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+def calcular_agregados(apps, schema_editor):
+    """Rellenar los agregados con las puntuaciones ya existentes"""
+    from django.db.models import Count, Sum
+
+    Libro = apps.get_model('sril', 'Libro')
+    Puntuacion = apps.get_model('sril', 'Puntuacion')
+    libros = []
+    for fila in Puntuacion.objects.values('libro_id').annotate(conteo=Count('id'), suma=Sum('puntuacion')):
+        libros.append(Libro(
+            pk=fila['libro_id'],
+            rating_count=fila['conteo'],
+            rating_sum=fila['suma'],
+            rating_avg=round(fila['suma'] / fila['conteo'], 2),
+        ))
+    Libro.objects.bulk_update(libros, ['rating_count', 'rating_sum', 'rating_avg'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0008_lotes_tareas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='rating_avg',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=3, verbose_name='Puntuación promedio'),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de puntuaciones'),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(calcular_agregados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+COLUMNAS = 'titulo, autor, editorial, sinopsis'
+
+# Índice FTS5 de contenido externo sobre sril_libro: los triggers lo mantienen
+# al día también con bulk_create y update(), que no envían señales
+SQL_CREAR = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS sril_libro_fts USING fts5(
+        {COLUMNAS},
+        content = 'sril_libro',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS sril_libro_fts_ai AFTER INSERT ON sril_libro BEGIN
+        INSERT INTO sril_libro_fts(rowid, {COLUMNAS})
+        VALUES (new.id, new.titulo, new.autor, new.editorial, new.sinopsis);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS sril_libro_fts_ad AFTER DELETE ON sril_libro BEGIN
+        INSERT INTO sril_libro_fts(sril_libro_fts, rowid, {COLUMNAS})
+        VALUES ('delete', old.id, old.titulo, old.autor, old.editorial, old.sinopsis);
+    END""",
+    # Solo cuando cambian las columnas indexadas (no en cada UPDATE de ratings o estado)
+    f"""CREATE TRIGGER IF NOT EXISTS sril_libro_fts_au AFTER UPDATE OF {COLUMNAS} ON sril_libro BEGIN
+        INSERT INTO sril_libro_fts(sril_libro_fts, rowid, {COLUMNAS})
+        VALUES ('delete', old.id, old.titulo, old.autor, old.editorial, old.sinopsis);
+        INSERT INTO sril_libro_fts(rowid, {COLUMNAS})
+        VALUES (new.id, new.titulo, new.autor, new.editorial, new.sinopsis);
+    END""",
+    "INSERT INTO sril_libro_fts(sril_libro_fts) VALUES ('rebuild')",
+]
+
+SQL_ELIMINAR = [
+    "DROP TRIGGER IF EXISTS sril_libro_fts_ai",
+    "DROP TRIGGER IF EXISTS sril_libro_fts_ad",
+    "DROP TRIGGER IF EXISTS sril_libro_fts_au",
+    "DROP TABLE IF EXISTS sril_libro_fts",
+]
+
+
+def crear_indice(apps, schema_editor):
+    # FTS5 solo existe en SQLite; en otros motores la búsqueda usa icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQL_ELIMINAR:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0009_agregados_rating'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:34
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite añade esta columna rehaciendo sril_libro (crear, copiar, borrar y
+# renombrar), y al borrar la tabla original se pierden los triggers del
+# índice FTS5 del catálogo: hay que volver a crearlos después
+indice_catalogo = import_module('sril.migrations.0010_indice_catalogo_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0010_indice_catalogo_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, indice_catalogo.crear_indice),
+        migrations.AddField(
+            model_name='libro',
+            name='version_cache',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(indice_catalogo.crear_indice, migrations.RunPython.noop),
+    ]
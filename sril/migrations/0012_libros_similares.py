@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0011_version_cache_tarjeta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibroSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='sril.libro')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sril.libro')),
+            ],
+            options={
+                'verbose_name': 'Libro similar',
+                'verbose_name_plural': 'Libros similares',
+                'indexes': [models.Index(fields=['libro', '-score'], name='sril_libros_libro_i_4037a4_idx')],
+                'unique_together': {('libro', 'similar')},
+            },
+        ),
+    ]
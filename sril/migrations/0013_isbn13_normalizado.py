@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:48
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Igual que en 0011: rehacer sril_libro en SQLite borra los triggers del
+# índice FTS5 del catálogo. Los valores los rellena ``manage.py normalizar_isbn``
+indice_catalogo = import_module('sril.migrations.0010_indice_catalogo_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0012_libros_similares'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, indice_catalogo.crear_indice),
+        migrations.AddField(
+            model_name='libro',
+            name='isbn13',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True, unique=True),
+        ),
+        migrations.RunPython(indice_catalogo.crear_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0013_isbn13_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VecinoColaborativo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similitud', models.FloatField()),
+                ('usuarios_comunes', models.PositiveIntegerField(default=0)),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vecinos_colaborativos', to='sril.libro')),
+                ('vecino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sril.libro')),
+            ],
+            options={
+                'verbose_name': 'Vecino colaborativo',
+                'verbose_name_plural': 'Vecinos colaborativos',
+                'indexes': [models.Index(fields=['libro', '-similitud'], name='sril_vecino_libro_i_db15d9_idx')],
+                'unique_together': {('libro', 'vecino')},
+            },
+        ),
+    ]
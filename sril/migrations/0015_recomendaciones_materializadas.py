@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0014_vecinos_colaborativos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecomendacionPendiente',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('fecha_cambio', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Recomendación pendiente',
+                'verbose_name_plural': 'Recomendaciones pendientes',
+                'indexes': [models.Index(fields=['fecha_cambio'], name='sril_recome_fecha_c_0f3669_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecomendacionUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seccion', models.CharField(choices=[('PREFERENCIAS', 'Según tus preferencias'), ('SIMILARES', 'De usuarios con gustos parecidos')], max_length=20)),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sril.libro')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Recomendación de usuario',
+                'verbose_name_plural': 'Recomendaciones de usuarios',
+                'indexes': [models.Index(fields=['usuario', 'seccion', 'posicion'], name='sril_recome_usuario_36252d_idx')],
+                'unique_together': {('usuario', 'libro')},
+            },
+        ),
+    ]
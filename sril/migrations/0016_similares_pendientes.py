@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0015_recomendaciones_materializadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarPendiente',
+            fields=[
+                ('libro', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='sril.libro')),
+                ('fecha_cambio', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Similar pendiente',
+                'verbose_name_plural': 'Similares pendientes',
+                'indexes': [models.Index(fields=['fecha_cambio'], name='sril_simila_fecha_c_e552d0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+
+def _huella(ruta, tamano_bloque=1024 * 1024):
+    # Copia de procesamiento_pdf.calcular_huella: las migraciones no dependen del código actual
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def marcar_etapas(apps, schema_editor):
+    """
+    Los libros anteriores al pipeline tienen ``etapas_completadas`` vacío y el
+    primer guardado desde el admin volvería a procesar el PDF y reemplazaría
+    su portada. Se marcan como hechas las etapas cuyo resultado ya existe:
+    huella (calculándola si el PDF está en disco), metadatos si hay número de
+    páginas y portada si la hay. La indexación del texto queda pendiente para
+    ``manage.py encolar_pendientes``.
+    """
+    Libro = apps.get_model('sril', 'Libro')
+    libros = Libro.objects.exclude(archivo_pdf='').exclude(archivo_pdf__isnull=True).only(
+        'id', 'archivo_pdf', 'portada', 'numero_paginas', 'huella_pdf', 'etapas_completadas'
+    )
+    cambiados = []
+    for libro in libros.iterator(chunk_size=500):
+        etapas = dict(libro.etapas_completadas or {})
+        if not libro.huella_pdf:
+            try:
+                libro.huella_pdf = _huella(default_storage.path(libro.archivo_pdf.name))
+            except (OSError, NotImplementedError):
+                pass
+        # Misma versión que pipeline.version_etapa: sin el PDF en disco, su nombre
+        version = libro.huella_pdf or f"archivo:{libro.archivo_pdf.name}"
+        etapas.setdefault('huella', libro.archivo_pdf.name)
+        if libro.numero_paginas > 0:
+            etapas.setdefault('metadatos', version)
+        if libro.portada:
+            etapas.setdefault('portada', version)
+        if etapas != libro.etapas_completadas:
+            libro.etapas_completadas = etapas
+            cambiados.append(libro)
+    Libro.objects.bulk_update(cambiados, ['huella_pdf', 'etapas_completadas'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0016_similares_pendientes'),
+    ]
+
+    operations = [
+        migrations.RunPython(marcar_etapas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def marcar_calculadas(apps, schema_editor):
+    # Los usuarios que ya tienen lista se calcularon antes de existir la marca
+    RecomendacionUsuario = apps.get_model('sril', 'RecomendacionUsuario')
+    RecomendacionCalculada = apps.get_model('sril', 'RecomendacionCalculada')
+    ahora = timezone.now()
+    usuario_ids = RecomendacionUsuario.objects.values_list('usuario_id', flat=True).distinct()
+    RecomendacionCalculada.objects.bulk_create(
+        [RecomendacionCalculada(usuario_id=usuario_id, fecha_calculo=ahora) for usuario_id in usuario_ids],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0017_marcar_etapas_existentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecomendacionCalculada',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('fecha_calculo', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Recomendación calculada',
+                'verbose_name_plural': 'Recomendaciones calculadas',
+            },
+        ),
+        migrations.RunPython(marcar_calculadas, migrations.RunPython.noop),
+    ]
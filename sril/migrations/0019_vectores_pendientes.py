@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0018_recomendaciones_calculadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VectorPendiente',
+            fields=[
+                ('libro_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_cambio', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Vector pendiente',
+                'verbose_name_plural': 'Vectores pendientes',
+                'indexes': [models.Index(fields=['fecha_cambio'], name='sril_vector_fecha_c_54d9fe_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:52
+
+import struct
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _a_bytes(libro_ids):
+    # Mismo formato que sril.vistos.Vistos.a_bytes: las migraciones no dependen del código actual
+    bloques = defaultdict(int)
+    for libro_id in libro_ids:
+        bloques[libro_id >> 16] |= 1 << (libro_id & 0xFFFF)
+    partes = []
+    for bloque in sorted(bloques):
+        longitud = (bloques[bloque].bit_length() + 7) // 8
+        partes.append(struct.pack('<II', bloque, longitud) + bloques[bloque].to_bytes(longitud, 'little'))
+    return b''.join(partes)
+
+
+def llenar_vistos(apps, schema_editor):
+    Puntuacion = apps.get_model('sril', 'Puntuacion')
+    HistorialLectura = apps.get_model('sril', 'HistorialLectura')
+    VistosUsuario = apps.get_model('sril', 'VistosUsuario')
+    vistos = defaultdict(set)
+    for modelo in (Puntuacion, HistorialLectura):
+        for usuario_id, libro_id in modelo.objects.values_list('usuario_id', 'libro_id').iterator(chunk_size=5000):
+            vistos[usuario_id].add(libro_id)
+    VistosUsuario.objects.bulk_create(
+        [VistosUsuario(usuario_id=usuario_id, bits=_a_bytes(libro_ids)) for usuario_id, libro_ids in vistos.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sril', '0019_vectores_pendientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VistosUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('bits', models.BinaryField(default=bytes)),
+            ],
+            options={
+                'verbose_name': 'Libros vistos',
+                'verbose_name_plural': 'Libros vistos',
+            },
+        ),
+        migrations.RunPython(llenar_vistos, migrations.RunPython.noop),
+    ]
@@ -3,10 +3,24 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
 from pdf2image import convert_from_path
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import tempfile
 from io import BytesIO
 from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db import transaction
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from .isbn import normalizar_isbn
+
+# Estimación del tiempo de lectura a partir de las palabras muestreadas
+PALABRAS_POR_MINUTO = 200
+MINUTOS_MINIMOS_POR_PAGINA = 0.25
+
+# Columnas desnormalizadas de Libro que solo actualiza Libro.acumular_puntuacion
+CAMPOS_RATING = ('rating_count', 'rating_sum', 'rating_avg')
+# Columnas que solo se escriben con UPDATE ... F(): un guardado completo no las pisa
+CAMPOS_SOLO_UPDATE = CAMPOS_RATING + ('version_cache',)
 
 class UsuarioManager(BaseUserManager):
     def create_user(self, email, nombre, password=None, **extra_fields):
@@ -83,6 +97,13 @@ class Categoria(models.Model):
         return self.nombre
 
 class Libro(models.Model):
+    ESTADO_PROCESAMIENTO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+    
     # Campos básicos
     titulo = models.CharField(max_length=255, verbose_name="Título")
     autor = models.CharField(max_length=255, verbose_name="Autor")
@@ -93,6 +114,9 @@ class Libro(models.Model):
         null=True,
         verbose_name="ISBN"
     )
+    # ISBN-13 normalizado (sin guiones; los ISBN-10 se convierten) para buscar
+    # por ISBN con una sola consulta por índice. Lo rellena save()
+    isbn13 = models.CharField(max_length=13, unique=True, blank=True, null=True, editable=False)
     sinopsis = models.TextField(blank=True, null=True, verbose_name="Sinopsis")
     numero_paginas = models.PositiveIntegerField(
         default=0,
@@ -136,6 +160,44 @@ class Libro(models.Model):
         help_text="¿Está disponible para descarga?",
         verbose_name="Disponible para descarga"
     )
+    huella_pdf = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        help_text="SHA-256 del archivo PDF",
+        verbose_name="Huella del PDF"
+    )
+    estado_procesamiento = models.CharField(
+        max_length=20,
+        choices=ESTADO_PROCESAMIENTO_CHOICES,
+        default='COMPLETADO',
+        help_text="Estado de la extracción de metadatos y portada del PDF",
+        verbose_name="Procesamiento del PDF"
+    )
+    etapas_completadas = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Versión del PDF procesada por cada etapa del pipeline",
+        verbose_name="Etapas completadas"
+    )
+    
+    # Agregados de puntuaciones, mantenidos al guardar/borrar cada Puntuacion
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Número de puntuaciones")
+    rating_sum = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    rating_avg = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name="Puntuación promedio"
+    )
+    # Versión de la tarjeta cacheada (sril/tarjetas.py): sube con cada cambio
+    # del libro, sus categorías o sus puntuaciones
+    version_cache = models.PositiveIntegerField(default=1, editable=False)
     
     # Relaciones
     categorias = models.ManyToManyField(
@@ -162,52 +224,110 @@ class Libro(models.Model):
     def __str__(self):
         return f"{self.titulo} - {self.autor}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Visibilidad leída de la base de datos: las señales comparan con ella
+        # para saber si un guardado cambió ``activo`` sin volver a consultar
+        instancia._activo_cargado = instancia.__dict__.get('activo')
+        return instancia
+    
+    def clean(self):
+        """El mismo ISBN escrito de otra forma (guiones, ISBN-10) ya es un duplicado"""
+        super().clean()
+        isbn13 = normalizar_isbn(self.isbn)
+        if isbn13 and Libro.objects.filter(isbn13=isbn13).exclude(pk=self.pk).exists():
+            raise ValidationError({'isbn': 'Ya existe un libro con este ISBN.'})
+    
     def save(self, *args, **kwargs):
         """
-        Sobrescribir save para extraer metadatos del PDF automáticamente
+        Sobrescribir save para encolar el procesamiento del PDF.
+        La extracción de metadatos y la portada se hacen en segundo plano
+        con ``python manage.py procesar_tareas`` (ver ``sril/pipeline.py``).
         """
-        # Verificar si es un nuevo libro o el PDF cambió
-        es_nuevo = not self.pk
-        pdf_cambiado = False
+        from .pipeline import etapas_pendientes
         
-        if not es_nuevo:
-            try:
-                libro_original = Libro.objects.get(pk=self.pk)
-                pdf_cambiado = (libro_original.archivo_pdf != self.archivo_pdf)
-            except Libro.DoesNotExist:
-                pass
+        self.isbn13 = normalizar_isbn(self.isbn)
         
-        # Guardar el objeto primero (necesario para tener self.id)
-        super().save(*args, **kwargs)
+        # Los guardados parciales (p. ej. los del worker) no encolan nada
+        if kwargs.get('update_fields') is not None:
+            if 'isbn' in kwargs['update_fields']:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'isbn13']
+            super().save(*args, **kwargs)
+            return
         
-        cambios_realizados = False
+        # Los agregados de puntuaciones y la versión de caché solo se escriben con F():
+        # una instancia cargada antes no debe pisar los valores actuales
+        if not self._state.adding and self.pk:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in CAMPOS_SOLO_UPDATE
+            ]
         
-        # Extraer número de páginas si el PDF es nuevo o cambió
-        if (es_nuevo or pdf_cambiado) and self.archivo_pdf:
-            print(f"📄 Extrayendo metadatos para: {self.titulo}")
-            if self.extraer_metadatos_pdf():
-                cambios_realizados = True
+        # Las marcas de etapa ya dicen si el PDF es nuevo, cambió o falta la portada,
+        # sin releer la fila original
+        requiere_procesamiento = bool(etapas_pendientes(self))
+        if requiere_procesamiento:
+            self.estado_procesamiento = 'PENDIENTE'
         
-        # Generar portada si es necesario
-        if (pdf_cambiado or not self.portada) and self.archivo_pdf:
-            print(f"🔄 Generando portada para: {self.titulo}")
-            if self.generar_portada_desde_pdf():
-                cambios_realizados = True
+        super().save(*args, **kwargs)
         
-        # Guardar nuevamente si hubo cambios en los campos
-        if cambios_realizados:
-            update_fields = []
-            if hasattr(self, '_numero_paginas_actualizado'):
-                update_fields.append('numero_paginas')
-            if hasattr(self, '_tiempo_lectura_actualizado'):
-                update_fields.append('tiempo_lectura_promedio')
-            if self.portada:
-                update_fields.append('portada')
-            
-            if update_fields:
-                super().save(update_fields=update_fields)
+        if requiere_procesamiento:
+            self.encolar_procesamiento()
+    
+    def encolar_procesamiento(self, forzar=False):
+        """
+        Crear una tarea de procesamiento si no hay otra pendiente.
+        Con ``forzar`` se ignora la caché por huella y se vuelve a procesar el PDF.
+        """
+        # Una tarea ya en curso puede estar leyendo una versión anterior del PDF,
+        # así que solo se reutilizan las pendientes
+        tarea = self.tareas_procesamiento.filter(estado='PENDIENTE').first()
+        if tarea:
+            if forzar and not tarea.forzar:
+                tarea.forzar = True
+                tarea.save(update_fields=['forzar'])
+            return tarea
+        
+        print(f"📥 Procesamiento encolado para: {self.titulo}")
+        return TareaProcesamiento.objects.create(libro=self, forzar=forzar)
     
-    def extraer_metadatos_pdf(self):
+    def procesar_pdf(self, forzar=False, etapas=None):
+        """
+        Ejecutar las etapas pendientes del pipeline de ingesta (huella,
+        metadatos, portada y texto). Se ejecuta en el worker, fuera del ciclo de la petición.
+        """
+        from .pipeline import ejecutar_pipeline
+        return ejecutar_pipeline(self, forzar=forzar, etapas=etapas)
+    
+    def _eliminar_portada(self):
+        """Eliminar el archivo de portada salvo que sea una portada compartida de la caché"""
+        if not self.portada:
+            return
+        if self.portada.name.startswith(CacheMetadatosPdf.DIRECTORIO_PORTADAS):
+            self.portada.name = None
+            return
+        try:
+            self.portada.delete(save=False)
+        except:
+            pass
+    
+    def sondear_pdf(self, renderizar_portada=True):
+        """Abrir el PDF una sola vez: páginas, metadatos, primera página y muestra de texto"""
+        from .procesamiento_pdf import sondear_pdf, formatear_tiempos, PAGINAS_MUESTRA
+        
+        if not self.archivo_pdf or not os.path.exists(self.archivo_pdf.path):
+            return None
+        
+        sondeo = sondear_pdf(
+            self.archivo_pdf.path,
+            renderizar_portada=renderizar_portada,
+            paginas_muestra=getattr(settings, 'PAGINAS_MUESTRA_LECTURA', PAGINAS_MUESTRA),
+        )
+        print(f"   ⏱️ Sondeo del PDF: {formatear_tiempos(sondeo['tiempos'])}")
+        return sondeo
+    
+    def extraer_metadatos_pdf(self, sondeo=None):
         """
         Extraer metadatos del PDF: número de páginas y calcular tiempo de lectura
         """
@@ -215,8 +335,11 @@ class Libro(models.Model):
             if not self.archivo_pdf or not os.path.exists(self.archivo_pdf.path):
                 return False
             
+            if sondeo is None:
+                sondeo = self.sondear_pdf(renderizar_portada=False)
+            
             # Extraer número de páginas
-            num_paginas = self._extraer_numero_paginas()
+            num_paginas = self._extraer_numero_paginas(sondeo)
             if num_paginas > 0:
                 self.numero_paginas = num_paginas
                 self._numero_paginas_actualizado = True
@@ -225,7 +348,7 @@ class Libro(models.Model):
                 print("   ⚠️ No se pudo extraer el número de páginas")
             
             # Calcular tiempo de lectura estimado
-            tiempo_lectura = self._calcular_tiempo_lectura()
+            tiempo_lectura = self._calcular_tiempo_lectura(sondeo and sondeo.get('palabras_por_pagina'))
             if tiempo_lectura > 0:
                 self.tiempo_lectura_promedio = tiempo_lectura
                 self._tiempo_lectura_actualizado = True
@@ -237,16 +360,15 @@ class Libro(models.Model):
             print(f"   ❌ Error extrayendo metadatos: {str(e)}")
             return False
     
-    def _extraer_numero_paginas(self):
+    def _extraer_numero_paginas(self, sondeo=None):
         """
         Extraer número de páginas usando múltiples métodos
         """
-        # Intentar con PyPDF2 primero (más eficiente)
-        paginas = self._extraer_paginas_pypdf2()
-        if paginas > 0:
-            return paginas
+        # El sondeo (pypdfium2 o PyPDF2) ya abrió el documento
+        if sondeo and sondeo['paginas'] > 0:
+            return sondeo['paginas']
         
-        # Intentar con pdfplumber (más preciso)
+        # Intentar con pdfplumber (otro parser, por si el sondeo falló)
         paginas = self._extraer_paginas_pdfplumber()
         if paginas > 0:
             return paginas
@@ -255,22 +377,6 @@ class Libro(models.Model):
         paginas = self._estimar_paginas_por_tamaño()
         return paginas
     
-    def _extraer_paginas_pypdf2(self):
-        """Extraer páginas usando PyPDF2"""
-        try:
-            import PyPDF2
-            
-            with open(self.archivo_pdf.path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                return len(pdf_reader.pages)
-                
-        except ImportError:
-            print("   📚 PyPDF2 no está instalado")
-            return 0
-        except Exception as e:
-            print(f"   ❌ Error con PyPDF2: {str(e)}")
-            return 0
-    
     def _extraer_paginas_pdfplumber(self):
         """Extraer páginas usando pdfplumber"""
         try:
@@ -306,13 +412,20 @@ class Libro(models.Model):
         except:
             return 1  # Mínimo 1 página
     
-    def _calcular_tiempo_lectura(self):
+    def _calcular_tiempo_lectura(self, palabras_por_pagina=None):
         """
-        Calcular tiempo de lectura estimado basado en número de páginas
+        Calcular tiempo de lectura estimado.
+        Con ``palabras_por_pagina`` (muestreadas del PDF) se extrapola el total
+        de palabras; sin muestra se usa una estimación por número de páginas.
         """
         if self.numero_paginas <= 0:
             return 0
         
+        if palabras_por_pagina is not None:
+            # Las páginas casi sin texto (imágenes, diagramas) también llevan su tiempo
+            minutos_por_pagina = max(palabras_por_pagina / PALABRAS_POR_MINUTO, MINUTOS_MINIMOS_POR_PAGINA)
+            return max(5, round(self.numero_paginas * minutos_por_pagina))
+        
         # Tiempo promedio de lectura por página (en minutos)
         # Basado en estudios de velocidad de lectura
         tiempo_por_pagina = 2.0  # 2 minutos por página en promedio
@@ -327,11 +440,18 @@ class Libro(models.Model):
         
         return max(5, round(tiempo_total))  # Mínimo 5 minutos
     
-    def generar_portada_desde_pdf(self):
+    def generar_portada_desde_pdf(self, sondeo=None):
         """
-        Generar portada desde PDF usando pdf2image o crear placeholder
+        Generar portada desde PDF usando la página rasterizada en el sondeo,
+        pdf2image o crear placeholder
         """
-        # Primero intentar con pdf2image
+        # Primero usar la página ya rasterizada durante el sondeo
+        if sondeo and sondeo['portada'] is not None:
+            if self._guardar_imagen_portada(sondeo['portada']):
+                print(f"   ✅ Portada generada desde PDF")
+                return True
+        
+        # Después intentar con pdf2image
         if self._generar_portada_con_pdf2image():
             return True
         
@@ -366,27 +486,9 @@ class Libro(models.Model):
             max_size = (400, 600)
             portada_image.thumbnail(max_size, Image.Resampling.LANCZOS)
             
-            # Convertir a JPEG en memoria
-            buffer = BytesIO()
-            portada_image.save(buffer, format='JPEG', quality=85)
-            buffer.seek(0)
-            
-            # Crear nombre de archivo
-            nombre_base = os.path.splitext(os.path.basename(self.archivo_pdf.name))[0]
-            portada_filename = f"portada_{self.id}_{nombre_base}.jpg"
-            
-            # Eliminar portada existente si la hay
-            if self.portada:
-                try:
-                    self.portada.delete(save=False)
-                except:
-                    pass
-            
-            # Guardar nueva portada
-            self.portada.save(portada_filename, ContentFile(buffer.read()), save=False)
-            
-            print(f"   ✅ Portada generada desde PDF")
-            return True
+            if self._guardar_imagen_portada(portada_image):
+                print(f"   ✅ Portada generada desde PDF")
+                return True
             
         except ImportError:
             print("   📚 pdf2image no está instalado")
@@ -395,84 +497,36 @@ class Libro(models.Model):
         
         return False
     
+    def _guardar_imagen_portada(self, portada_image):
+        """Guardar una imagen PIL como portada JPEG del libro"""
+        # Convertir a JPEG en memoria
+        buffer = BytesIO()
+        portada_image.save(buffer, format='JPEG', quality=85)
+        buffer.seek(0)
+        
+        # Crear nombre de archivo
+        nombre_base = os.path.splitext(os.path.basename(self.archivo_pdf.name))[0]
+        portada_filename = f"portada_{self.id}_{nombre_base}.jpg"
+        
+        # Eliminar portada existente si la hay
+        self._eliminar_portada()
+        
+        # Guardar nueva portada
+        self.portada.save(portada_filename, ContentFile(buffer.read()), save=False)
+        return True
+    
     def _crear_portada_placeholder(self):
         """Crear una portada placeholder elegante"""
+        from .portadas import renderizar_placeholder_jpeg
+        
         try:
-            # Dimensiones de la portada
-            width, height = 400, 600
-            
-            # Colores (azul profesional)
-            background_color = (41, 128, 185)  # Azul
-            title_color = (255, 255, 255)      # Blanco
-            author_color = (236, 240, 241)     # Gris claro
-            accent_color = (52, 152, 219)      # Azul claro
-            
-            # Crear imagen base
-            image = Image.new('RGB', (width, height), background_color)
-            draw = ImageDraw.Draw(image)
-            
-            # Intentar cargar fuentes
-            title_font = self._obtener_fuente(24, True)
-            author_font = self._obtener_fuente(16)
-            info_font = self._obtener_fuente(12)
-            
-            # Dibujar elementos decorativos
-            self._dibujar_elementos_decorativos(draw, width, height, accent_color)
-            
-            # Preparar texto del título (dividir en líneas)
-            lineas_titulo = self._dividir_texto(self.titulo, 25)
-            
-            # Calcular posición vertical para centrar
-            total_text_height = len(lineas_titulo) * 30 + 40
-            y_start = (height - total_text_height) // 2
-            
-            # Dibujar título
-            for i, linea in enumerate(lineas_titulo):
-                bbox = draw.textbbox((0, 0), linea, font=title_font)
-                text_width = bbox[2] - bbox[0]
-                x = (width - text_width) // 2
-                y = y_start + (i * 30)
-                
-                # Sombra del texto
-                draw.text((x+1, y+1), linea, fill=(31, 97, 141), font=title_font)
-                # Texto principal
-                draw.text((x, y), linea, fill=title_color, font=title_font)
-            
-            # Dibujar autor
-            autor_y = y_start + len(lineas_titulo) * 30 + 10
-            autor_text = f"por {self.autor}"
-            bbox = draw.textbbox((0, 0), autor_text, font=author_font)
-            autor_width = bbox[2] - bbox[0]
-            autor_x = (width - autor_width) // 2
-            
-            draw.text((autor_x, autor_y), autor_text, fill=author_color, font=author_font)
-            
-            # Pie de página informativo
-            pie_text = "SaberMas - Sistema de Recomendación Inteligente de Lectura"
-            bbox = draw.textbbox((0, 0), pie_text, font=info_font)
-            pie_width = bbox[2] - bbox[0]
-            pie_x = (width - pie_width) // 2
-            pie_y = height - 30
-            
-            draw.text((pie_x, pie_y), pie_text, fill=author_color, font=info_font)
-            
-            # Guardar imagen
-            buffer = BytesIO()
-            image.save(buffer, format='JPEG', quality=90)
-            buffer.seek(0)
-            
-            # Crear nombre de archivo
-            portada_filename = f"portada_placeholder_{self.id}.jpg"
+            contenido = renderizar_placeholder_jpeg(self.titulo, self.autor)
             
             # Eliminar portada existente si la hay
-            if self.portada:
-                try:
-                    self.portada.delete(save=False)
-                except:
-                    pass
+            self._eliminar_portada()
             
             # Guardar portada
-            self.portada.save(portada_filename, ContentFile(buffer.read()), save=False)
+            self.portada.save(self.nombre_portada_placeholder, ContentFile(contenido), save=False)
             
             print(f"   ✅ Portada placeholder creada")
             return True
@@ -481,65 +535,18 @@ class Libro(models.Model):
             print(f"   ❌ Error creando placeholder: {str(e)}")
             return False
     
-    def _obtener_fuente(self, size, bold=False):
-        """Obtener la mejor fuente disponible"""
-        try:
-            if os.name == 'nt':  # Windows
-                font_name = "arialbd.ttf" if bold else "arial.ttf"
-                return ImageFont.truetype(font_name, size)
-            else:  # Linux/Mac
-                font_name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
-                return ImageFont.truetype(font_name, size)
-        except:
-            # Fuente por defecto
-            return ImageFont.load_default()
-    
-    def _dividir_texto(self, texto, max_caracteres):
-        """Dividir texto en líneas que no excedan max_caracteres"""
-        if not texto:
-            return ["Sin título"]
-            
-        palabras = texto.split()
-        lineas = []
-        linea_actual = []
-        
-        for palabra in palabras:
-            if len(' '.join(linea_actual + [palabra])) <= max_caracteres:
-                linea_actual.append(palabra)
-            else:
-                if linea_actual:
-                    lineas.append(' '.join(linea_actual))
-                linea_actual = [palabra]
-        
-        if linea_actual:
-            lineas.append(' '.join(linea_actual))
-        
-        return lineas if lineas else [texto[:max_caracteres] + "..."]
-    
-    def _dibujar_elementos_decorativos(self, draw, width, height, color):
-        """Dibujar elementos decorativos en la portada"""
-        # Línea decorativa superior
-        draw.rectangle([0, 0, width, 10], fill=color)
-        
-        # Línea decorativa inferior
-        draw.rectangle([0, height-10, width, height], fill=color)
-        
-        # Elementos de esquina
-        corner_size = 50
-        # Esquina superior izquierda
-        draw.pieslice([-corner_size, -corner_size, corner_size, corner_size], 180, 270, fill=color)
-        # Esquina superior derecha
-        draw.pieslice([width-corner_size, -corner_size, width+corner_size, corner_size], 270, 360, fill=color)
+    @property
+    def nombre_portada_placeholder(self):
+        return f"portada_placeholder_{self.id}.jpg"
     
     def regenerar_portada(self):
         """Regenerar la portada manualmente"""
         try:
             # Eliminar portada existente
-            if self.portada:
-                self.portada.delete(save=False)
+            self._eliminar_portada()
             
             # Generar nueva portada
-            return self.generar_portada_desde_pdf()
+            return self.generar_portada_desde_pdf(self.sondear_pdf())
             
         except Exception as e:
             print(f"❌ Error regenerando portada: {str(e)}")
@@ -558,17 +565,45 @@ class Libro(models.Model):
             print(f"❌ Error regenerando metadatos: {str(e)}")
             return False
     
+    @staticmethod
+    def acumular_puntuacion(libro_id, conteo, suma):
+        """
+        Sumar ``conteo`` puntuaciones y ``suma`` puntos a los agregados del libro
+        con un único UPDATE atómico (expresiones F, sin leer la fila antes).
+        El mismo UPDATE sube la versión de la tarjeta cacheada.
+        """
+        from django.db.models import F, Value, FloatField
+        from django.db.models.functions import Cast, Coalesce, NullIf, Round
+        
+        nuevo_conteo = F('rating_count') + conteo
+        nueva_suma = F('rating_sum') + Value(Decimal(str(suma)))
+        Libro.objects.filter(pk=libro_id).update(
+            version_cache=F('version_cache') + 1,
+            rating_count=nuevo_conteo,
+            rating_sum=nueva_suma,
+            rating_avg=Coalesce(
+                Round(Cast(nueva_suma, FloatField()) / NullIf(nuevo_conteo, 0), 2),
+                Value(0.0),
+            ),
+        )
+    
+    @staticmethod
+    def invalidar_tarjetas(libro_ids):
+        """Subir la versión de caché de las tarjetas de ``libro_ids``"""
+        from django.db.models import F
+        
+        libro_ids = list(libro_ids)
+        # Por tandas, para no pasar del límite de parámetros de SQLite
+        for inicio in range(0, len(libro_ids), 1000):
+            Libro.objects.filter(pk__in=libro_ids[inicio:inicio + 1000]).update(
+                version_cache=F('version_cache') + 1
+            )
+    
     # Propiedades calculadas
     @property
     def rating_promedio(self):
-        """Calcula el rating promedio del libro"""
-        from django.db.models import Avg
-        try:
-            resultado = self.puntuaciones.aggregate(promedio=Avg('puntuacion'))
-            promedio = resultado['promedio']
-            return round(promedio, 2) if promedio else 0.0
-        except:
-            return 0.0
+        """Rating promedio del libro (columna desnormalizada, sin consultas)"""
+        return round(float(self.rating_avg), 2) if self.rating_avg else 0.0
     
     @property
     def nombre_archivo(self):
@@ -648,6 +683,220 @@ class LibroCategoria(models.Model):
     def __str__(self):
         return f"{self.libro.titulo} - {self.categoria.nombre}"
 
+class LibroSimilar(models.Model):
+    """Vecinos precalculados de cada libro (ver sril/similares.py)"""
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='similares')
+    similar = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Libro similar'
+        verbose_name_plural = 'Libros similares'
+        unique_together = ['libro', 'similar']
+        indexes = [
+            # La página de detalle lee los mejores vecinos de un libro
+            models.Index(fields=['libro', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.libro_id} → {self.similar_id} ({self.score:.3f})"
+
+class SimilarPendiente(models.Model):
+    """Libro con cambios de categorías o visibilidad cuyas listas de similares revisa el worker"""
+    libro = models.OneToOneField(Libro, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    fecha_cambio = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Similar pendiente'
+        verbose_name_plural = 'Similares pendientes'
+        indexes = [
+            models.Index(fields=['fecha_cambio']),
+        ]
+    
+    def __str__(self):
+        return f"{self.libro_id} ({self.fecha_cambio:%Y-%m-%d %H:%M:%S})"
+
+class VecinoColaborativo(models.Model):
+    """Vecinos de cada libro por similitud de puntuaciones (ver sril/colaborativo.py)"""
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='vecinos_colaborativos')
+    vecino = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='+')
+    similitud = models.FloatField()
+    # Usuarios que puntuaron ambos libros
+    usuarios_comunes = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Vecino colaborativo'
+        verbose_name_plural = 'Vecinos colaborativos'
+        unique_together = ['libro', 'vecino']
+        indexes = [
+            models.Index(fields=['libro', '-similitud']),
+        ]
+    
+    def __str__(self):
+        return f"{self.libro_id} → {self.vecino_id} ({self.similitud:.3f})"
+
+class VectorPendiente(models.Model):
+    """Libro cuyo vector de contenido recalcula el worker (ver sril/vectores.py)"""
+    # Sin clave foránea: un libro borrado también hay que quitarlo del índice
+    libro_id = models.BigIntegerField(primary_key=True)
+    fecha_cambio = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Vector pendiente'
+        verbose_name_plural = 'Vectores pendientes'
+        indexes = [
+            models.Index(fields=['fecha_cambio']),
+        ]
+    
+    def __str__(self):
+        return f"{self.libro_id} ({self.fecha_cambio:%Y-%m-%d %H:%M:%S})"
+
+class RecomendacionUsuario(models.Model):
+    """Lista de recomendaciones materializada de cada usuario (ver sril/recomendaciones.py)"""
+    SECCION_CHOICES = [
+        ('PREFERENCIAS', 'Según tus preferencias'),
+        ('SIMILARES', 'De usuarios con gustos parecidos'),
+    ]
+    
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='recomendaciones')
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='+')
+    seccion = models.CharField(max_length=20, choices=SECCION_CHOICES)
+    posicion = models.PositiveSmallIntegerField()
+    score = models.FloatField(default=0)
+    
+    class Meta:
+        verbose_name = 'Recomendación de usuario'
+        verbose_name_plural = 'Recomendaciones de usuarios'
+        unique_together = ['usuario', 'libro']
+        indexes = [
+            # La vista lee la lista completa de un usuario ya ordenada
+            models.Index(fields=['usuario', 'seccion', 'posicion']),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario_id}: {self.seccion} #{self.posicion} → {self.libro_id}"
+
+class RecomendacionPendiente(models.Model):
+    """Usuario cuya lista hay que recalcular; el worker espera a que deje de cambiar"""
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    fecha_cambio = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Recomendación pendiente'
+        verbose_name_plural = 'Recomendaciones pendientes'
+        indexes = [
+            models.Index(fields=['fecha_cambio']),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario_id} ({self.fecha_cambio:%Y-%m-%d %H:%M:%S})"
+
+class RecomendacionCalculada(models.Model):
+    """Usuario cuya lista ya se calculó, aunque haya quedado vacía"""
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    fecha_calculo = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Recomendación calculada'
+        verbose_name_plural = 'Recomendaciones calculadas'
+
+    def __str__(self):
+        return f"{self.usuario_id} ({self.fecha_calculo:%Y-%m-%d %H:%M:%S})"
+
+class VistosUsuario(models.Model):
+    """Libros puntuados o leídos por el usuario como conjunto de bits (ver sril/vistos.py)"""
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    bits = models.BinaryField(default=bytes)
+
+    class Meta:
+        verbose_name = 'Libros vistos'
+        verbose_name_plural = 'Libros vistos'
+
+    def __str__(self):
+        return f"{self.usuario_id} ({len(self.bits)} bytes)"
+
+class LoteTareas(models.Model):
+    """Grupo de tareas lanzado desde el admin (p. ej. regenerar portadas) para seguir su progreso"""
+    descripcion = models.CharField(max_length=255)
+    creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-fecha_creacion']
+        verbose_name = 'Lote de Tareas'
+        verbose_name_plural = 'Lotes de Tareas'
+    
+    def __str__(self):
+        return f"{self.descripcion} ({self.fecha_creacion:%d/%m/%Y %H:%M})"
+    
+    def resumen(self):
+        """Tareas del lote por estado, en una sola consulta"""
+        conteos = {estado: 0 for estado, _ in Libro.ESTADO_PROCESAMIENTO_CHOICES}
+        for fila in self.tareas.values('estado').annotate(total=models.Count('id')):
+            conteos[fila['estado']] = fila['total']
+        total = sum(conteos.values())
+        terminadas = conteos['COMPLETADO'] + conteos['FALLIDO']
+        return {
+            'total': total,
+            'terminadas': terminadas,
+            'porcentaje': round(terminadas * 100 / total) if total else 100,
+            'finalizado': terminadas == total,
+            'estados': conteos,
+        }
+
+class TareaProcesamiento(models.Model):
+    """Cola de trabajos de procesamiento de PDFs atendida por ``procesar_tareas``"""
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='tareas_procesamiento')
+    lote = models.ForeignKey(
+        LoteTareas, on_delete=models.SET_NULL, null=True, blank=True, related_name='tareas'
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=Libro.ESTADO_PROCESAMIENTO_CHOICES,
+        default='PENDIENTE'
+    )
+    forzar = models.BooleanField(
+        default=False,
+        help_text="Ignorar la caché por huella y volver a procesar el PDF"
+    )
+    etapas = models.JSONField(
+        default=list, blank=True,
+        help_text="Etapas que se repiten con forzar (vacío = todas)"
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['fecha_creacion']
+        verbose_name = 'Tarea de Procesamiento'
+        verbose_name_plural = 'Tareas de Procesamiento'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+    
+    def __str__(self):
+        return f"{self.libro.titulo} ({self.estado})"
+
+class CacheMetadatosPdf(models.Model):
+    """Resultados del procesamiento de un PDF direccionados por su SHA-256"""
+    DIRECTORIO_PORTADAS = 'libros/portadas/cache/'
+    
+    huella = models.CharField(max_length=64, unique=True)
+    numero_paginas = models.PositiveIntegerField(default=0)
+    tiempo_lectura_promedio = models.PositiveIntegerField(default=0)
+    portada = models.ImageField(upload_to=DIRECTORIO_PORTADAS, blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Caché de PDF'
+        verbose_name_plural = 'Caché de PDFs'
+    
+    def __str__(self):
+        return f"{self.huella[:12]} ({self.numero_paginas} páginas)"
+
 class PreferenciaUsuario(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='preferencias')
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
@@ -684,6 +933,28 @@ class Puntuacion(models.Model):
     
     def __str__(self):
         return f"{self.usuario.nombre} - {self.libro.titulo}: {self.puntuacion}"
+    
+    def save(self, *args, **kwargs):
+        """
+        Guardar la puntuación y actualizar los agregados del libro en la misma
+        transacción. Los borrados se descuentan en la señal post_delete.
+        """
+        with transaction.atomic():
+            anterior = None
+            if self.pk:
+                anterior = Puntuacion.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'libro_id', 'puntuacion'
+                ).first()
+            super().save(*args, **kwargs)
+            
+            valor = Decimal(str(self.puntuacion))
+            if anterior is None:
+                Libro.acumular_puntuacion(self.libro_id, 1, valor)
+            elif anterior[0] != self.libro_id:
+                Libro.acumular_puntuacion(anterior[0], -1, -anterior[1])
+                Libro.acumular_puntuacion(self.libro_id, 1, valor)
+            elif anterior[1] != valor:
+                Libro.acumular_puntuacion(self.libro_id, 0, valor - anterior[1])
 
 class HistorialLectura(models.Model):
     ESTADO_CHOICES = [
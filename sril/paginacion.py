@@ -0,0 +1,129 @@
+# sril/paginacion.py
+"""
+Paginación por clave (keyset).
+
+En lugar de ``OFFSET`` cada página se pide "a partir de" la clave de la
+última fila mostrada, así que el coste de cualquier página es el mismo
+aunque el catálogo crezca. La clave viaja en la URL como un cursor opaco.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+def codificar_cursor(valores):
+    datos = json.dumps(valores, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, campos):
+    """Valores de la clave del cursor, o None si falta o está mal formado"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(campos):
+        return None
+    return valores
+
+
+def _valores_clave(cursor, queryset, campos):
+    """
+    Valores del cursor convertidos al tipo de cada campo, o None si no
+    encajan: el cursor viene de la URL y puede estar manipulado.
+    """
+    valores = decodificar_cursor(cursor, campos)
+    if valores is None or any(valor is None or isinstance(valor, (list, dict)) for valor in valores):
+        return None
+    try:
+        return [
+            queryset.model._meta.get_field(campo).to_python(valor) for campo, valor in zip(campos, valores)
+        ]
+    except (ValueError, TypeError, ValidationError, FieldDoesNotExist):
+        return None
+
+
+def _filtro_clave(campos, valores, operador):
+    """
+    (a, b) > (x, y)  ==>  a >= x AND (a > x OR (a = x AND b > y))
+    La primera condición, redundante, permite al motor empezar a leer el
+    índice justo en la clave en lugar de recorrerlo desde el principio.
+    """
+    condicion = Q()
+    for posicion, campo in enumerate(campos):
+        iguales = {campos[i]: valores[i] for i in range(posicion)}
+        condicion |= Q(**iguales, **{f'{campo}__{operador}': valores[posicion]})
+    return Q(**{f'{campos[0]}__{operador}e': valores[0]}) & condicion
+
+
+def paginar_por_clave(queryset, campos, tamano, despues=None, antes=None):
+    """
+    Devolver una página de ``queryset`` ordenada por ``campos`` (el último
+    debe ser único, normalmente ``id``).
+
+    ``despues``/``antes`` son cursores de una página anterior. El resultado es
+    un diccionario con ``objetos`` y los cursores ``siguiente`` y ``anterior``
+    (None cuando no hay más páginas en esa dirección).
+    """
+    def clave(objeto):
+        return codificar_cursor([getattr(objeto, campo) for campo in campos])
+
+    valores_antes = _valores_clave(antes, queryset, campos)
+    if valores_antes is not None:
+        filas = list(
+            queryset.filter(_filtro_clave(campos, valores_antes, 'lt'))
+            .order_by(*[f'-{campo}' for campo in campos])[:tamano + 1]
+        )
+        hay_mas = len(filas) > tamano
+        objetos = filas[:tamano][::-1]
+        return {
+            'objetos': objetos,
+            'anterior': clave(objetos[0]) if hay_mas else None,
+            'siguiente': clave(objetos[-1]) if objetos else None,
+        }
+
+    valores_despues = _valores_clave(despues, queryset, campos)
+    if valores_despues is not None:
+        queryset = queryset.filter(_filtro_clave(campos, valores_despues, 'gt'))
+    filas = list(queryset.order_by(*campos)[:tamano + 1])
+    objetos = filas[:tamano]
+    return {
+        'objetos': objetos,
+        'anterior': clave(objetos[0]) if valores_despues is not None and objetos else None,
+        'siguiente': clave(objetos[-1]) if len(filas) > tamano else None,
+    }
+
+
+def paginar_lista(valores, tamano, despues=None, antes=None):
+    """
+    Paginar una lista ya ordenada (p. ej. ids por relevancia) con los mismos
+    cursores opacos; la clave es la posición en la lista.
+    """
+    def clave(posicion):
+        return codificar_cursor([posicion])
+
+    def posicion(cursor):
+        valores_cursor = decodificar_cursor(cursor, ('posicion',))
+        if valores_cursor is None or not isinstance(valores_cursor[0], int):
+            return None
+        return max(0, valores_cursor[0])
+
+    posicion_antes = posicion(antes)
+    if posicion_antes is not None:
+        fin = min(posicion_antes, len(valores))
+        inicio = max(0, fin - tamano)
+    else:
+        posicion_despues = posicion(despues)
+        inicio = posicion_despues + 1 if posicion_despues is not None else 0
+        fin = min(inicio + tamano, len(valores))
+
+    return {
+        'objetos': valores[inicio:fin],
+        'anterior': clave(inicio) if inicio > 0 else None,
+        'siguiente': clave(fin - 1) if fin < len(valores) else None,
+    }
@@ -0,0 +1,218 @@
+# sril/pipeline.py
+"""
+Pipeline de ingesta de PDFs por etapas.
+
+Cada etapa deja una marca en ``Libro.etapas_completadas`` con la versión del
+archivo que procesó (el nombre del PDF para ``huella`` y la huella SHA-256
+para las demás), así que se ejecuta como mucho una vez por versión del PDF.
+
+Escrituras en base de datos por libro:
+  - al guardar desde el admin: 1 INSERT/UPDATE del libro + 1 INSERT de la tarea
+  - en el worker: 1 UPDATE del libro al terminar + como mucho 1 escritura
+    en ``CacheMetadatosPdf`` y 1 reemplazo en el índice FTS5 (más las
+    actualizaciones de estado de la tarea)
+"""
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+ETAPAS = ['huella', 'metadatos', 'portada', 'texto']
+
+
+def version_etapa(libro, etapa):
+    """
+    Versión del PDF contra la que se compara la marca de la etapa. Los libros
+    anteriores al pipeline cuyo PDF no estaba en disco al migrar no tienen
+    huella: para ellos la versión es el nombre del archivo (ver la migración
+    0017), y cambiar el PDF vuelve a ejecutar todas las etapas.
+    """
+    if etapa == 'huella':
+        return libro.archivo_pdf.name
+    return libro.huella_pdf or f"archivo:{libro.archivo_pdf.name}"
+
+
+def etapa_completada(libro, etapa):
+    marca = (libro.etapas_completadas or {}).get(etapa)
+    if marca is None or marca != version_etapa(libro, etapa):
+        return False
+    # Si alguien quitó la portada a mano hay que volver a generarla
+    if etapa == 'portada' and not libro.portada:
+        return False
+    return True
+
+
+def etapas_pendientes(libro):
+    if not libro.archivo_pdf:
+        return []
+    return [etapa for etapa in ETAPAS if not etapa_completada(libro, etapa)]
+
+
+def marcar_etapa(libro, etapa):
+    libro.etapas_completadas = dict(libro.etapas_completadas or {})
+    libro.etapas_completadas[etapa] = version_etapa(libro, etapa)
+
+
+def ejecutar_pipeline(libro, forzar=False, etapas=None):
+    """
+    Ejecutar las etapas pendientes y guardar el libro una sola vez.
+    Con ``forzar`` se repiten las ``etapas`` indicadas (todas si no se indican)
+    sin consultar la caché por huella.
+    """
+    from .portadas import generar_derivados
+
+    if not libro.archivo_pdf:
+        return False
+    if not os.path.exists(libro.archivo_pdf.path):
+        # Que la tarea quede FALLIDO con el motivo en lugar de un placeholder silencioso
+        raise FileNotFoundError(f"No existe el archivo PDF: {libro.archivo_pdf.name}")
+
+    contexto = {'forzar': forzar, 'sondeo': None, 'cache': None, 'cache_cambios': {}}
+    campos = {'estado_procesamiento', 'etapas_completadas'}
+    repetir = set(etapas or ETAPAS) if forzar else set()
+
+    for etapa in ETAPAS:
+        if etapa not in repetir and etapa_completada(libro, etapa):
+            print(f"   ⏭️ Etapa '{etapa}' ya completada")
+            continue
+        campos.update(FUNCIONES_ETAPA[etapa](libro, contexto))
+        marcar_etapa(libro, etapa)
+
+    _escribir_cache(libro, contexto)
+    if 'portada' in campos:
+        # Las versiones reducidas para srcset se crean aquí y no al renderizar
+        generar_derivados(libro.portada)
+
+    libro.estado_procesamiento = 'COMPLETADO'
+    libro.save(update_fields=sorted(campos))
+    return True
+
+
+def _etapa_huella(libro, contexto):
+    from .procesamiento_pdf import calcular_huella
+
+    libro.huella_pdf = calcular_huella(libro.archivo_pdf.path)
+    return ['huella_pdf']
+
+
+def _etapa_metadatos(libro, contexto):
+    cache = _obtener_cache(libro, contexto)
+    if cache:
+        print(f"♻️ Reutilizando metadatos en caché para: {libro.titulo}")
+        libro.numero_paginas = cache.numero_paginas
+        libro.tiempo_lectura_promedio = cache.tiempo_lectura_promedio
+        return ['numero_paginas', 'tiempo_lectura_promedio']
+
+    print(f"📄 Extrayendo metadatos para: {libro.titulo}")
+    contexto['sondeo'] = libro.sondear_pdf()
+    campos = []
+    if libro.extraer_metadatos_pdf(contexto['sondeo']):
+        if hasattr(libro, '_numero_paginas_actualizado'):
+            campos.append('numero_paginas')
+        if hasattr(libro, '_tiempo_lectura_actualizado'):
+            campos.append('tiempo_lectura_promedio')
+    contexto['cache_cambios'].update({
+        'numero_paginas': libro.numero_paginas,
+        'tiempo_lectura_promedio': libro.tiempo_lectura_promedio,
+    })
+    return campos
+
+
+def _etapa_portada(libro, contexto):
+    from .models import CacheMetadatosPdf
+    from .procesamiento_pdf import imagen_a_jpeg
+
+    print(f"🔄 Generando portada para: {libro.titulo}")
+    cache = _obtener_cache(libro, contexto)
+    if cache and cache.portada:
+        _compartir_portada(libro, cache.portada.name)
+        return ['portada']
+
+    sondeo = contexto['sondeo']
+    if sondeo is None:
+        sondeo = contexto['sondeo'] = libro.sondear_pdf()
+
+    if sondeo and sondeo['portada'] is not None:
+        # La portada renderizada del PDF se guarda una vez por huella y se comparte;
+        # se reescribe con el mismo nombre para no romper a quien ya la usa
+        nombre = f"{CacheMetadatosPdf.DIRECTORIO_PORTADAS}{libro.huella_pdf}.jpg"
+        if default_storage.exists(nombre):
+            default_storage.delete(nombre)
+        nombre = default_storage.save(nombre, ContentFile(imagen_a_jpeg(sondeo['portada'])))
+        contexto['cache_cambios']['portada'] = nombre
+        _compartir_portada(libro, nombre)
+        print(f"   ✅ Portada generada desde PDF")
+        return ['portada']
+
+    # Sin página rasterizada: pdf2image o placeholder, propios de cada libro
+    if libro.generar_portada_desde_pdf(sondeo):
+        return ['portada']
+    return []
+
+
+def _etapa_texto(libro, contexto):
+    """Indexar la capa de texto del PDF y la sinopsis en FTS5"""
+    from .busqueda import fts_disponible, indexar_contenido, contenido_indexado
+    from .models import Libro
+    from .procesamiento_pdf import extraer_texto_pdf
+
+    if not fts_disponible():
+        return []
+
+    # Otro libro con el mismo PDF ya tiene el texto indexado
+    contenido = None
+    if not contexto['forzar']:
+        gemelos = Libro.objects.filter(huella_pdf=libro.huella_pdf).exclude(pk=libro.pk).values_list('pk', flat=True)
+        for gemelo in gemelos[:5]:
+            contenido = contenido_indexado(gemelo)
+            if contenido:
+                print(f"♻️ Reutilizando texto indexado para: {libro.titulo}")
+                break
+
+    if contenido is None:
+        print(f"🔎 Indexando texto para: {libro.titulo}")
+        try:
+            contenido = extraer_texto_pdf(libro.archivo_pdf.path)
+        except Exception as e:
+            print(f"   ❌ Error extrayendo texto: {str(e)}")
+            contenido = ''
+
+    indexar_contenido(libro.pk, libro.sinopsis, contenido)
+    return []
+
+
+def _compartir_portada(libro, nombre):
+    if libro.portada.name != nombre:
+        libro._eliminar_portada()
+        libro.portada.name = nombre
+
+
+def _obtener_cache(libro, contexto):
+    """Entrada de caché para la huella actual (una sola consulta por ejecución)"""
+    from .models import CacheMetadatosPdf
+
+    if contexto['forzar']:
+        return None
+    if 'cache_consultada' not in contexto:
+        contexto['cache'] = CacheMetadatosPdf.objects.filter(huella=libro.huella_pdf).first()
+        contexto['cache_consultada'] = True
+    return contexto['cache']
+
+
+def _escribir_cache(libro, contexto):
+    from .models import CacheMetadatosPdf
+
+    cambios = contexto['cache_cambios']
+    if not cambios or not libro.huella_pdf:
+        return
+    cambios.setdefault('numero_paginas', libro.numero_paginas)
+    cambios.setdefault('tiempo_lectura_promedio', libro.tiempo_lectura_promedio)
+    CacheMetadatosPdf.objects.update_or_create(huella=libro.huella_pdf, defaults=cambios)
+
+
+FUNCIONES_ETAPA = {
+    'huella': _etapa_huella,
+    'metadatos': _etapa_metadatos,
+    'portada': _etapa_portada,
+    'texto': _etapa_texto,
+}
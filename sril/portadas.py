@@ -0,0 +1,274 @@
+# sril/portadas.py
+"""
+Motor de renderizado de portadas.
+
+Las fuentes TrueType se cargan una vez por proceso y el fondo decorativo
+(bandas, esquinas y pie de página) se dibuja una sola vez como plantilla;
+cada portada solo copia la plantilla y escribe el título y el autor.
+
+También genera versiones reducidas WebP/JPEG de cada portada para usarlas
+en ``srcset``. Se crean en el pipeline y en los comandos que escriben
+portadas (``generar_derivados``); al renderizar solo se comprueba si ya
+existen y, si no, se sirve la portada original.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
+
+from .procesamiento_pdf import imagen_a_jpeg
+
+ANCHO, ALTO = 400, 600
+
+# Colores (azul profesional)
+COLOR_FONDO = (41, 128, 185)      # Azul
+COLOR_TITULO = (255, 255, 255)    # Blanco
+COLOR_AUTOR = (236, 240, 241)     # Gris claro
+COLOR_ACENTO = (52, 152, 219)     # Azul claro
+COLOR_SOMBRA = (31, 97, 141)
+
+TEXTO_PIE = "SaberMas - Sistema de Recomendación Inteligente de Lectura"
+CALIDAD_JPEG = 90
+
+
+@lru_cache(maxsize=None)
+def obtener_fuente(size, bold=False):
+    """Obtener la mejor fuente disponible (cacheada por proceso)"""
+    try:
+        if os.name == 'nt':  # Windows
+            font_name = "arialbd.ttf" if bold else "arial.ttf"
+        else:  # Linux/Mac
+            font_name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
+        return ImageFont.truetype(font_name, size)
+    except:
+        # Fuente por defecto
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=1)
+def _plantilla_fondo():
+    """Fondo con los elementos decorativos y el pie de página ya dibujados"""
+    image = Image.new('RGB', (ANCHO, ALTO), COLOR_FONDO)
+    draw = ImageDraw.Draw(image)
+
+    # Línea decorativa superior e inferior
+    draw.rectangle([0, 0, ANCHO, 10], fill=COLOR_ACENTO)
+    draw.rectangle([0, ALTO - 10, ANCHO, ALTO], fill=COLOR_ACENTO)
+
+    # Elementos de esquina
+    corner_size = 50
+    draw.pieslice([-corner_size, -corner_size, corner_size, corner_size], 180, 270, fill=COLOR_ACENTO)
+    draw.pieslice([ANCHO - corner_size, -corner_size, ANCHO + corner_size, corner_size], 270, 360, fill=COLOR_ACENTO)
+
+    # Pie de página informativo
+    info_font = obtener_fuente(12)
+    bbox = draw.textbbox((0, 0), TEXTO_PIE, font=info_font)
+    pie_x = (ANCHO - (bbox[2] - bbox[0])) // 2
+    draw.text((pie_x, ALTO - 30), TEXTO_PIE, fill=COLOR_AUTOR, font=info_font)
+
+    return image
+
+
+def dividir_texto(texto, max_caracteres):
+    """Dividir texto en líneas que no excedan max_caracteres"""
+    if not texto:
+        return ["Sin título"]
+
+    palabras = texto.split()
+    lineas = []
+    linea_actual = []
+
+    for palabra in palabras:
+        if len(' '.join(linea_actual + [palabra])) <= max_caracteres:
+            linea_actual.append(palabra)
+        else:
+            if linea_actual:
+                lineas.append(' '.join(linea_actual))
+            linea_actual = [palabra]
+
+    if linea_actual:
+        lineas.append(' '.join(linea_actual))
+
+    return lineas if lineas else [texto[:max_caracteres] + "..."]
+
+
+def renderizar_placeholder(titulo, autor):
+    """Renderizar una portada placeholder y devolverla como imagen PIL"""
+    image = _plantilla_fondo().copy()
+    draw = ImageDraw.Draw(image)
+    title_font = obtener_fuente(24, True)
+    author_font = obtener_fuente(16)
+
+    # Calcular posición vertical para centrar el título
+    lineas_titulo = dividir_texto(titulo, 25)
+    total_text_height = len(lineas_titulo) * 30 + 40
+    y_start = (ALTO - total_text_height) // 2
+
+    for i, linea in enumerate(lineas_titulo):
+        bbox = draw.textbbox((0, 0), linea, font=title_font)
+        x = (ANCHO - (bbox[2] - bbox[0])) // 2
+        y = y_start + (i * 30)
+        # Sombra del texto y texto principal
+        draw.text((x + 1, y + 1), linea, fill=COLOR_SOMBRA, font=title_font)
+        draw.text((x, y), linea, fill=COLOR_TITULO, font=title_font)
+
+    # Autor
+    autor_text = f"por {autor}"
+    bbox = draw.textbbox((0, 0), autor_text, font=author_font)
+    autor_x = (ANCHO - (bbox[2] - bbox[0])) // 2
+    autor_y = y_start + len(lineas_titulo) * 30 + 10
+    draw.text((autor_x, autor_y), autor_text, fill=COLOR_AUTOR, font=author_font)
+
+    return image
+
+
+def renderizar_placeholder_jpeg(titulo, autor):
+    return imagen_a_jpeg(renderizar_placeholder(titulo, autor), calidad=CALIDAD_JPEG)
+
+
+def renderizar_placeholders(libros):
+    """
+    Renderizar muchas portadas en una llamada.
+
+    Recibe un iterable de tuplas ``(id, titulo, autor)`` y devuelve un
+    diccionario ``id -> bytes JPEG``. Fuentes y fondo se preparan una vez
+    para todo el lote.
+    """
+    return {
+        libro_id: renderizar_placeholder_jpeg(titulo, autor)
+        for libro_id, titulo, autor in libros
+    }
+
+
+# Derivados por tamaño: ancho en píxeles de cada uso
+ANCHOS_PORTADA = {
+    'admin': 160,
+    'tarjeta': 280,
+    'detalle': 400,
+}
+# Atributo ``sizes`` de cada uso (ancho aproximado en CSS px)
+SIZES_PORTADA = {
+    'admin': '200px',
+    'tarjeta': '(max-width: 576px) 100vw, 280px',
+    'detalle': '(max-width: 768px) 100vw, 270px',
+}
+FORMATOS_DERIVADO = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DIRECTORIO_DERIVADOS = 'libros/portadas/derivados/'
+_ULTIMO_DERIVADO = (max(ANCHOS_PORTADA.values()), 'webp')
+
+
+def prefijo_derivados(portada):
+    """
+    Prefijo de los derivados de ``portada`` si ya están generados, o ``None``.
+    Se llama al renderizar: solo consulta la fecha de modificación y si existe
+    el último derivado que escribe ``generar_derivados``, sin abrir la imagen.
+    """
+    base = _base_derivados(portada)
+    if base is None:
+        return None
+    ancho, formato = _ULTIMO_DERIVADO
+    try:
+        if portada.storage.exists(f"{base}_{ancho}.{formato}"):
+            return base
+    except OSError:
+        pass
+    return None
+
+
+def _base_derivados(portada):
+    """
+    Nombre base de los derivados: hash del nombre y la fecha de modificación
+    de la portada, así que reescribirla con el mismo nombre cambia las URLs.
+    """
+    try:
+        modificado = portada.storage.get_modified_time(portada.name).timestamp()
+    except NotImplementedError:
+        modificado = 0
+    except OSError:
+        # La portada no está en disco: no hay nada que reducir
+        return None
+    huella = hashlib.sha256(f"{portada.name}:{modificado}".encode()).hexdigest()[:16]
+    return f"{DIRECTORIO_DERIVADOS}{huella}"
+
+
+def generar_derivados(portada):
+    """
+    Crear los derivados que falten de ``portada`` y devolver cuántos se
+    crearon. Lo llaman el pipeline y los comandos, nunca el renderizado; una
+    portada ilegible se avisa y se sirve sin reducir.
+    """
+    if not portada:
+        return 0
+    base = _base_derivados(portada)
+    if base is None:
+        return 0
+    storage = portada.storage
+    faltantes = [
+        (ancho, formato)
+        for ancho in sorted(set(ANCHOS_PORTADA.values()))
+        for formato in FORMATOS_DERIVADO
+        if not storage.exists(f"{base}_{ancho}.{formato}")
+    ]
+    if not faltantes:
+        return 0
+    try:
+        with storage.open(portada.name, 'rb') as archivo:
+            imagen = Image.open(archivo)
+            imagen.load()
+    except (OSError, UnidentifiedImageError) as e:
+        print(f"   ⚠️ No se pudieron crear los derivados de {portada.name}: {str(e)}")
+        return 0
+    imagen = imagen.convert('RGB')
+
+    # El último derivado marca la portada como lista para prefijo_derivados
+    faltantes.sort(key=lambda derivado: derivado == _ULTIMO_DERIVADO)
+    for ancho, formato in faltantes:
+        formato_pil, opciones = FORMATOS_DERIVADO[formato]
+        reducida = imagen.copy()
+        # Nunca ampliar: thumbnail solo reduce
+        reducida.thumbnail((ancho, ancho * 2), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        reducida.save(buffer, format=formato_pil, **opciones)
+        storage.save(f"{base}_{ancho}.{formato}", ContentFile(buffer.getvalue()))
+    return len(faltantes)
+
+
+def url_original(portada):
+    """URL de la portada sin reducir (no toca el archivo)"""
+    try:
+        return portada.url
+    except ValueError:
+        return ''
+
+
+def url_derivado(portada, ancho, formato='jpg', prefijo=None):
+    """
+    URL de la portada reducida a ``ancho`` píxeles en ``formato``, o la de la
+    original si sus derivados aún no se generaron.
+    """
+    prefijo = prefijo or prefijo_derivados(portada)
+    if prefijo is None:
+        return url_original(portada)
+    return portada.storage.url(f"{prefijo}_{ancho}.{formato}")
+
+
+def srcset_portada(portada, uso, formato='jpg', prefijo=None):
+    """
+    Valor de ``srcset`` con todos los anchos hasta el del uso indicado (solo
+    la original si aún no hay derivados)
+    """
+    prefijo = prefijo or prefijo_derivados(portada)
+    if prefijo is None:
+        return url_original(portada)
+    maximo = ANCHOS_PORTADA[uso]
+    return ', '.join(
+        f"{url_derivado(portada, ancho, formato, prefijo)} {ancho}w"
+        for ancho in sorted(set(ANCHOS_PORTADA.values()))
+        if ancho <= maximo
+    )
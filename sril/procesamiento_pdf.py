@@ -0,0 +1,249 @@
+# sril/procesamiento_pdf.py
+"""
+Sondeo de PDFs en una sola pasada.
+
+``sondear_pdf`` abre el documento una única vez y devuelve el número de
+páginas, los metadatos embebidos, la primera página rasterizada y, si se
+pide, las palabras por página estimadas sobre una muestra de páginas, junto
+con el tiempo que tomó cada etapa.
+"""
+import hashlib
+import time
+from datetime import datetime
+from io import BytesIO
+
+from PIL import Image
+
+TAMANO_PORTADA = (400, 600)
+DPI_PORTADA = 100
+PAGINAS_MUESTRA = 8
+
+# Claves del diccionario /Info del PDF que nos interesan
+CLAVES_METADATOS = {
+    'Title': 'titulo',
+    'Author': 'autor',
+    'Producer': 'productor',
+    'CreationDate': 'fecha_creacion',
+    'ModDate': 'fecha_modificacion',
+}
+
+
+def sondear_pdf(ruta, renderizar_portada=True, dpi=DPI_PORTADA, paginas_muestra=0):
+    """
+    Abrir el PDF una vez y extraer páginas, metadatos y portada.
+
+    Devuelve un diccionario con las claves ``paginas``, ``metadatos``,
+    ``portada`` (imagen PIL o None), ``palabras_por_pagina`` (media sobre
+    ``paginas_muestra`` páginas, o None si no se muestreó) y ``tiempos``
+    (segundos por etapa).
+    """
+    try:
+        return _sondear_con_pdfium(ruta, renderizar_portada, dpi, paginas_muestra)
+    except ImportError:
+        print("   📚 pypdfium2 no está instalado")
+    except Exception as e:
+        print(f"   ❌ Error con pypdfium2: {str(e)}")
+
+    # Sin pdfium no hay rasterizado en el mismo paso: solo páginas y metadatos
+    try:
+        return _sondear_con_pypdf2(ruta)
+    except ImportError:
+        print("   📚 PyPDF2 no está instalado")
+    except Exception as e:
+        print(f"   ❌ Error con PyPDF2: {str(e)}")
+
+    return {'paginas': 0, 'metadatos': {}, 'portada': None, 'palabras_por_pagina': None, 'tiempos': {}}
+
+
+def _sondear_con_pdfium(ruta, renderizar_portada, dpi, paginas_muestra):
+    import pypdfium2 as pdfium
+
+    tiempos = {}
+    inicio = time.perf_counter()
+    pdf = pdfium.PdfDocument(ruta)
+    tiempos['apertura'] = time.perf_counter() - inicio
+
+    try:
+        inicio = time.perf_counter()
+        paginas = len(pdf)
+        tiempos['paginas'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        metadatos = _normalizar_metadatos(pdf.get_metadata_dict())
+        tiempos['metadatos'] = time.perf_counter() - inicio
+
+        portada = None
+        if renderizar_portada and paginas > 0:
+            inicio = time.perf_counter()
+            pagina = pdf[0]
+            try:
+                portada = pagina.render(scale=dpi / 72).to_pil().convert('RGB')
+            finally:
+                pagina.close()
+            portada.thumbnail(TAMANO_PORTADA, Image.Resampling.LANCZOS)
+            tiempos['render'] = time.perf_counter() - inicio
+
+        palabras_por_pagina = None
+        if paginas_muestra > 0 and paginas > 0:
+            inicio = time.perf_counter()
+            palabras_por_pagina = _muestrear_palabras(pdf, paginas, paginas_muestra)
+            tiempos['muestreo'] = time.perf_counter() - inicio
+    finally:
+        pdf.close()
+
+    return {'paginas': paginas, 'metadatos': metadatos, 'portada': portada,
+            'palabras_por_pagina': palabras_por_pagina, 'tiempos': tiempos}
+
+
+def paginas_estratificadas(total, muestra):
+    """
+    Índices de ``muestra`` páginas repartidas por todo el documento: se divide
+    en tramos iguales y se toma la página central de cada tramo.
+    """
+    muestra = min(total, muestra)
+    return sorted({int((tramo + 0.5) * total / muestra) for tramo in range(muestra)})
+
+
+def _muestrear_palabras(pdf, paginas, paginas_muestra):
+    """Media de palabras por página sobre una muestra estratificada (coste fijo)"""
+    conteos = []
+    for indice in paginas_estratificadas(paginas, paginas_muestra):
+        pagina = pdf[indice]
+        try:
+            textpage = pagina.get_textpage()
+            conteos.append(len(textpage.get_text_range().split()))
+            textpage.close()
+        finally:
+            pagina.close()
+    return sum(conteos) / len(conteos) if conteos else None
+
+
+def _sondear_con_pypdf2(ruta):
+    import PyPDF2
+
+    tiempos = {}
+    inicio = time.perf_counter()
+    with open(ruta, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        tiempos['apertura'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        paginas = len(pdf_reader.pages)
+        tiempos['paginas'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        info = pdf_reader.metadata or {}
+        metadatos = _normalizar_metadatos({k.lstrip('/'): v for k, v in info.items()})
+        tiempos['metadatos'] = time.perf_counter() - inicio
+
+    return {'paginas': paginas, 'metadatos': metadatos, 'portada': None,
+            'palabras_por_pagina': None, 'tiempos': tiempos}
+
+
+def _normalizar_metadatos(info):
+    """Quedarse con las claves conocidas y convertir las fechas PDF a datetime"""
+    metadatos = {}
+    for clave_pdf, clave in CLAVES_METADATOS.items():
+        valor = info.get(clave_pdf)
+        if not valor:
+            continue
+        valor = str(valor).strip()
+        if clave.startswith('fecha_'):
+            valor = parsear_fecha_pdf(valor)
+        if valor:
+            metadatos[clave] = valor
+    return metadatos
+
+
+def parsear_fecha_pdf(valor):
+    """Convertir una fecha con formato PDF (``D:AAAAMMDDHHmmSS``) a datetime"""
+    valor = valor[2:] if valor.startswith('D:') else valor
+    digitos = ''.join(c for c in valor[:14] if c.isdigit())
+    for formato, largo in (('%Y%m%d%H%M%S', 14), ('%Y%m%d', 8), ('%Y', 4)):
+        if len(digitos) >= largo:
+            try:
+                return datetime.strptime(digitos[:largo], formato)
+            except ValueError:
+                continue
+    return None
+
+
+def extraer_texto_pdf(ruta):
+    """Capa de texto completa del PDF, página por página, con pypdfium2"""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(ruta)
+    partes = []
+    try:
+        for indice in range(len(pdf)):
+            pagina = pdf[indice]
+            try:
+                textpage = pagina.get_textpage()
+                partes.append(textpage.get_text_range())
+                textpage.close()
+            finally:
+                pagina.close()
+    finally:
+        pdf.close()
+    return '\n'.join(partes)
+
+
+def calcular_huella(ruta, tamano_bloque=1024 * 1024):
+    """SHA-256 del archivo, leído por bloques para no cargarlo entero en memoria"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def imagen_a_jpeg(imagen, calidad=85):
+    """Codificar una imagen PIL como JPEG y devolver los bytes"""
+    buffer = BytesIO()
+    imagen.save(buffer, format='JPEG', quality=calidad)
+    return buffer.getvalue()
+
+
+# Huellas ya importadas, compartidas con los procesos de ``importar_catalogo``
+_huellas_conocidas = frozenset()
+_paginas_muestra_importacion = PAGINAS_MUESTRA
+
+
+def inicializar_importacion(huellas, paginas_muestra=PAGINAS_MUESTRA):
+    """
+    Inicializador del pool de importación: recibe las huellas ya presentes en
+    el catálogo y cuántas páginas muestrear para el tiempo de lectura.
+    """
+    global _huellas_conocidas, _paginas_muestra_importacion
+    _huellas_conocidas = frozenset(huellas)
+    _paginas_muestra_importacion = paginas_muestra
+
+
+def procesar_archivo_importacion(ruta):
+    """
+    Huella, sondeo y portada JPEG de un PDF a importar.
+    Corre en un proceso del pool, por eso no toca la base de datos y
+    devuelve solo datos serializables.
+    """
+    resultado = {'ruta': ruta, 'huella': None, 'paginas': 0, 'metadatos': {},
+                 'portada': None, 'palabras_por_pagina': None, 'omitido': False, 'error': None}
+    try:
+        resultado['huella'] = calcular_huella(ruta)
+        if resultado['huella'] in _huellas_conocidas:
+            resultado['omitido'] = True
+            return resultado
+
+        sondeo = sondear_pdf(ruta, paginas_muestra=_paginas_muestra_importacion)
+        resultado['paginas'] = sondeo['paginas']
+        resultado['metadatos'] = sondeo['metadatos']
+        resultado['palabras_por_pagina'] = sondeo['palabras_por_pagina']
+        if sondeo['portada'] is not None:
+            resultado['portada'] = imagen_a_jpeg(sondeo['portada'])
+    except Exception as e:
+        resultado['error'] = str(e)
+    return resultado
+
+
+def formatear_tiempos(tiempos):
+    """Resumen legible de los tiempos por etapa, en milisegundos"""
+    return ', '.join(f"{etapa} {segundos * 1000:.0f} ms" for etapa, segundos in tiempos.items())
@@ -0,0 +1,222 @@
+# sril/recomendaciones.py
+"""
+Listas de recomendaciones materializadas por usuario.
+
+La vista ``recomendaciones`` solo lee ``RecomendacionUsuario`` (una
+consulta por el índice ``(usuario, seccion, posicion)``). Las listas se
+calculan fuera de la petición:
+
+  - ``PREFERENCIAS``: puntuación híbrida (``sril/hibrido.py``) de los libros
+    de las categorías que le interesan: interés, rating suavizado,
+    popularidad y novedad.
+  - ``SIMILARES``: candidatos del filtrado colaborativo
+    (``sril/colaborativo.py``), completados con libros parecidos por
+    contenido a sus favoritos (``sril/vectores.py``) y con la puntuación
+    híbrida sin intereses.
+
+En ambas se omiten los libros que el usuario ya puntuó o tiene en su
+historial: al calcular, con su conjunto de bits de ``sril/vistos.py``; al
+leer la lista, con un ``NOT EXISTS`` por fila, así que un libro recién
+puntuado desaparece sin esperar al worker.
+
+Cuando cambian las puntuaciones, preferencias o historial de un usuario, las
+señales solo lo marcan en ``RecomendacionPendiente``. El worker
+(``manage.py refrescar_recomendaciones``) recalcula por lotes los usuarios
+cuya marca lleva ``RECOMENDACIONES_ESPERA_SEGUNDOS`` sin cambiar, así que
+puntuar diez libros seguidos cuesta un solo recálculo.
+
+La petición nunca calcula (NumPy y SciPy no se cargan en los procesos web).
+Cada cálculo deja una marca en ``RecomendacionCalculada``, así una lista que
+quedó vacía no se vuelve a calcular; a un usuario sin lista ni marca (p. ej.
+recién registrado) se le muestran los mejor valorados y se deja marcado
+para el worker.
+"""
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+RECOMENDADOS = 8
+SUGERIDOS = 12
+
+
+def _espera():
+    return getattr(settings, 'RECOMENDACIONES_ESPERA_SEGUNDOS', 10)
+
+
+def calcular_lista(usuario_id):
+    """``[(seccion, libro_id, score)]`` ya ordenada dentro de cada sección"""
+    import numpy as np
+    from .colaborativo import candidatos_usuario
+    from .hibrido import catalogo
+    from .models import PreferenciaUsuario
+    from .vistos import vistos_usuario
+
+    # Lo ya visto y lo activo se comprueban en memoria: el conjunto de bits
+    # del usuario y los ids del catálogo puntuable
+    vistos = vistos_usuario(usuario_id)
+    excluidos = vistos.como_array()
+    puntuables = catalogo()
+
+    intereses = dict(PreferenciaUsuario.objects.filter(usuario_id=usuario_id).values_list('categoria_id', 'nivel_interes'))
+    preferidos = puntuables.puntuar(intereses, excluir=excluidos, limite=RECOMENDADOS, solo_con_interes=True)
+    lista = [('PREFERENCIAS', libro_id, score) for libro_id, score in preferidos]
+    tomados = {libro_id for libro_id, _ in preferidos}
+
+    def nuevos(candidatos):
+        validos = puntuables.activos(libro_id for libro_id, _ in candidatos)
+        return [
+            (libro_id, score) for libro_id, score in candidatos
+            if libro_id in validos and libro_id not in vistos and libro_id not in tomados
+        ]
+
+    similares = nuevos(candidatos_usuario(usuario_id, limite=SUGERIDOS * 3))[:SUGERIDOS]
+    tomados.update(libro_id for libro_id, _ in similares)
+
+    if len(similares) < SUGERIDOS:
+        # Libros parecidos por contenido a sus favoritos: cubre los libros
+        # nuevos, que aún no tienen puntuaciones para el filtrado colaborativo
+        por_contenido = parecidos_a_favoritos(usuario_id, SUGERIDOS * 3, excluir=tomados)
+        similares += nuevos(por_contenido)[:SUGERIDOS - len(similares)]
+        tomados.update(libro_id for libro_id, _ in similares)
+
+    if len(similares) < SUGERIDOS:
+        # Sin datos suficientes: el mejor rating suavizado, popularidad y novedad
+        excluidos = np.concatenate([excluidos, np.fromiter(tomados, dtype=np.int64)])
+        similares += puntuables.puntuar({}, excluir=excluidos, limite=SUGERIDOS - len(similares))
+    lista += [('SIMILARES', libro_id, score) for libro_id, score in similares]
+    return lista
+
+
+def parecidos_a_favoritos(usuario_id, limite, excluir=()):
+    """
+    ``[(libro_id, coseno)]`` del índice de vectores de contenido, parecidos
+    al perfil medio de los libros que el usuario puntuó con 4 o más.
+    """
+    from .models import Puntuacion
+    from .vectores import indice
+
+    favoritos = list(Puntuacion.objects.filter(usuario_id=usuario_id, puntuacion__gte=4).order_by(
+        '-puntuacion', '-fecha_puntuacion'
+    ).values_list('libro_id', flat=True)[:10])
+    if not favoritos:
+        return []
+    try:
+        import numpy as np
+    except ImportError:
+        return []
+    vectores = [vector for vector in map(indice.vector, favoritos) if vector is not None]
+    if not vectores:
+        return []
+    return indice.similares_a(np.mean(vectores, axis=0), limite, excluir=set(favoritos) | set(excluir))
+
+
+def refrescar_usuarios(usuario_ids):
+    """Recalcular y reemplazar en una transacción las listas de ``usuario_ids``"""
+    from .models import RecomendacionCalculada, RecomendacionUsuario
+
+    filas = []
+    for usuario_id in usuario_ids:
+        posiciones = {}
+        for seccion, libro_id, score in calcular_lista(usuario_id):
+            posiciones[seccion] = posiciones.get(seccion, 0) + 1
+            filas.append(RecomendacionUsuario(
+                usuario_id=usuario_id, libro_id=libro_id, seccion=seccion,
+                posicion=posiciones[seccion], score=round(score, 4),
+            ))
+    with transaction.atomic():
+        RecomendacionUsuario.objects.filter(usuario_id__in=usuario_ids).delete()
+        RecomendacionUsuario.objects.bulk_create(filas, batch_size=1000)
+        ahora = timezone.now()
+        RecomendacionCalculada.objects.bulk_create(
+            [RecomendacionCalculada(usuario_id=usuario_id, fecha_calculo=ahora) for usuario_id in usuario_ids],
+            update_conflicts=True, unique_fields=['usuario'], update_fields=['fecha_calculo'],
+        )
+    return len(filas)
+
+
+def marcar_pendiente(*usuario_ids):
+    """Marcar (o volver a marcar) usuarios cuya lista está desactualizada"""
+    from .models import RecomendacionPendiente, Usuario
+
+    ahora = timezone.now()
+    # Un usuario borrado también borra sus puntuaciones: no hay nada que marcar
+    existentes = Usuario.objects.filter(pk__in=set(usuario_ids)).values_list('pk', flat=True)
+    RecomendacionPendiente.objects.bulk_create(
+        [RecomendacionPendiente(usuario_id=usuario_id, fecha_cambio=ahora) for usuario_id in existentes],
+        update_conflicts=True, unique_fields=['usuario'], update_fields=['fecha_cambio'],
+    )
+
+
+def refrescar_pendientes(limite=100):
+    """
+    Recalcular hasta ``limite`` usuarios cuya marca lleva un rato sin cambiar.
+    Devuelve cuántos se recalcularon.
+    """
+    from .models import RecomendacionPendiente
+
+    corte = timezone.now() - timedelta(seconds=_espera())
+    pendientes = list(
+        RecomendacionPendiente.objects.filter(fecha_cambio__lte=corte)
+        .order_by('fecha_cambio').values_list('usuario_id', 'fecha_cambio')[:limite]
+    )
+    if not pendientes:
+        return 0
+
+    refrescar_usuarios([usuario_id for usuario_id, _ in pendientes])
+    # Solo se quitan las marcas que no cambiaron durante el cálculo: las
+    # demás se recalculan en la siguiente pasada
+    for inicio in range(0, len(pendientes), 300):
+        RecomendacionPendiente.objects.filter(reduce(or_, (
+            Q(usuario_id=usuario_id, fecha_cambio=fecha_cambio)
+            for usuario_id, fecha_cambio in pendientes[inicio:inicio + 300]
+        ))).delete()
+    return len(pendientes)
+
+
+def leer_recomendaciones(usuario, campos_libro):
+    """
+    ``{seccion: [libros]}`` desde la lista materializada. Un usuario cuya
+    lista aún no se calculó recibe los mejor valorados como sugerencias y
+    queda marcado para el worker.
+    """
+    from .models import (
+        HistorialLectura, Libro, Puntuacion, RecomendacionCalculada, RecomendacionPendiente, RecomendacionUsuario,
+    )
+
+    # Lo puntuado o leído después del cálculo no se muestra aunque el worker
+    # aún no haya rehecho la lista: un NOT EXISTS por índice (usuario, libro)
+    # por fila de la lista, no por libro del historial
+    def sin_vistos(consulta, campo_libro):
+        visto = {'usuario': usuario, 'libro': OuterRef(campo_libro)}
+        return (
+            consulta.exclude(Exists(Puntuacion.objects.filter(**visto)))
+            .exclude(Exists(HistorialLectura.objects.filter(**visto)))
+        )
+
+    filas = list(
+        sin_vistos(RecomendacionUsuario.objects.filter(usuario=usuario, libro__activo=True), 'libro')
+        .select_related('libro')
+        .only('seccion', 'libro', *(f'libro__{campo}' for campo in campos_libro))
+        .order_by('seccion', 'posicion')
+    )
+    secciones = {seccion: [] for seccion, _ in RecomendacionUsuario.SECCION_CHOICES}
+    for fila in filas:
+        secciones[fila.seccion].append(fila.libro)
+    if filas or RecomendacionCalculada.objects.filter(usuario=usuario).exists():
+        return secciones
+
+    # Sin lista calculada: el worker la calcula en su siguiente pasada. Una
+    # marca que ya exista no se reprograma, o recargar la página la retrasaría
+    RecomendacionPendiente.objects.bulk_create(
+        [RecomendacionPendiente(usuario=usuario, fecha_cambio=timezone.now())], ignore_conflicts=True,
+    )
+    secciones['SIMILARES'] = list(
+        sin_vistos(Libro.objects.filter(activo=True), 'pk')
+        .only(*campos_libro).order_by('-rating_avg')[:SUGERIDOS]
+    )
+    return secciones
@@ -1,13 +1,253 @@
-from django.db.models.signals import post_save
+# sril/signals.py
+# La portada ya no se genera en una señal post_save: Libro.save() encola el
+# procesamiento del PDF y lo atiende el worker (manage.py procesar_tareas).
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Libro
+from .models import (
+    Categoria, HistorialLectura, Libro, LibroCategoria, LibroSimilar, PreferenciaUsuario, Puntuacion
+)
+from .busqueda import actualizar_sinopsis, eliminar_del_indice
+from .autocompletado import indice as indice_autocompletado
+from .facetas import invalidar_conteos_catalogo
+from .tarjetas import CAMPOS_TARJETA_CACHEADA
+from .cache_paginas import invalidar_etiquetas
+from .similares import programar_actualizacion as programar_similares
+from .recomendaciones import marcar_pendiente as marcar_recomendaciones
+from .vectores import programar_actualizacion as programar_vectores
+from .vistos import desmarcar_visto, marcar_visto
+
+CAMPOS_AUTOCOMPLETADO = {'titulo', 'autor', 'activo'}
+
+@receiver(post_save, sender=Libro)
+def sincronizar_sinopsis_indice(sender, instance, update_fields=None, **kwargs):
+    """Mantener la sinopsis al día en el índice de texto completo"""
+    if update_fields is None or 'sinopsis' in update_fields:
+        actualizar_sinopsis(instance.pk, instance.sinopsis)
+
+@receiver(post_delete, sender=Libro)
+def quitar_libro_del_indice(sender, instance, **kwargs):
+    eliminar_del_indice(instance.pk)
+
+@receiver(post_delete, sender=Puntuacion)
+def descontar_puntuacion(sender, instance, **kwargs):
+    """Restar la puntuación borrada de los agregados del libro (dentro de la transacción del borrado)"""
+    Libro.acumular_puntuacion(instance.libro_id, -1, -instance.puntuacion)
+
+@receiver(post_save, sender=Libro)
+def actualizar_autocompletado(sender, instance, update_fields=None, **kwargs):
+    """Parchear el índice de prefijos cuando cambian título, autor o visibilidad"""
+    if not indice_autocompletado.construido:
+        return
+    if update_fields is not None and not CAMPOS_AUTOCOMPLETADO & set(update_fields):
+        return
+    libro_id, titulo, autor, activo, popularidad = (
+        instance.pk, instance.titulo, instance.autor, instance.activo, instance.rating_count
+    )
+    if activo:
+        transaction.on_commit(lambda: indice_autocompletado.actualizar(libro_id, titulo, autor, popularidad))
+    else:
+        transaction.on_commit(lambda: indice_autocompletado.eliminar(libro_id))
+
+@receiver(post_delete, sender=Libro)
+def quitar_del_autocompletado(sender, instance, **kwargs):
+    if indice_autocompletado.construido:
+        libro_id = instance.pk
+        transaction.on_commit(lambda: indice_autocompletado.eliminar(libro_id))
+
+@receiver(post_save, sender=Puntuacion)
+def sumar_popularidad_autocompletado(sender, instance, created=False, **kwargs):
+    if created and indice_autocompletado.construido:
+        libro_id = instance.libro_id
+        transaction.on_commit(lambda: indice_autocompletado.ajustar_popularidad(libro_id, 1))
+
+@receiver(post_delete, sender=Puntuacion)
+def restar_popularidad_autocompletado(sender, instance, **kwargs):
+    if indice_autocompletado.construido:
+        libro_id = instance.libro_id
+        transaction.on_commit(lambda: indice_autocompletado.ajustar_popularidad(libro_id, -1))
+
+@receiver(post_save, sender=Libro)
+def invalidar_facetas_libro(sender, instance, created=False, update_fields=None, **kwargs):
+    """Un libro que se activa o desactiva cambia los conteos por categoría del catálogo"""
+    if not created and (update_fields is None or 'activo' in update_fields):
+        transaction.on_commit(invalidar_conteos_catalogo)
+
+@receiver(post_delete, sender=Libro)
+@receiver(post_save, sender=LibroCategoria)
+@receiver(post_delete, sender=LibroCategoria)
+def invalidar_facetas(sender, **kwargs):
+    transaction.on_commit(invalidar_conteos_catalogo)
+
+@receiver(m2m_changed, sender=LibroCategoria)
+def invalidar_facetas_m2m(sender, action, **kwargs):
+    # libro.categorias.add()/remove()/clear() no envían post_save de la tabla intermedia
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidar_conteos_catalogo)
+
+# Versión de las tarjetas cacheadas. Las puntuaciones la suben en el propio
+# UPDATE de Libro.acumular_puntuacion
+
+@receiver(post_save, sender=Libro)
+def invalidar_tarjeta_libro(sender, instance, created=False, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is None or CAMPOS_TARJETA_CACHEADA & set(update_fields):
+        Libro.invalidar_tarjetas([instance.pk])
+
+@receiver(post_save, sender=LibroCategoria)
+@receiver(post_delete, sender=LibroCategoria)
+def invalidar_tarjeta_categoria(sender, instance, **kwargs):
+    Libro.invalidar_tarjetas([instance.libro_id])
+
+@receiver(m2m_changed, sender=LibroCategoria)
+def invalidar_tarjetas_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        Libro.invalidar_tarjetas([instance.pk])
+    elif action == 'pre_clear':
+        Libro.invalidar_tarjetas(list(instance.libro_set.values_list('pk', flat=True)))
+    else:
+        Libro.invalidar_tarjetas(list(pk_set or ()))
+
+@receiver(post_save, sender=Categoria)
+def invalidar_tarjetas_categoria_renombrada(sender, instance, created=False, **kwargs):
+    if not created:
+        Libro.invalidar_tarjetas(list(instance.libro_set.values_list('pk', flat=True)))
+
+# Caché de páginas anónimas (sril/cache_paginas.py)
+
+def _invalidar_paginas(*etiquetas):
+    transaction.on_commit(lambda: invalidar_etiquetas(*etiquetas))
 
 @receiver(post_save, sender=Libro)
-def generar_portada_despues_de_guardar(sender, instance, created, **kwargs):
-    """Generar portada después de guardar el libro"""
-    if instance.archivo_pdf and (created or not instance.portada):
-        print(f"🚀 Señal: Generando portada para {instance.titulo}")
-        instance.generar_portada_desde_pdf()
-        # Guardar solo si se generó la portada
-        if instance.portada:
-            instance.save()
\ No newline at end of file
+@receiver(post_delete, sender=Libro)
+def invalidar_paginas_libro(sender, instance, **kwargs):
+    _invalidar_paginas('catalogo', f'libro:{instance.pk}')
+
+@receiver(post_save, sender=Puntuacion)
+@receiver(post_delete, sender=Puntuacion)
+def invalidar_paginas_puntuacion(sender, instance, **kwargs):
+    # El rating cambia el orden de destacados y las estrellas de las tarjetas
+    _invalidar_paginas('catalogo', f'libro:{instance.libro_id}')
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_paginas_categoria(sender, **kwargs):
+    _invalidar_paginas('catalogo', 'categorias')
+
+@receiver(post_save, sender=LibroCategoria)
+@receiver(post_delete, sender=LibroCategoria)
+def invalidar_paginas_libro_categoria(sender, instance, **kwargs):
+    _invalidar_paginas('catalogo', f'libro:{instance.libro_id}')
+
+@receiver(m2m_changed, sender=LibroCategoria)
+def invalidar_paginas_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        _invalidar_paginas('catalogo', *(f'libro:{pk}' for pk in pk_set or ()))
+    else:
+        _invalidar_paginas('catalogo', f'libro:{instance.pk}')
+
+# Libros similares precalculados (sril/similares.py): los cambios de categorías
+# y de visibilidad se marcan al confirmar la transacción y los atiende el worker
+
+@receiver(post_save, sender=LibroCategoria)
+@receiver(post_delete, sender=LibroCategoria)
+def actualizar_similares_categoria(sender, instance, **kwargs):
+    programar_similares(instance.libro_id)
+
+@receiver(m2m_changed, sender=LibroCategoria)
+def actualizar_similares_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        programar_similares(instance.pk)
+    elif action == 'pre_clear':
+        programar_similares(*instance.libro_set.values_list('pk', flat=True))
+    else:
+        programar_similares(*(pk_set or ()))
+
+@receiver(post_save, sender=Libro)
+def actualizar_similares_libro(sender, instance, created=False, update_fields=None, **kwargs):
+    """Un libro desactivado sale de las listas; uno reactivado vuelve a entrar"""
+    if update_fields is not None and 'activo' not in update_fields:
+        return
+    # Libro.save siempre incluye ``activo`` en update_fields: se compara con el
+    # valor cargado para que editar otros campos no marque nada
+    anterior = getattr(instance, '_activo_cargado', None)
+    instance._activo_cargado = instance.activo
+    if created:
+        return
+    if anterior is not None:
+        if anterior != instance.activo:
+            programar_similares(instance.pk)
+        return
+    # Instancia que no salió de la base de datos: solo si la tabla no refleja
+    # ya la visibilidad del libro
+    if instance.activo:
+        pendiente = not instance.similares.exists() and instance.categorias.exists()
+    else:
+        pendiente = instance.similares.exists() or LibroSimilar.objects.filter(similar=instance).exists()
+    if pendiente:
+        programar_similares(instance.pk)
+
+@receiver(pre_delete, sender=Libro)
+def actualizar_similares_libro_borrado(sender, instance, **kwargs):
+    # Tras el borrado sus filas desaparecen en cascada y ya no se sabría qué listas rellenar
+    programar_similares(*LibroSimilar.objects.filter(similar=instance).values_list('libro_id', flat=True))
+
+# Listas de recomendaciones (sril/recomendaciones.py): solo se marca al
+# usuario; el worker recalcula cuando deja de haber cambios
+
+@receiver(post_save, sender=Puntuacion)
+@receiver(post_delete, sender=Puntuacion)
+@receiver(post_save, sender=PreferenciaUsuario)
+@receiver(post_delete, sender=PreferenciaUsuario)
+@receiver(post_save, sender=HistorialLectura)
+@receiver(post_delete, sender=HistorialLectura)
+def marcar_recomendaciones_usuario(sender, instance, **kwargs):
+    usuario_id = instance.usuario_id
+    transaction.on_commit(lambda: marcar_recomendaciones(usuario_id))
+
+# Libros vistos por usuario (sril/vistos.py): se actualizan en la misma
+# transacción que la puntuación o el historial
+
+@receiver(post_save, sender=Puntuacion)
+@receiver(post_save, sender=HistorialLectura)
+def marcar_libro_visto(sender, instance, created=False, **kwargs):
+    if created:
+        marcar_visto(instance.usuario_id, instance.libro_id)
+
+@receiver(post_delete, sender=Puntuacion)
+@receiver(post_delete, sender=HistorialLectura)
+def desmarcar_libro_visto(sender, instance, **kwargs):
+    desmarcar_visto(instance.usuario_id, instance.libro_id)
+
+# Índice de vectores de contenido (sril/vectores.py)
+
+CAMPOS_VECTORES = {'titulo', 'sinopsis', 'activo'}
+
+@receiver(post_save, sender=Libro)
+def actualizar_vector_libro(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or CAMPOS_VECTORES & set(update_fields):
+        programar_vectores(instance.pk)
+
+@receiver(post_delete, sender=Libro)
+@receiver(post_save, sender=LibroCategoria)
+@receiver(post_delete, sender=LibroCategoria)
+def actualizar_vector_categorias(sender, instance, **kwargs):
+    programar_vectores(instance.libro_id if sender is LibroCategoria else instance.pk)
+
+@receiver(m2m_changed, sender=LibroCategoria)
+def actualizar_vectores_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        programar_vectores(instance.pk)
+    elif action == 'pre_clear':
+        programar_vectores(*instance.libro_set.values_list('pk', flat=True))
+    else:
+        programar_vectores(*(pk_set or ()))
@@ -0,0 +1,291 @@
+# sril/similares.py
+"""
+Tabla precalculada de libros similares (``LibroSimilar``).
+
+El score de un vecino combina:
+  - el solapamiento de categorías, como coseno entre los vectores de
+    categorías de ambos libros ponderados por IDF (compartir una categoría
+    poco frecuente pesa más que compartir una muy común), y
+  - el rating del vecino suavizado hacia la media global, para que un libro
+    con una sola puntuación de 5 no supere a uno con cientos.
+
+Los libros con las mismas categorías (la misma "firma") tienen exactamente
+los mismos candidatos, así que los vecinos se calculan una vez por firma y
+no por libro. Con pocas categorías hay pocas firmas distintas y recalcular
+todo el catálogo cuesta segundos.
+
+``recalcular_similares`` recalcula todo el catálogo (``manage.py
+recalcular_similares``) y ``actualizar_similares`` solo las listas que
+afecta un cambio de categorías o de visibilidad. Las señales no calculan
+nada en la petición: al confirmar la transacción marcan los libros en
+``SimilarPendiente`` y el worker (``manage.py recalcular_similares
+--pendientes``) los atiende por lotes. En ambos casos se reescriben solo las
+listas que cambian. Los cambios de rating, y el leve desplazamiento de los
+pesos IDF que provoca cada cambio de categorías, no se propagan solos: los
+recoge el recálculo completo.
+"""
+import heapq
+import math
+import threading
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q, Sum
+from django.utils import timezone
+
+PESO_CATEGORIAS = 0.8
+PESO_RATING = 0.2
+# Puntuaciones "virtuales" con la media global que se suman a cada libro
+PUNTUACIONES_PREVIAS = 5
+
+
+def vecinos_por_libro():
+    return getattr(settings, 'SIMILARES_POR_LIBRO', 12)
+
+
+class DatosCatalogo:
+    """Categorías y ratings de los libros activos, agrupados por firma"""
+
+    def __init__(self):
+        from .models import Libro, LibroCategoria
+
+        activos = Libro.objects.filter(activo=True)
+        totales = activos.aggregate(suma=Sum('rating_sum'), conteo=Sum('rating_count'))
+        media = float(totales['suma'] or 0) / totales['conteo'] if totales['conteo'] else 3.0
+
+        self.rating = {
+            libro_id: (conteo * float(promedio) + PUNTUACIONES_PREVIAS * media) / (conteo + PUNTUACIONES_PREVIAS) / 5
+            for libro_id, promedio, conteo in activos.values_list('id', 'rating_avg', 'rating_count').iterator()
+        }
+
+        categorias = defaultdict(set)
+        for libro_id, categoria_id in LibroCategoria.objects.filter(
+            libro__activo=True
+        ).values_list('libro_id', 'categoria_id').iterator():
+            categorias[libro_id].add(categoria_id)
+        self.firma = {libro_id: frozenset(cats) for libro_id, cats in categorias.items()}
+
+        miembros = defaultdict(list)
+        for libro_id, firma in self.firma.items():
+            miembros[firma].append(libro_id)
+        # Cada firma con sus libros de mejor a peor rating
+        self.miembros = {
+            firma: sorted(ids, key=lambda libro_id: self.rating.get(libro_id, 0), reverse=True)
+            for firma, ids in miembros.items()
+        }
+
+        frecuencia = defaultdict(int)
+        self.firmas_por_categoria = defaultdict(list)
+        for firma, ids in self.miembros.items():
+            for categoria_id in firma:
+                frecuencia[categoria_id] += len(ids)
+                self.firmas_por_categoria[categoria_id].append(firma)
+        total = max(1, len(self.firma))
+        self.idf = {categoria_id: math.log(1 + total / df) for categoria_id, df in frecuencia.items()}
+        self._normas = {}
+        self._listas = {}
+
+    def _norma(self, firma):
+        if firma not in self._normas:
+            self._normas[firma] = math.sqrt(sum(self.idf[c] ** 2 for c in firma))
+        return self._normas[firma]
+
+    def similitud(self, firma_a, firma_b):
+        comunes = firma_a & firma_b
+        if not comunes:
+            return 0.0
+        return sum(self.idf[c] ** 2 for c in comunes) / (self._norma(firma_a) * self._norma(firma_b))
+
+    def lista_firma(self, firma, k):
+        """
+        Los ``k + 1`` mejores candidatos ``(score, libro_id)`` para los libros
+        de ``firma`` (uno de más para poder quitar al propio libro).
+        """
+        if firma not in self._listas:
+            candidatas = {otra for c in firma for otra in self.firmas_por_categoria[c]}
+            puntuados = (
+                (PESO_CATEGORIAS * sim + PESO_RATING * self.rating.get(libro_id, 0), libro_id)
+                for otra, sim in ((otra, self.similitud(firma, otra)) for otra in candidatas)
+                # Dentro de la firma ya están ordenados por rating: bastan los k + 1 primeros
+                for libro_id in self.miembros[otra][:k + 1]
+            )
+            self._listas[firma] = heapq.nlargest(k + 1, puntuados)
+        return self._listas[firma]
+
+    def vecinos(self, libro_id, k):
+        firma = self.firma.get(libro_id)
+        if not firma:
+            return []
+        return [(score, otro) for score, otro in self.lista_firma(firma, k) if otro != libro_id][:k]
+
+
+def _insertar(filas, tamano_lote=5000):
+    """
+    Insertar ``(libro_id, similar_id, score)`` con executemany: con un millón
+    de filas, crear las instancias para bulk_create cuesta más que escribirlas.
+    """
+    from .models import LibroSimilar
+
+    tabla = connection.ops.quote_name(LibroSimilar._meta.db_table)
+    sql = f"INSERT INTO {tabla} (libro_id, similar_id, score) VALUES (%s, %s, %s)"
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), tamano_lote):
+            cursor.executemany(sql, filas[inicio:inicio + tamano_lote])
+
+
+def _filas(libro_id, vecinos):
+    return [(libro_id, otro, round(score, 6)) for score, otro in vecinos]
+
+
+def _guardar_listas(datos, libro_ids, k, tamano_lote=5000):
+    """
+    Comparar por bloques las listas guardadas de ``libro_ids`` con las
+    nuevas y reescribir solo las que cambian. Devuelve cuántas se reescribieron.
+    """
+    from .models import LibroSimilar
+
+    libro_ids = sorted(libro_ids)
+    reescritas = 0
+    with transaction.atomic():
+        for inicio in range(0, len(libro_ids), 900):
+            bloque = libro_ids[inicio:inicio + 900]
+            actuales = defaultdict(dict)
+            for libro_id, similar_id, score in LibroSimilar.objects.filter(
+                libro_id__in=bloque
+            ).values_list('libro_id', 'similar_id', 'score'):
+                actuales[libro_id][similar_id] = score
+
+            reescribir, filas = [], []
+            for libro_id in bloque:
+                nuevas = _filas(libro_id, datos.vecinos(libro_id, k))
+                if {similar_id: score for _, similar_id, score in nuevas} != actuales.get(libro_id, {}):
+                    reescribir.append(libro_id)
+                    filas.extend(nuevas)
+            if reescribir:
+                LibroSimilar.objects.filter(libro_id__in=reescribir).delete()
+                _insertar(filas, tamano_lote)
+            reescritas += len(reescribir)
+    return reescritas
+
+
+def recalcular_similares(tamano_lote=5000):
+    """
+    Recalcular la tabla completa. Solo se escriben las listas que cambian,
+    así que repetirlo tras pocos cambios es mucho más rápido que la primera
+    vez. Devuelve ``(listas reescritas, filas totales)``.
+    """
+    from .models import LibroSimilar
+
+    k = vecinos_por_libro()
+    datos = DatosCatalogo()
+    # También los libros que ya no están activos o se quedaron sin categorías,
+    # para vaciar sus listas
+    libro_ids = set(datos.firma)
+    libro_ids.update(LibroSimilar.objects.values_list('libro_id', flat=True).distinct())
+    reescritas = _guardar_listas(datos, libro_ids, k, tamano_lote)
+    return reescritas, LibroSimilar.objects.count()
+
+
+def actualizar_similares(libro_ids):
+    """
+    Recalcular solo las listas afectadas por un cambio de categorías (o de
+    visibilidad) de ``libro_ids``: las de esos libros, las que los contenían
+    y las de las firmas en cuyo top entran ahora. Devuelve cuántas listas se
+    reescribieron.
+
+    Un libro solo puede entrar en las listas de firmas con las que comparte
+    alguna categoría. Para cada una basta comparar su score con el último de
+    la lista guardada del mejor libro de la firma: si el mejor libro está en
+    el top de su firma, su lista acaba en el ``k + 1``-ésimo candidato, que
+    es el umbral más bajo de todos los libros de la firma.
+    """
+    from .models import LibroSimilar
+
+    k = vecinos_por_libro()
+    cambiados = set(libro_ids)
+    datos = DatosCatalogo()
+
+    afectados = set(cambiados)
+    afectados.update(LibroSimilar.objects.filter(similar_id__in=cambiados).values_list('libro_id', flat=True))
+
+    nuevos = [(libro_id, datos.firma[libro_id]) for libro_id in cambiados if datos.firma.get(libro_id)]
+    candidatas = {otra for _, firma_libro in nuevos for c in firma_libro for otra in datos.firmas_por_categoria[c]}
+    representantes = {datos.miembros[firma][0]: firma for firma in candidatas}
+    umbrales = {}
+    ids = list(representantes)
+    for inicio in range(0, len(ids), 900):
+        umbrales.update(
+            (libro_id, (minimo, n)) for libro_id, minimo, n in LibroSimilar.objects.filter(
+                libro_id__in=ids[inicio:inicio + 900]
+            ).values('libro_id').annotate(minimo=Min('score'), n=Count('id')).values_list('libro_id', 'minimo', 'n')
+        )
+    for representante, firma in representantes.items():
+        minimo, n = umbrales.get(representante, (0.0, 0))
+        # Los scores guardados están redondeados: mejor revisar de más
+        entra = n < k or any(
+            firma_libro == firma
+            or PESO_CATEGORIAS * datos.similitud(firma, firma_libro) + PESO_RATING * datos.rating.get(libro_id, 0) >= minimo - 1e-6
+            for libro_id, firma_libro in nuevos
+        )
+        if entra:
+            afectados.update(datos.miembros[firma])
+    return _guardar_listas(datos, afectados, k)
+
+
+def marcar_pendiente(*libro_ids):
+    """Dejar ``libro_ids`` para el worker (``manage.py recalcular_similares --pendientes``)"""
+    from .models import Libro, SimilarPendiente
+
+    ahora = timezone.now()
+    # Un libro borrado ya no tiene listas que revisar
+    existentes = Libro.objects.filter(pk__in=set(libro_ids)).values_list('pk', flat=True)
+    SimilarPendiente.objects.bulk_create(
+        [SimilarPendiente(libro_id=libro_id, fecha_cambio=ahora) for libro_id in existentes],
+        update_conflicts=True, unique_fields=['libro'], update_fields=['fecha_cambio'],
+    )
+
+
+def procesar_pendientes(limite=500):
+    """
+    Revisar las listas afectadas por hasta ``limite`` libros marcados.
+    Devuelve ``(libros atendidos, listas reescritas)``.
+    """
+    from .models import SimilarPendiente
+
+    pendientes = list(
+        SimilarPendiente.objects.order_by('fecha_cambio').values_list('libro_id', 'fecha_cambio')[:limite]
+    )
+    if not pendientes:
+        return 0, 0
+
+    reescritas = actualizar_similares([libro_id for libro_id, _ in pendientes])
+    # Solo se quitan las marcas que no cambiaron durante el cálculo
+    for inicio in range(0, len(pendientes), 300):
+        SimilarPendiente.objects.filter(reduce(or_, (
+            Q(libro_id=libro_id, fecha_cambio=fecha_cambio)
+            for libro_id, fecha_cambio in pendientes[inicio:inicio + 300]
+        ))).delete()
+    return len(pendientes), reescritas
+
+
+# Cambios acumulados en la transacción en curso: se marcan juntos al confirmar
+_pendientes = threading.local()
+
+
+def programar_actualizacion(*libro_ids):
+    if not hasattr(_pendientes, 'ids'):
+        _pendientes.ids = set()
+    _pendientes.ids.update(libro_id for libro_id in libro_ids if libro_id is not None)
+    # El primer callback que se ejecuta vacía el conjunto y los demás no hacen
+    # nada. Si la transacción se revierte, sus libros se revisan con el
+    # siguiente cambio confirmado (revisar de más no cambia el resultado)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def _procesar_pendientes():
+    ids, _pendientes.ids = getattr(_pendientes, 'ids', set()), set()
+    if ids:
+        marcar_pendiente(*ids)
@@ -0,0 +1,110 @@
+# sril/tareas.py
+"""
+Cola local de trabajos en segundo plano.
+
+Las tareas viven en la tabla ``TareaProcesamiento`` y las atiende el comando
+``python manage.py procesar_tareas``, que reparte el trabajo entre un pool de
+procesos para no bloquear las peticiones del admin.
+"""
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+
+# Los modelos se importan dentro de cada función: este módulo se carga en los
+# procesos del pool antes de que ``django.setup()`` haya terminado.
+
+
+def reclamar_tareas(limite):
+    """Marcar como PROCESANDO hasta ``limite`` tareas pendientes y devolver sus ids"""
+    from .models import TareaProcesamiento
+
+    pendientes = list(
+        TareaProcesamiento.objects.filter(estado='PENDIENTE')
+        .order_by('fecha_creacion')
+        .values_list('id', flat=True)[:limite]
+    )
+
+    reclamadas = []
+    for tarea_id in pendientes:
+        # La actualización condicional evita que dos workers tomen la misma tarea
+        actualizadas = TareaProcesamiento.objects.filter(
+            pk=tarea_id, estado='PENDIENTE'
+        ).update(estado='PROCESANDO', fecha_inicio=timezone.now())
+        if actualizadas:
+            reclamadas.append(tarea_id)
+    return reclamadas
+
+
+def encolar_lote(libros, descripcion, etapas=None, usuario=None):
+    """
+    Encolar el reprocesamiento forzado de muchos libros como un solo lote.
+    Hace un número fijo de consultas sea cual sea el tamaño de la selección;
+    las tareas pendientes que ya existían se suman al lote en lugar de duplicarse.
+    """
+    from .models import Libro, LoteTareas, TareaProcesamiento
+
+    libro_ids = [libro.pk for libro in libros]
+    lote = LoteTareas.objects.create(descripcion=descripcion, creado_por=usuario)
+
+    pendientes = TareaProcesamiento.objects.filter(libro_id__in=libro_ids, estado='PENDIENTE')
+    # Una tarea ya forzada conserva sus etapas: puede estar repitiendo más de las pedidas
+    pendientes.filter(forzar=False).update(forzar=True, etapas=etapas or [])
+    pendientes.update(lote=lote)
+    con_tarea = set(pendientes.values_list('libro_id', flat=True))
+
+    TareaProcesamiento.objects.bulk_create([
+        TareaProcesamiento(libro_id=libro_id, lote=lote, forzar=True, etapas=etapas or [])
+        for libro_id in libro_ids if libro_id not in con_tarea
+    ])
+    Libro.objects.filter(pk__in=libro_ids).update(estado_procesamiento='PENDIENTE')
+    return lote
+
+
+def liberar_tareas_atascadas(minutos):
+    """Devolver a la cola las tareas que quedaron en PROCESANDO tras una caída del worker"""
+    from .models import TareaProcesamiento
+
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TareaProcesamiento.objects.filter(
+        estado='PROCESANDO', fecha_inicio__lt=limite
+    ).update(estado='PENDIENTE', fecha_inicio=None)
+
+
+def ejecutar_tarea(tarea_id):
+    """
+    Ejecutar una tarea ya reclamada. Pensada para correr en un proceso del pool,
+    por eso recibe solo el id y devuelve datos simples.
+    """
+    from .models import Libro, TareaProcesamiento
+
+    tarea = TareaProcesamiento.objects.select_related('libro').get(pk=tarea_id)
+    libro = tarea.libro
+    Libro.objects.filter(pk=libro.pk).update(estado_procesamiento='PROCESANDO')
+
+    try:
+        libro.procesar_pdf(forzar=tarea.forzar, etapas=tarea.etapas or None)
+    except Exception as e:
+        Libro.objects.filter(pk=libro.pk).update(estado_procesamiento='FALLIDO')
+        TareaProcesamiento.objects.filter(pk=tarea_id).update(
+            estado='FALLIDO',
+            error=str(e),
+            intentos=tarea.intentos + 1,
+            fecha_fin=timezone.now(),
+        )
+        return tarea_id, False, str(e)
+
+    TareaProcesamiento.objects.filter(pk=tarea_id).update(
+        estado='COMPLETADO',
+        error=None,
+        intentos=tarea.intentos + 1,
+        fecha_fin=timezone.now(),
+    )
+    return tarea_id, True, None
+
+
+def inicializar_proceso():
+    """Inicializador de cada proceso del pool"""
+    import django
+    django.setup()
+    connections.close_all()
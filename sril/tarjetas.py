@@ -0,0 +1,54 @@
+# sril/tarjetas.py
+"""
+Caché de fragmento de las tarjetas de libro.
+
+``sril/libros/tarjeta_libro.html`` envuelve la tarjeta en ``{% cache %}``
+con la clave ``(libro.id, libro.version_cache, con_portada)``. La versión la
+incrementan las señales cuando cambia el libro, sus categorías o sus
+puntuaciones, así que una tarjeta cacheada nunca queda desactualizada: la
+siguiente petición simplemente usa otra clave.
+
+Las vistas llaman a ``preparar_tarjetas`` antes de renderizar para cargar
+las categorías solo de las tarjetas que no están en caché.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Prefetch, prefetch_related_objects
+
+NOMBRE_FRAGMENTO = 'tarjeta_libro'
+
+# Campos de Libro que se ven en la tarjeta: cambiarlos invalida la versión
+CAMPOS_TARJETA_CACHEADA = {'titulo', 'autor', 'portada', 'numero_paginas', 'tiempo_lectura_promedio'}
+
+
+def _cache_fragmentos():
+    # La misma caché que usa {% cache %}
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def clave_tarjeta(libro, con_portada=True):
+    return make_template_fragment_key(NOMBRE_FRAGMENTO, [libro.id, libro.version_cache, con_portada])
+
+
+def preparar_tarjetas(libros, con_portada=True):
+    """
+    Precargar las categorías (en una consulta) solo de los libros cuya
+    tarjeta no está en caché; las demás se sirven sin tocar la base de datos.
+    """
+    from .models import Categoria
+
+    libros = list(libros)
+    if not libros:
+        return libros
+    claves = {clave_tarjeta(libro, con_portada): libro for libro in libros}
+    presentes = _cache_fragmentos().get_many(list(claves))
+    faltantes = [libro for clave, libro in claves.items() if clave not in presentes]
+    if faltantes:
+        prefetch_related_objects(
+            faltantes, Prefetch('categorias', queryset=Categoria.objects.only('id', 'nombre'))
+        )
+    return libros
@@ -0,0 +1,51 @@
+# sril/templatetags/portadas_tags.py
+from django import template
+from django.utils.html import format_html
+
+from ..portadas import ANCHOS_PORTADA, SIZES_PORTADA, prefijo_derivados, srcset_portada, url_derivado, url_original
+
+register = template.Library()
+
+
+@register.simple_tag
+def portada_srcset(portada, uso='tarjeta', formato='jpg'):
+    """Uso: <img srcset="{% portada_srcset libro.portada 'tarjeta' 'webp' %}">"""
+    if not portada:
+        return ''
+    return srcset_portada(portada, uso, formato)
+
+
+@register.simple_tag
+def portada_url(portada, uso='tarjeta', formato='jpg'):
+    """URL del derivado del ancho de ``uso``"""
+    if not portada:
+        return ''
+    return url_derivado(portada, ANCHOS_PORTADA[uso], formato)
+
+
+@register.simple_tag
+def portada_picture(portada, uso='tarjeta', alt='', clase='', estilo=''):
+    """<picture> con WebP y respaldo JPEG en varios anchos (o la original si aún no hay derivados)"""
+    if not portada:
+        return ''
+    prefijo = prefijo_derivados(portada)
+    if prefijo is None:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">',
+            url_original(portada), alt, clase, estilo,
+        )
+    return format_html(
+        # display: contents para que el <img> se mida contra el contenedor
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        srcset_portada(portada, uso, 'webp', prefijo),
+        SIZES_PORTADA[uso],
+        url_derivado(portada, ANCHOS_PORTADA[uso], 'jpg', prefijo),
+        srcset_portada(portada, uso, 'jpg', prefijo),
+        SIZES_PORTADA[uso],
+        alt,
+        clase,
+        estilo,
+    )
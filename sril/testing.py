@@ -0,0 +1,41 @@
+# sril/testing.py
+"""
+Ayudas para tests: comprobar que una vista no supera su presupuesto de
+consultas (declarado con ``@presupuesto_consultas``) y, si lo supera, fallar
+con el informe de consultas repetidas y la línea de plantilla que las lanzó.
+"""
+from contextlib import contextmanager
+
+from django.urls import resolve
+
+from .consultas import ATRIBUTO_PRESUPUESTO, RegistroConsultas
+
+
+@contextmanager
+def limite_consultas(maximo, titulo='Bloque'):
+    """
+    ``with limite_consultas(5): ...`` falla con AssertionError si el bloque
+    ejecuta más de ``maximo`` consultas (sin contar los savepoints).
+    """
+    with RegistroConsultas() as registro:
+        yield registro
+    if registro.total_presupuesto > maximo:
+        raise AssertionError(registro.informe(f"{titulo} superó su presupuesto de {maximo}:", todas=True))
+
+
+def comprobar_presupuesto(client, url, maximo=None, **kwargs):
+    """
+    Pedir ``url`` con el cliente de test y fallar si supera su presupuesto:
+    ``maximo`` o, si no se indica, el declarado en la vista.
+    Devuelve la respuesta.
+    """
+    if maximo is None:
+        vista = resolve(url.split('?', 1)[0]).func
+        maximo = getattr(vista, ATRIBUTO_PRESUPUESTO, None)
+        if maximo is None:
+            raise AssertionError(f"La vista de {url} no declara presupuesto de consultas")
+    with limite_consultas(maximo, titulo=f"GET {url}"):
+        response = client.get(url, **kwargs)
+        if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+            response.render()
+    return response
@@ -1,3 +1,376 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+
+from .isbn import normalizar_isbn
+from .models import (
+    CacheMetadatosPdf, Categoria, HistorialLectura, Libro, LibroCategoria, LibroSimilar, Puntuacion, Usuario,
+    VistosUsuario,
+)
+from .pipeline import ETAPAS, ejecutar_pipeline, etapas_pendientes, marcar_etapa
+from .procesamiento_pdf import calcular_huella
+from .paginacion import codificar_cursor, paginar_lista, paginar_por_clave
+from .testing import comprobar_presupuesto
+from .vistos import Vistos, construir_vistos, vistos_usuario
+
+
+@override_settings(CACHE_PAGINAS_ACTIVA=False)
+class PresupuestoConsultasTests(TestCase):
+    """Las vistas públicas no superan el presupuesto declarado con ``@presupuesto_consultas``"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorias = categorias = [Categoria.objects.create(nombre=f"Categoría {n}") for n in range(3)]
+        cls.libros = [
+            Libro.objects.create(titulo=f"Libro {n}", autor=f"Autor {n % 4}", numero_paginas=100 + n)
+            for n in range(12)
+        ]
+        for n, libro in enumerate(cls.libros):
+            LibroCategoria.objects.create(libro=libro, categoria=categorias[n % 3])
+            LibroCategoria.objects.create(libro=libro, categoria=categorias[(n + 1) % 3])
+        cls.libro = cls.libros[0]
+        LibroSimilar.objects.bulk_create([
+            LibroSimilar(libro=cls.libro, similar=similar, score=1 - posicion / 10)
+            for posicion, similar in enumerate(cls.libros[1:7], start=1)
+        ])
+        cls.usuario = Usuario.objects.create_user('lector@example.com', 'Lector', 'clave-de-prueba')
+        Puntuacion.objects.create(usuario=cls.usuario, libro=cls.libro, puntuacion=5)
+        Puntuacion.objects.create(usuario=cls.usuario, libro=cls.libros[1], puntuacion=4)
+        HistorialLectura.objects.create(usuario=cls.usuario, libro=cls.libros[2])
+
+    def setUp(self):
+        # Los conteos de facetas se cachean entre peticiones y tests
+        cache.clear()
+
+    def urls(self):
+        return [
+            reverse('sril:home'),
+            reverse('sril:lista_libros'),
+            reverse('sril:lista_libros') + f'?categoria={self.categorias[0].id}',
+            reverse('sril:lista_libros') + '?q=Libro',
+            reverse('sril:detalle_libro', args=[self.libro.id]),
+        ]
+
+    def test_anonimo(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = comprobar_presupuesto(self.client, url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_con_sesion(self):
+        self.client.force_login(self.usuario)
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = comprobar_presupuesto(self.client, url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_detalle_con_sesion_omite_similares_vistos(self):
+        self.client.force_login(self.usuario)
+        response = comprobar_presupuesto(self.client, reverse('sril:detalle_libro', args=[self.libro.id]))
+        similares = [libro.id for libro in response.context['libros_similares']]
+        self.assertEqual(similares, [libro.id for libro in self.libros[3:7]])
+
+
+class VistosTests(TestCase):
+    """El conjunto de bits guardado sigue a las puntuaciones y al historial"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.libros = [Libro.objects.create(titulo=f"Libro {n}", autor="Autor") for n in range(3)]
+        cls.usuario = Usuario.objects.create_user('lector@example.com', 'Lector', 'clave-de-prueba')
+
+    def test_serializacion(self):
+        ids = [1, 2, 65535, 65536, 70000, 5 << 16, 123456789]
+        vistos = Vistos.desde_bytes(Vistos.desde_ids(ids).a_bytes())
+        self.assertEqual(list(vistos), ids)
+        vistos.quitar(65536)
+        vistos.quitar(999)
+        self.assertEqual(list(Vistos.desde_bytes(vistos.a_bytes())), [1, 2, 65535, 70000, 5 << 16, 123456789])
+
+    def test_senales_mantienen_el_conjunto(self):
+        libro, otro, _ = self.libros
+        puntuacion = Puntuacion.objects.create(usuario=self.usuario, libro=libro, puntuacion=4)
+        HistorialLectura.objects.create(usuario=self.usuario, libro=libro)
+        HistorialLectura.objects.create(usuario=self.usuario, libro=otro)
+        self.assertEqual(set(vistos_usuario(self.usuario.pk)), {libro.id, otro.id})
+
+        # Sigue visto por el historial
+        puntuacion.delete()
+        self.assertIn(libro.id, vistos_usuario(self.usuario.pk))
+        HistorialLectura.objects.filter(usuario=self.usuario, libro=libro).delete()
+        self.assertEqual(set(vistos_usuario(self.usuario.pk)), {otro.id})
+        self.assertEqual(set(vistos_usuario(self.usuario.pk)), set(construir_vistos(self.usuario.pk)))
+
+    def test_usuario_sin_fila(self):
+        HistorialLectura.objects.create(usuario=self.usuario, libro=self.libros[2])
+        VistosUsuario.objects.filter(usuario=self.usuario).delete()
+        self.assertEqual(set(vistos_usuario(self.usuario.pk)), {self.libros[2].id})
+        # La siguiente escritura vuelve a crear la fila con todo lo visto
+        Puntuacion.objects.create(usuario=self.usuario, libro=self.libros[0], puntuacion=3)
+        bits = VistosUsuario.objects.get(usuario=self.usuario).bits
+        self.assertEqual(set(Vistos.desde_bytes(bits)), {self.libros[0].id, self.libros[2].id})
+
+
+class PaginacionTests(TestCase):
+    """Los cursores vienen de la URL: uno manipulado vuelve a la primera página"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.libros = [Libro.objects.create(titulo=f"Libro {n:02d}", autor="Autor") for n in range(5)]
+
+    def test_cursor_valido(self):
+        libros = Libro.objects.all()
+        pagina = paginar_por_clave(libros, ('titulo', 'id'), 2)
+        self.assertEqual(pagina['objetos'], self.libros[:2])
+        siguiente = paginar_por_clave(libros, ('titulo', 'id'), 2, despues=pagina['siguiente'])
+        self.assertEqual(siguiente['objetos'], self.libros[2:4])
+        anterior = paginar_por_clave(libros, ('titulo', 'id'), 2, antes=siguiente['anterior'])
+        self.assertEqual(anterior['objetos'], self.libros[:2])
+
+    def test_cursor_manipulado(self):
+        libros = Libro.objects.all()
+        forjados = [
+            codificar_cursor(['a', 'b']),
+            codificar_cursor(['a', None]),
+            codificar_cursor([['a'], 1]),
+            codificar_cursor(['a']),
+            codificar_cursor({'titulo': 'a'}),
+            'no-es-base64!',
+        ]
+        for cursor in forjados:
+            with self.subTest(cursor=cursor):
+                for direccion in ('despues', 'antes'):
+                    pagina = paginar_por_clave(libros, ('titulo', 'id'), 2, **{direccion: cursor})
+                    self.assertEqual(pagina['objetos'], self.libros[:2])
+                self.assertEqual(paginar_lista([1, 2, 3], 2, despues=cursor)['objetos'], [1, 2])
+
+    @override_settings(CACHE_PAGINAS_ACTIVA=False)
+    def test_lista_libros_con_cursor_manipulado(self):
+        response = self.client.get(reverse('sril:lista_libros'), {'despues': codificar_cursor(['a', 'b'])})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHE_PAGINAS_ACTIVA=False, BUSQUEDA_MAXIMO_CATALOGO=2, BUSQUEDA_MAXIMO_CONTENIDO=2)
+class BusquedaTruncadaTests(TestCase):
+    """El corte del ranking no reduce el total ni las facetas de la búsqueda"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Historia")
+        for n in range(5):
+            libro = Libro.objects.create(titulo=f"Crónica {n}", autor="Autor")
+            LibroCategoria.objects.create(libro=libro, categoria=cls.categoria)
+
+    def test_total_y_facetas_completos(self):
+        response = self.client.get(reverse('sril:lista_libros'), {'q': 'cronica'})
+        self.assertEqual(response.context['total_resultados'], 5)
+        self.assertEqual(response.context['resultados_mostrados'], 2)
+        facetas = {categoria.id: categoria.total for categoria in response.context['categorias']}
+        self.assertEqual(facetas[self.categoria.id], 5)
+        self.assertContains(response, 'resultados más relevantes de 5')
+
+
+class AgregadosPuntuacionTests(TestCase):
+    """rating_count / rating_sum / rating_avg siguen a las puntuaciones en cada escritura"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.libro = Libro.objects.create(titulo="Libro", autor="Autor")
+        cls.otro = Libro.objects.create(titulo="Otro", autor="Autor")
+        cls.usuarios = [
+            Usuario.objects.create_user(f'lector{n}@example.com', f'Lector {n}', 'clave-de-prueba') for n in range(3)
+        ]
+
+    def comprobar(self, libro, conteo, suma):
+        libro = Libro.objects.get(pk=libro.pk)
+        self.assertEqual(libro.rating_count, conteo)
+        self.assertEqual(libro.rating_sum, Decimal(suma))
+        self.assertEqual(libro.rating_avg, round(Decimal(suma) / conteo, 2) if conteo else 0)
+        # Y coinciden con las filas de Puntuacion
+        reales = Puntuacion.objects.filter(libro=libro).aggregate(conteo=Count('id'), suma=Sum('puntuacion'))
+        self.assertEqual((reales['conteo'], reales['suma'] or 0), (conteo, Decimal(suma)))
+
+    def puntuar(self, usuario, libro, valor):
+        return Puntuacion.objects.create(usuario=usuario, libro=libro, puntuacion=Decimal(valor))
+
+    def test_crear(self):
+        version = self.libro.version_cache
+        self.puntuar(self.usuarios[0], self.libro, '4')
+        self.puntuar(self.usuarios[1], self.libro, '5')
+        self.puntuar(self.usuarios[2], self.libro, '2.5')
+        self.comprobar(self.libro, 3, '11.5')
+        self.assertEqual(Libro.objects.get(pk=self.libro.pk).version_cache, version + 3)
+
+    def test_editar(self):
+        puntuacion = self.puntuar(self.usuarios[0], self.libro, '4')
+        self.puntuar(self.usuarios[1], self.libro, '3')
+        puntuacion.puntuacion = Decimal('1.5')
+        puntuacion.save()
+        self.comprobar(self.libro, 2, '4.5')
+        # Guardar sin cambiar el valor no suma nada
+        puntuacion.save()
+        self.comprobar(self.libro, 2, '4.5')
+
+    def test_cambiar_de_libro(self):
+        puntuacion = self.puntuar(self.usuarios[0], self.libro, '4')
+        puntuacion.libro = self.otro
+        puntuacion.save()
+        self.comprobar(self.libro, 0, '0')
+        self.comprobar(self.otro, 1, '4')
+
+    def test_borrar(self):
+        puntuacion = self.puntuar(self.usuarios[0], self.libro, '4')
+        self.puntuar(self.usuarios[1], self.libro, '2')
+        puntuacion.delete()
+        self.comprobar(self.libro, 1, '2')
+        Puntuacion.objects.filter(libro=self.libro).delete()
+        self.comprobar(self.libro, 0, '0')
+
+    def test_guardar_libro_cargado_antes(self):
+        # Una instancia cargada antes de puntuar no pisa los agregados al guardarse
+        obsoleto = Libro.objects.get(pk=self.libro.pk)
+        self.puntuar(self.usuarios[0], self.libro, '5')
+        self.puntuar(self.usuarios[1], self.libro, '3')
+        obsoleto.titulo = "Libro renombrado"
+        obsoleto.save()
+        self.comprobar(self.libro, 2, '8')
+
+    def test_borrar_usuario_en_cascada(self):
+        self.puntuar(self.usuarios[0], self.libro, '5')
+        self.puntuar(self.usuarios[0], self.otro, '1')
+        self.puntuar(self.usuarios[1], self.libro, '3')
+        self.usuarios[0].delete()
+        self.comprobar(self.libro, 1, '3')
+        self.comprobar(self.otro, 0, '0')
+
+
+class IsbnTests(TestCase):
+    """Normalización a ISBN-13, de la que dependen la búsqueda por ISBN y los duplicados"""
+
+    def test_normalizar(self):
+        casos = {
+            '978-84-376-0494-7': '9788437604947',
+            '84-376-0494-X': '9788437604947',
+            '843760494x': '9788437604947',
+            '0-306-40615-2': '9780306406157',
+            '978 0 306 40615 7': '9780306406157',
+            'ISBN: 0306406152': '9780306406157',
+            '9780306406157': '9780306406157',
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(normalizar_isbn(texto), esperado)
+
+    def test_no_validos(self):
+        for texto in ('9780306406158', '0306406153', '8437604947', '9770306406157', '030640615', 'abc', '', None):
+            with self.subTest(texto=texto):
+                self.assertIsNone(normalizar_isbn(texto))
+
+    def test_guardar_rellena_isbn13(self):
+        libro = Libro.objects.create(titulo="Libro", autor="Autor", isbn='84-376-0494-X')
+        self.assertEqual(libro.isbn13, '9788437604947')
+
+    @override_settings(CACHE_PAGINAS_ACTIVA=False)
+    def test_busqueda_por_isbn_en_otra_forma(self):
+        libro = Libro.objects.create(titulo="Cien años", autor="Autor", isbn='978-84-376-0494-7')
+        Libro.objects.create(titulo="Otro", autor="Autor")
+        response = self.client.get(reverse('sril:lista_libros'), {'q': '843760494X'})
+        self.assertEqual([tarjeta.id for tarjeta in response.context['libros']], [libro.id])
+
+    def test_comando_normalizar_isbn(self):
+        valido = Libro.objects.create(titulo="Válido", autor="Autor", isbn='0-306-40615-2')
+        duplicado = Libro.objects.create(titulo="Duplicado", autor="Autor")
+        invalido = Libro.objects.create(titulo="Inválido", autor="Autor", isbn='0306406153')
+        # Como antes de existir la columna, con el mismo ISBN escrito de dos formas
+        Libro.objects.filter(id=duplicado.id).update(isbn='9780306406157')
+        Libro.objects.update(isbn13=None)
+
+        salida = StringIO()
+        call_command('normalizar_isbn', stdout=salida)
+        isbn13 = dict(Libro.objects.values_list('id', 'isbn13'))
+        self.assertEqual(isbn13[valido.id], '9780306406157')
+        self.assertIsNone(isbn13[duplicado.id])
+        self.assertIsNone(isbn13[invalido.id])
+        self.assertIn('ISBN normalizados: 1 | no válidos: 1 | duplicados: 1', salida.getvalue())
+
+
+class PipelineTests(TestCase):
+    """Marcas de etapa por versión del PDF y reutilización de CacheMetadatosPdf por huella"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def guardar_archivo(self, nombre, contenido):
+        ruta = os.path.join(self.media, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        return ruta
+
+    def test_marcas_por_version(self):
+        libro = Libro(titulo="Libro", autor="Autor")
+        self.assertEqual(etapas_pendientes(libro), [])
+
+        libro.archivo_pdf.name = 'libros/pdfs/a.pdf'
+        self.assertEqual(etapas_pendientes(libro), ETAPAS)
+        libro.huella_pdf = 'a' * 64
+        for etapa in ETAPAS:
+            marcar_etapa(libro, etapa)
+        libro.portada.name = 'libros/portadas/a.jpg'
+        self.assertEqual(etapas_pendientes(libro), [])
+
+        # Sin portada se vuelve a generar
+        libro.portada.name = ''
+        self.assertEqual(etapas_pendientes(libro), ['portada'])
+        libro.portada.name = 'libros/portadas/a.jpg'
+
+        # Otra huella invalida todo menos la huella; otro archivo también la huella
+        libro.huella_pdf = 'b' * 64
+        self.assertEqual(etapas_pendientes(libro), ['metadatos', 'portada', 'texto'])
+        libro.archivo_pdf.name = 'libros/pdfs/b.pdf'
+        self.assertEqual(etapas_pendientes(libro), ETAPAS)
+
+    def test_reutiliza_cache_por_huella(self):
+        ruta = self.guardar_archivo('libros/pdfs/gemelo.pdf', b'%PDF-1.4 contenido de prueba')
+        huella = calcular_huella(ruta)
+        imagen = BytesIO()
+        Image.new('RGB', (300, 450), 'navy').save(imagen, 'JPEG')
+        nombre_portada = f"{CacheMetadatosPdf.DIRECTORIO_PORTADAS}{huella}.jpg"
+        self.guardar_archivo(nombre_portada, imagen.getvalue())
+        CacheMetadatosPdf.objects.create(
+            huella=huella, numero_paginas=321, tiempo_lectura_promedio=654, portada=nombre_portada
+        )
+
+        libro = Libro.objects.create(titulo="Gemelo", autor="Autor", archivo_pdf='libros/pdfs/gemelo.pdf')
+        self.assertEqual(libro.estado_procesamiento, 'PENDIENTE')
+        # El texto ya está indexado: solo faltan metadatos y portada
+        libro.huella_pdf = huella
+        marcar_etapa(libro, 'huella')
+        marcar_etapa(libro, 'texto')
+        libro.save(update_fields=['huella_pdf', 'etapas_completadas'])
+
+        # Con la caché no hace falta abrir el PDF
+        with mock.patch.object(Libro, 'sondear_pdf', side_effect=AssertionError("no debería leer el PDF")):
+            self.assertTrue(ejecutar_pipeline(libro))
+
+        libro.refresh_from_db()
+        self.assertEqual((libro.numero_paginas, libro.tiempo_lectura_promedio), (321, 654))
+        self.assertEqual(libro.portada.name, nombre_portada)
+        self.assertEqual(libro.estado_procesamiento, 'COMPLETADO')
+        self.assertEqual(etapas_pendientes(libro), [])
+        self.assertEqual(CacheMetadatosPdf.objects.count(), 1)
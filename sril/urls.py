@@ -8,6 +8,7 @@ app_name = 'sril'
 urlpatterns = [
     path('', views.home, name='home'),
     path('libros/', views.lista_libros, name='lista_libros'),
+    path('libros/autocompletar/', views.autocompletar, name='autocompletar'),
     path('libros/<int:libro_id>/', views.detalle_libro, name='detalle_libro'),
     path('libros/<int:libro_id>/puntuar/', views.puntuar_libro, name='puntuar_libro'),
     path('libros/<int:libro_id>/historial/', views.gestionar_historial, name='gestionar_historial'),
@@ -0,0 +1,496 @@
+# sril/vectores.py
+"""
+Vectores de contenido de los libros e índice de similitud en disco.
+
+Cada libro se representa con:
+  - TF-IDF de ``titulo`` y ``sinopsis`` (el título cuenta doble), reducido a
+    ``VECTORES_DIMENSIONES`` con SVD truncada, y
+  - la pertenencia a cada categoría (one-hot),
+cada parte normalizada y ponderada con ``PESO_TEXTO`` / ``PESO_CATEGORIAS``
+y el vector final con norma L2 = 1: el producto escalar es el coseno.
+
+No depende de las puntuaciones, así que sirve para libros nuevos.
+
+La matriz float32 vive en ``INDICE_VECTORES_DIR`` y cada proceso la abre con
+``numpy.memmap`` en solo lectura: el sistema operativo comparte las páginas
+entre el servidor y los workers, nadie la copia en su memoria. ``meta.json``
+indica qué generación de ficheros está vigente y cuántas filas tiene; los
+lectores lo comprueban (un ``stat``) en cada consulta y reabren si cambió.
+
+- ``manage.py reconstruir_vectores`` recalcula vocabulario, SVD y matriz en
+  una generación nueva y la publica reemplazando ``meta.json``.
+- ``actualizar_vectores`` recalcula solo los libros indicados con el
+  vocabulario y la proyección vigentes. Escribe su fila en sitio (los
+  lectores la ven al momento) o la añade al final; si no queda hueco crea
+  una generación con el doble de capacidad. Los términos nuevos no cuentan
+  hasta la siguiente reconstrucción.
+- Al crear, editar o borrar un libro las señales solo lo marcan en
+  ``VectorPendiente``; el worker (``manage.py procesar_tareas``) llama a
+  ``procesar_pendientes``. Las peticiones no cargan numpy ni scipy.
+
+Requiere numpy y scipy (solo se importan al usarlo).
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+
+PESO_TEXTO = 0.6
+PESO_CATEGORIAS = 0.4
+# Términos presentes en menos documentos, o en más de esta fracción, no cuentan
+DOCUMENTOS_MINIMOS = 2
+FRACCION_MAXIMA = 0.5
+
+_PALABRA = re.compile(r'[a-z0-9ñ]{3,}')
+
+
+def _ajuste(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _directorio():
+    return str(_ajuste('INDICE_VECTORES_DIR', os.path.join(settings.BASE_DIR, 'indices', 'vectores')))
+
+
+def _ruta(nombre):
+    return os.path.join(_directorio(), nombre)
+
+
+def terminos(texto):
+    """Palabras de 3 o más letras, en minúsculas y sin tildes (la ñ se conserva)"""
+    texto = (texto or '').lower().replace('ñ', '\0')
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _PALABRA.findall(texto.replace('\0', 'ñ'))
+
+
+def _documento(titulo, sinopsis):
+    return Counter(terminos(titulo) * 2 + terminos(sinopsis))
+
+
+def _datos_libros(libro_ids=None):
+    """``{libro_id: (Counter de términos, [categoria_id])}`` de los libros activos"""
+    from .models import Libro, LibroCategoria
+
+    libros = Libro.objects.filter(activo=True)
+    relaciones = LibroCategoria.objects.filter(libro__activo=True)
+    if libro_ids is not None:
+        libros = libros.filter(pk__in=libro_ids)
+        relaciones = relaciones.filter(libro_id__in=libro_ids)
+    datos = {
+        libro_id: (_documento(titulo, sinopsis), [])
+        for libro_id, titulo, sinopsis in libros.values_list('id', 'titulo', 'sinopsis').iterator()
+    }
+    for libro_id, categoria_id in relaciones.values_list('libro_id', 'categoria_id').iterator():
+        if libro_id in datos:
+            datos[libro_id][1].append(categoria_id)
+    return datos
+
+
+# Vectorización
+
+def _tfidf(datos, vocabulario, idf):
+    """Matriz dispersa TF-IDF (tf logarítmico) con filas de norma 1"""
+    import numpy as np
+    from scipy import sparse
+
+    filas, columnas, valores = [], [], []
+    for fila, (documento, _) in enumerate(datos.values()):
+        for termino, frecuencia in documento.items():
+            columna = vocabulario.get(termino)
+            if columna is not None:
+                filas.append(fila)
+                columnas.append(columna)
+                valores.append((1 + math.log(frecuencia)) * idf[columna])
+    tfidf = sparse.csr_matrix((valores, (filas, columnas)), shape=(len(datos), len(vocabulario)), dtype=np.float64)
+    normas = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    return (sparse.diags(np.divide(1.0, normas, out=np.zeros_like(normas), where=normas > 0)) @ tfidf).tocsr()
+
+
+def _vectores(datos, modelo):
+    """Matriz float32 (libros × dimensiones) normalizada, en el orden de ``datos``"""
+    import numpy as np
+
+    columnas_categoria = modelo['categorias']
+    tfidf = _tfidf(datos, modelo['vocabulario'], modelo['idf'])
+    texto = np.asarray(tfidf @ modelo['componentes'])
+    categorias = np.zeros((len(datos), len(columnas_categoria)))
+    for fila, (_, categoria_ids) in enumerate(datos.values()):
+        for categoria_id in categoria_ids:
+            columna = columnas_categoria.get(categoria_id)
+            if columna is not None:
+                categorias[fila, columna] = 1.0
+
+    partes = []
+    for parte, peso in ((texto, PESO_TEXTO), (categorias, PESO_CATEGORIAS)):
+        normas = np.linalg.norm(parte, axis=1, keepdims=True)
+        # Con la raíz del peso en cada parte, el coseno es la suma ponderada de los cosenos
+        partes.append(np.divide(parte, normas, out=np.zeros_like(parte), where=normas > 0) * math.sqrt(peso))
+    vectores = np.hstack(partes)
+    normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+    return np.divide(vectores, normas, out=np.zeros_like(vectores), where=normas > 0).astype(np.float32)
+
+
+def _entrenar(datos):
+    """Vocabulario, IDF y proyección SVD a partir de todo el catálogo"""
+    import numpy as np
+    from scipy.sparse.linalg import svds
+    from .models import Categoria
+
+    total = max(1, len(datos))
+    frecuencias = Counter()
+    for documento, _ in datos.values():
+        frecuencias.update(documento.keys())
+    validos = [
+        termino for termino, df in frecuencias.items()
+        if df >= DOCUMENTOS_MINIMOS and df <= FRACCION_MAXIMA * total
+    ]
+    validos.sort(key=lambda termino: (-frecuencias[termino], termino))
+    validos = sorted(validos[:_ajuste('VECTORES_TERMINOS', 20000)])
+    vocabulario = {termino: columna for columna, termino in enumerate(validos)}
+    idf = np.array([math.log(total / frecuencias[termino]) + 1 for termino in validos])
+
+    modelo = {
+        'vocabulario': vocabulario,
+        'idf': idf,
+        'categorias': {
+            categoria_id: columna
+            for columna, categoria_id in enumerate(Categoria.objects.order_by('pk').values_list('pk', flat=True))
+        },
+        'componentes': np.zeros((len(vocabulario), 0)),
+    }
+    dimensiones = min(_ajuste('VECTORES_DIMENSIONES', 128), len(vocabulario) - 1, len(datos) - 1)
+    if dimensiones > 0:
+        _, _, vt = svds(_tfidf(datos, vocabulario, idf), k=dimensiones, random_state=0)
+        modelo['componentes'] = vt.T
+    return modelo
+
+
+# Ficheros del índice
+
+def _leer_meta():
+    try:
+        with open(_ruta('meta.json'), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def _publicar_meta(meta):
+    temporal = _ruta('meta.json.tmp')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(meta, archivo)
+    os.replace(temporal, _ruta('meta.json'))
+
+
+def _nombres(generacion):
+    return {
+        'vectores': f'vectores-{generacion}.f32',
+        'ids': f'ids-{generacion}.i64',
+        'modelo': f'modelo-{generacion}.npz',
+    }
+
+
+@contextmanager
+def _candado():
+    """Un solo escritor a la vez entre todos los procesos"""
+    os.makedirs(_directorio(), exist_ok=True)
+    with open(_ruta('escritura.lock'), 'w') as archivo:
+        if os.name == 'nt':  # Windows
+            import msvcrt
+
+            # LK_LOCK reintenta durante un segundo y luego falla: se insiste
+            while True:
+                try:
+                    msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def _guardar_modelo(ruta, modelo):
+    import numpy as np
+
+    terminos_ordenados = sorted(modelo['vocabulario'], key=modelo['vocabulario'].get)
+    categoria_ids = sorted(modelo['categorias'], key=modelo['categorias'].get)
+    # np.savez añade la extensión si falta: se escribe con un objeto de archivo
+    with open(ruta, 'wb') as archivo:
+        np.savez(
+            archivo, terminos=np.array(terminos_ordenados, dtype=str), idf=modelo['idf'],
+            categorias=np.array(categoria_ids, dtype=np.int64),
+            componentes=np.asarray(modelo['componentes'], dtype=np.float32),
+        )
+
+
+_modelos = {}
+
+
+def _cargar_modelo(ruta):
+    """El modelo de cada generación se lee de disco una sola vez por proceso"""
+    import numpy as np
+
+    if ruta not in _modelos:
+        _modelos.clear()
+        with np.load(ruta) as datos:
+            _modelos[ruta] = {
+                'vocabulario': {str(termino): columna for columna, termino in enumerate(datos['terminos'])},
+                'idf': datos['idf'],
+                'categorias': {int(categoria_id): columna for columna, categoria_id in enumerate(datos['categorias'])},
+                'componentes': datos['componentes'],
+            }
+    return _modelos[ruta]
+
+
+def _crear_generacion(meta_anterior, vectores, ids, capacidad, modelo=None):
+    """Escribir una generación nueva de ficheros y publicarla"""
+    import numpy as np
+
+    generacion = (meta_anterior or {}).get('generacion', 0) + 1
+    nombres = _nombres(generacion)
+    dimensiones = vectores.shape[1]
+
+    matriz = np.memmap(_ruta(nombres['vectores']), dtype=np.float32, mode='w+', shape=(capacidad, dimensiones))
+    matriz[:len(vectores)] = vectores
+    matriz.flush()
+    ids_disco = np.memmap(_ruta(nombres['ids']), dtype=np.int64, mode='w+', shape=(capacidad,))
+    ids_disco[:len(ids)] = ids
+    ids_disco.flush()
+    del matriz, ids_disco
+
+    if modelo is not None:
+        _guardar_modelo(_ruta(nombres['modelo']), modelo)
+    else:
+        os.link(_ruta(_nombres(meta_anterior['generacion'])['modelo']), _ruta(nombres['modelo']))
+
+    _publicar_meta({
+        'generacion': generacion,
+        'filas': len(ids),
+        'capacidad': capacidad,
+        'dimensiones': dimensiones,
+    })
+    # Los procesos que aún tengan abierta la generación anterior la siguen leyendo hasta reabrir
+    if meta_anterior:
+        for nombre in _nombres(meta_anterior['generacion']).values():
+            try:
+                os.remove(_ruta(nombre))
+            except FileNotFoundError:
+                pass
+
+
+def reconstruir_vectores():
+    """Recalcular vocabulario, proyección y vectores de todo el catálogo; devuelve el número de libros"""
+    import numpy as np
+
+    datos = _datos_libros()
+    modelo = _entrenar(datos)
+    vectores = _vectores(datos, modelo)
+    ids = np.fromiter(datos.keys(), dtype=np.int64, count=len(datos))
+    with _candado():
+        _crear_generacion(_leer_meta(), vectores, ids, max(1024, int(len(ids) * 1.25)), modelo)
+    return len(ids)
+
+
+def actualizar_vectores(libro_ids):
+    """
+    Recalcular los vectores de ``libro_ids`` con el modelo vigente. Los libros
+    inactivos o borrados se quedan con el vector a cero (no aparecen en
+    ninguna búsqueda). Devuelve False si aún no hay índice.
+    """
+    if _leer_meta() is None:
+        return False
+    import numpy as np
+
+    libro_ids = set(libro_ids)
+    datos = _datos_libros(libro_ids)
+    with _candado():
+        meta = _leer_meta()
+        if meta is None:
+            return False
+        nombres = _nombres(meta['generacion'])
+        modelo = _cargar_modelo(_ruta(nombres['modelo']))
+        vectores = _vectores(datos, modelo) if datos else np.zeros((0, meta['dimensiones']), dtype=np.float32)
+        nuevos = dict(zip(datos.keys(), vectores))
+
+        forma = (meta['capacidad'], meta['dimensiones'])
+        matriz = np.memmap(_ruta(nombres['vectores']), dtype=np.float32, mode='r+', shape=forma)
+        ids = np.memmap(_ruta(nombres['ids']), dtype=np.int64, mode='r+', shape=(meta['capacidad'],))
+        filas = meta['filas']
+        posiciones = {int(ids[fila]): fila for fila in np.flatnonzero(np.isin(ids[:filas], list(libro_ids)))}
+
+        agregar = []
+        for libro_id in libro_ids:
+            vector = nuevos.get(libro_id)
+            if libro_id in posiciones:
+                matriz[posiciones[libro_id]] = vector if vector is not None else 0
+            elif vector is not None:
+                agregar.append((libro_id, vector))
+
+        if filas + len(agregar) <= meta['capacidad']:
+            for desplazamiento, (libro_id, vector) in enumerate(agregar):
+                matriz[filas + desplazamiento] = vector
+                ids[filas + desplazamiento] = libro_id
+            matriz.flush()
+            ids.flush()
+            if agregar:
+                _publicar_meta({**meta, 'filas': filas + len(agregar)})
+        else:
+            completa = np.vstack([np.asarray(matriz[:filas])] + [vector[None, :] for _, vector in agregar])
+            todos = np.concatenate([np.asarray(ids[:filas]), np.array([libro_id for libro_id, _ in agregar], dtype=np.int64)])
+            del matriz, ids
+            _crear_generacion(meta, completa, todos, len(todos) * 2)
+    return True
+
+
+# Lectura
+
+class IndiceVectores:
+    """Vista de solo lectura del índice, compartida por los hilos de un proceso"""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._marca = None
+        self._matriz = None
+        self._ids = None
+        self._filas = {}
+
+    def _abrir(self):
+        with self._bloqueo:
+            for _ in range(3):
+                try:
+                    marca = os.stat(_ruta('meta.json')).st_mtime_ns
+                except FileNotFoundError:
+                    return None
+                if marca == self._marca:
+                    break
+                try:
+                    self._cargar(marca)
+                    break
+                except FileNotFoundError:
+                    # Otra escritura publicó una generación nueva y borró la que
+                    # acabamos de leer en meta.json: se vuelve a leer
+                    continue
+            if self._matriz is None:
+                return None
+            # Si no se pudo reabrir se sigue con la vista anterior: sus archivos
+            # borrados siguen mapeados hasta cerrarla
+            return self._matriz, self._ids, self._filas
+
+    def _cargar(self, marca):
+        import numpy as np
+
+        meta = _leer_meta()
+        if meta is None:
+            raise FileNotFoundError(_ruta('meta.json'))
+        nombres = _nombres(meta['generacion'])
+        matriz = np.memmap(_ruta(nombres['vectores']), dtype=np.float32, mode='r',
+                           shape=(meta['capacidad'], meta['dimensiones']))
+        ids = np.memmap(_ruta(nombres['ids']), dtype=np.int64, mode='r', shape=(meta['capacidad'],))
+        self._matriz, self._ids = matriz[:meta['filas']], ids[:meta['filas']]
+        self._filas = {int(libro_id): fila for fila, libro_id in enumerate(self._ids)}
+        self._marca = marca
+
+    def similares(self, libro_id, k=10):
+        """``[(libro_id, coseno)]`` de los ``k`` libros más parecidos a ``libro_id``"""
+        abierto = self._abrir()
+        if abierto is None or libro_id not in abierto[2]:
+            return []
+        matriz, ids, filas = abierto
+        return self.similares_a(matriz[filas[libro_id]], k, excluir=(libro_id,))
+
+    def similares_a(self, vector, k=10, excluir=()):
+        """``[(libro_id, coseno)]`` de los ``k`` libros más parecidos a ``vector``"""
+        import numpy as np
+
+        abierto = self._abrir()
+        if abierto is None or not len(abierto[1]):
+            return []
+        matriz, ids, _ = abierto
+        puntuaciones = matriz @ np.asarray(vector, dtype=np.float32)
+        if excluir:
+            puntuaciones[np.isin(ids, list(excluir))] = -np.inf
+        k = min(k, len(puntuaciones))
+        mejores = np.argpartition(-puntuaciones, k - 1)[:k]
+        mejores = mejores[np.argsort(-puntuaciones[mejores], kind='stable')]
+        return [(int(ids[fila]), float(puntuaciones[fila])) for fila in mejores if puntuaciones[fila] > 0]
+
+    def vector(self, libro_id):
+        abierto = self._abrir()
+        if abierto is None or libro_id not in abierto[2]:
+            return None
+        return abierto[0][abierto[2][libro_id]]
+
+
+indice = IndiceVectores()
+
+
+def marcar_pendiente(*libro_ids):
+    """Marcar (o volver a marcar) libros cuyo vector hay que recalcular"""
+    from django.utils import timezone
+    from .models import VectorPendiente
+
+    ahora = timezone.now()
+    VectorPendiente.objects.bulk_create(
+        [VectorPendiente(libro_id=libro_id, fecha_cambio=ahora) for libro_id in set(libro_ids)],
+        update_conflicts=True, unique_fields=['libro_id'], update_fields=['fecha_cambio'],
+    )
+
+
+def procesar_pendientes(limite=500):
+    """Recalcular los vectores de hasta ``limite`` libros marcados; devuelve cuántos"""
+    from django.db.models import Q
+    from .models import VectorPendiente
+
+    pendientes = list(
+        VectorPendiente.objects.order_by('fecha_cambio').values_list('libro_id', 'fecha_cambio')[:limite]
+    )
+    if not pendientes:
+        return 0
+
+    # Sin índice todavía no hay nada que actualizar: lo creará reconstruir_vectores
+    actualizar_vectores([libro_id for libro_id, _ in pendientes])
+    # Solo se quitan las marcas que no cambiaron durante el cálculo
+    for inicio in range(0, len(pendientes), 300):
+        VectorPendiente.objects.filter(reduce(or_, (
+            Q(libro_id=libro_id, fecha_cambio=fecha_cambio)
+            for libro_id, fecha_cambio in pendientes[inicio:inicio + 300]
+        ))).delete()
+    return len(pendientes)
+
+
+# Cambios acumulados en la transacción en curso (como en sril/similares.py)
+_pendientes = threading.local()
+
+
+def programar_actualizacion(*libro_ids):
+    from django.db import transaction
+
+    if not hasattr(_pendientes, 'ids'):
+        _pendientes.ids = set()
+    _pendientes.ids.update(libro_id for libro_id in libro_ids if libro_id is not None)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def _procesar_pendientes():
+    ids, _pendientes.ids = getattr(_pendientes, 'ids', set()), set()
+    if ids:
+        marcar_pendiente(*ids)
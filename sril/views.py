@@ -2,19 +2,40 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count
-from .models import Usuario, Libro, Categoria, Puntuacion, PreferenciaUsuario, HistorialLectura
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Substr
+from .models import Usuario, Libro, LibroSimilar, Categoria, Puntuacion, PreferenciaUsuario, HistorialLectura
 from .forms import PuntuacionForm, PreferenciaUsuarioForm, HistorialLecturaForm
+from .busqueda import buscar_libros, filtro_coincidencias, fragmentos_contenido
+from .isbn import normalizar_isbn
+from .paginacion import paginar_por_clave, paginar_lista
+from .facetas import (
+    MODOS, leer_categorias, filtrar_por_categorias, contar_por_categoria, conteos_catalogo, facetas_categorias
+)
+from .autocompletado import obtener_indice
+from .consultas import presupuesto_consultas
+from .tarjetas import preparar_tarjetas
+from .cache_paginas import cache_pagina_anonima, etiquetar_pagina
+from .recomendaciones import leer_recomendaciones
+from .similares import vecinos_por_libro
+from .vistos import vistos_usuario
 
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.decorators import login_required
 from .forms import LoginForm, RegistroForm
 
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, JsonResponse
 from django.utils.text import slugify
 import os
 
+# Columnas que necesita la tarjeta de libro del listado
+CAMPOS_TARJETA = (
+    'id', 'titulo', 'autor', 'portada', 'numero_paginas', 'tiempo_lectura_promedio', 'rating_avg', 'version_cache'
+)
+OPCIONES_POR_PAGINA = (12, 24, 48, 96)
+
 # Vistas de autenticación
 def registro_view(request):
     """Vista para registro de nuevos usuarios"""
@@ -62,82 +83,189 @@ def get_usuario_actual(request):
             return None
     return None
 
+@presupuesto_consultas(6)
+@cache_pagina_anonima('catalogo')
 def home(request):
     """Página principal con libros destacados"""
-    libros_destacados = Libro.objects.annotate(
-        avg_rating=Avg('puntuaciones__puntuacion'),
-        num_ratings=Count('puntuaciones')
-    ).filter(activo=True).order_by('-avg_rating')[:8]
+    libros_destacados = preparar_tarjetas(
+        Libro.objects.filter(activo=True).only(*CAMPOS_TARJETA).order_by('-rating_avg')[:8],
+        con_portada=False
+    )
     
     context = {
         'libros_destacados': libros_destacados,
     }
     return render(request, 'sril/home.html', context)
 
+@presupuesto_consultas(14)
+@cache_pagina_anonima('catalogo', 'categorias')
 def lista_libros(request):
-    """Lista todos los libros con filtros"""
-    libros = Libro.objects.filter(activo=True)
+    """
+    Lista paginada de libros con filtros. Sin búsqueda se pagina por clave
+    (titulo, id); con búsqueda, por posición en el ranking FTS5.
+    Se puede filtrar por varias categorías (``modo`` alguna/todas) y cada
+    categoría muestra cuántos libros del resultado tiene.
+    """
+    # Las categorías las precarga preparar_tarjetas solo para las tarjetas sin caché
+    libros = Libro.objects.filter(activo=True).only(*CAMPOS_TARJETA).annotate(
+        # Solo el comienzo de la sinopsis: la tarjeta muestra 20 palabras
+        sinopsis_corta=Substr('sinopsis', 1, 300)
+    )
     
     # Filtros
-    categoria_id = request.GET.get('categoria')
-    if categoria_id:
-        libros = libros.filter(categorias__id=categoria_id)
+    categoria_ids = leer_categorias(request.GET.getlist('categoria'))
+    modo = request.GET.get('modo')
+    if modo not in MODOS:
+        modo = MODOS[0]
     
-    query = request.GET.get('q')
+    try:
+        por_pagina = int(request.GET.get('por_pagina', settings.LIBROS_POR_PAGINA))
+    except ValueError:
+        por_pagina = settings.LIBROS_POR_PAGINA
+    if por_pagina not in OPCIONES_POR_PAGINA:
+        por_pagina = settings.LIBROS_POR_PAGINA
+    
+    despues, antes = request.GET.get('despues'), request.GET.get('antes')
+    query = (request.GET.get('q') or '').strip()
+    ranking = None
+    # Todas las coincidencias de la búsqueda, sin el corte del ranking
+    coincidencias = None
+    total_resultados = None
     if query:
-        libros = libros.filter(
-            Q(titulo__icontains=query) |
-            Q(autor__icontains=query) |
-            Q(isbn__icontains=query)
-        )
-    
-    categorias = Categoria.objects.all()
+        # Un ISBN (con o sin guiones, ISBN-10 o ISBN-13) se resuelve con una
+        # consulta por el índice único de isbn13, sin pasar por el texto completo
+        isbn13 = normalizar_isbn(query)
+        if isbn13:
+            ranking = list(libros.filter(isbn13=isbn13).values_list('id', flat=True)) or None
+        if ranking is None:
+            ranking = buscar_libros(query)
+            if ranking is not None:
+                # Búsqueda FTS5: resultados por relevancia (BM25), con el ISBN exacto primero
+                ranking = list(libros.filter(isbn=query).values_list('id', flat=True)) + ranking
+                coincidencias = filtro_coincidencias(query) | Q(isbn=query)
+    
+    if ranking is not None:
+        encontrados = libros.filter(coincidencias if coincidencias is not None else Q(id__in=ranking))
+        filtrados = filtrar_por_categorias(encontrados, categoria_ids, modo)
+        validos = set(filtrados.filter(id__in=ranking).values_list('id', flat=True))
+        ordenados = list(dict.fromkeys(libro_id for libro_id in ranking if libro_id in validos))
+        # El total y las facetas cuentan todas las coincidencias, no solo las
+        # que entraron en el ranking (BUSQUEDA_MAXIMO_*)
+        conteos = contar_por_categoria(_base_facetas(encontrados, filtrados, modo))
+        total_resultados = filtrados.count() if coincidencias is not None else len(ordenados)
+        pagina = paginar_lista(ordenados, por_pagina, despues=despues, antes=antes)
+        por_id = libros.in_bulk(pagina['objetos'])
+        pagina['objetos'] = [por_id[libro_id] for libro_id in pagina['objetos'] if libro_id in por_id]
+        
+        fragmentos = fragmentos_contenido(query, [libro.id for libro in pagina['objetos']])
+        for libro in pagina['objetos']:
+            libro.fragmento = fragmentos.get(libro.id)
+    else:
+        if query:
+            # Sin FTS5 (otros motores de base de datos)
+            libros = libros.filter(
+                Q(titulo__icontains=query) |
+                Q(autor__icontains=query) |
+                Q(isbn__icontains=query)
+            )
+        filtrados = filtrar_por_categorias(libros, categoria_ids, modo)
+        if not query and (modo == 'alguna' or not categoria_ids):
+            # Las facetas son las del catálogo completo
+            conteos = conteos_catalogo()
+        else:
+            conteos = contar_por_categoria(_base_facetas(libros, filtrados, modo))
+        pagina = paginar_por_clave(filtrados, ('titulo', 'id'), por_pagina, despues=despues, antes=antes)
     
     context = {
-        'libros': libros,
-        'categorias': categorias,
+        'libros': preparar_tarjetas(pagina['objetos']),
+        'categorias': facetas_categorias(conteos, categoria_ids),
+        'modo': modo,
+        'por_pagina': por_pagina,
+        'opciones_por_pagina': OPCIONES_POR_PAGINA,
+        'url_siguiente': _url_cursor(request, 'despues', pagina['siguiente']),
+        'url_anterior': _url_cursor(request, 'antes', pagina['anterior']),
+        'total_resultados': total_resultados,
+        'resultados_mostrados': len(ordenados) if ranking is not None else None,
     }
     return render(request, 'sril/libros/lista_libros.html', context)
 
+def _base_facetas(sin_filtro, filtrados, modo):
+    """
+    Con ``alguna`` (OR) las facetas cuentan sobre el resultado sin el filtro de
+    categorías, para que marcar otra categoría muestre cuánto añade; con
+    ``todas`` (AND) cuentan sobre el resultado ya filtrado.
+    """
+    return sin_filtro if modo == 'alguna' else filtrados
+
+def _url_cursor(request, parametro, cursor):
+    """Query string de la página vecina conservando los filtros actuales"""
+    if not cursor:
+        return None
+    parametros = request.GET.copy()
+    parametros.pop('despues', None)
+    parametros.pop('antes', None)
+    parametros[parametro] = cursor
+    return f"?{parametros.urlencode()}"
+
+def autocompletar(request):
+    """Sugerencias de título/autor para el buscador, desde el índice en memoria"""
+    try:
+        limite = min(max(int(request.GET.get('limite', 8)), 1), 20)
+    except ValueError:
+        limite = 8
+    sugerencias = obtener_indice().completar(request.GET.get('q', ''), limite)
+    return JsonResponse({'sugerencias': sugerencias})
+
+@presupuesto_consultas(14)
+@cache_pagina_anonima('libro:{libro_id}', 'categorias')
 def detalle_libro(request, libro_id):
     """Detalle de un libro específico"""
-    libro = get_object_or_404(Libro, id=libro_id, activo=True)
+    libro = get_object_or_404(Libro.objects.prefetch_related('categorias'), id=libro_id, activo=True)
     puntuacion_usuario = None
     historial_usuario = None
-    
     usuario_actual = get_usuario_actual(request)
-    if usuario_actual:
-        puntuacion_usuario = Puntuacion.objects.filter(
-            usuario=usuario_actual, 
-            libro=libro
-        ).first()
-        
-        historial_usuario = HistorialLectura.objects.filter(
-            usuario=usuario_actual,
-            libro=libro
-        ).first()
     
     # Puntuaciones recientes
     puntuaciones_recientes = libro.puntuaciones.select_related('usuario').order_by('-fecha_puntuacion')[:5]
     
-    # Libros similares (misma categoría)
-    libros_similares = Libro.objects.filter(
-        categorias__in=libro.categorias.all(),
-        activo=True
-    ).exclude(
-        id=libro.id
-    ).distinct().annotate(
-        avg_rating=Avg('puntuaciones__puntuacion'),
-        num_ratings=Count('puntuaciones')
-    ).order_by('-avg_rating')[:4]
+    # Libros similares precalculados (sril/similares.py): una lectura por índice.
+    # Con sesión se lee la lista entera para poder quitar los ya vistos
+    leidos = vecinos_por_libro() if usuario_actual else 4
+    libros_similares = [
+        fila.similar for fila in LibroSimilar.objects.filter(
+            libro_id=libro.id, similar__activo=True
+        ).select_related('similar').only(
+            'score', 'similar', *(f'similar__{campo}' for campo in CAMPOS_TARJETA)
+        ).order_by('-score')[:leidos]
+    ]
+    if not libros_similares:
+        # Libro aún sin vecinos calculados: misma categoría, por rating
+        libros_similares = list(Libro.objects.filter(
+            categorias__in=libro.categorias.all(),
+            activo=True
+        ).exclude(
+            id=libro.id
+        ).distinct().only(*CAMPOS_TARJETA).order_by('-rating_avg')[:leidos])
+    
+    if usuario_actual:
+        # Conjunto de bits de lo ya puntuado o leído (sril/vistos.py): una
+        # consulta por clave primaria filtra los similares, y la puntuación
+        # y el historial de este libro solo se buscan si lo ha visto
+        vistos = vistos_usuario(usuario_actual.pk)
+        if libro.id in vistos:
+            puntuacion_usuario = Puntuacion.objects.filter(usuario=usuario_actual, libro=libro).first()
+            historial_usuario = HistorialLectura.objects.filter(usuario=usuario_actual, libro=libro).first()
+        libros_similares = [similar for similar in libros_similares if similar.id not in vistos]
+    libros_similares = libros_similares[:4]
     
     context = {
         'libro': libro,
         'puntuacion_usuario': puntuacion_usuario,
         'historial_usuario': historial_usuario,
         'puntuaciones_recientes': puntuaciones_recientes,
-        'libros_similares': libros_similares,
+        'libros_similares': preparar_tarjetas(libros_similares, con_portada=False),
     }
+    etiquetar_pagina(request, *(f'libro:{similar.id}' for similar in context['libros_similares']))
     return render(request, 'sril/libros/detalle_libro.html', context)
 
 @login_required
@@ -254,41 +382,21 @@ def mis_preferencias(request):
 
 @login_required
 def recomendaciones(request):
-    """Sistema de recomendación basado en preferencias del usuario"""
+    """Recomendaciones por preferencias y por filtrado colaborativo"""
     usuario_actual = get_usuario_actual(request)
     
     if not usuario_actual:
         messages.error(request, 'Error de autenticación')
         return redirect('sril:login')
     
-    # Obtener preferencias del usuario
-    preferencias_usuario = PreferenciaUsuario.objects.filter(
-        usuario=usuario_actual, 
-        nivel_interes__gte=3  # Solo categorías con interés >= 3
-    ).values_list('categoria_id', flat=True)
-    
-    # Libros recomendados basados en preferencias
-    libros_recomendados = Libro.objects.filter(
-        categorias__id__in=preferencias_usuario,
-        activo=True
-    ).distinct().annotate(
-        avg_rating=Avg('puntuaciones__puntuacion'),
-        num_ratings=Count('puntuaciones')
-    ).order_by('-avg_rating')[:8]
-    
-    # Libros sugeridos (populares/general)
-    libros_sugeridos = Libro.objects.filter(
-        activo=True
-    ).annotate(
-        avg_rating=Avg('puntuaciones__puntuacion'),
-        num_ratings=Count('puntuaciones')
-    ).exclude(
-        id__in=[libro.id for libro in libros_recomendados]
-    ).order_by('-avg_rating')[:12]
+    # Lista materializada: la recalcula el worker (sril/recomendaciones.py)
+    secciones = leer_recomendaciones(usuario_actual, CAMPOS_TARJETA)
+    libros_recomendados = secciones['PREFERENCIAS']
+    libros_sugeridos = secciones['SIMILARES']
     
     context = {
-        'libros_recomendados': libros_recomendados,
-        'libros_sugeridos': libros_sugeridos,
+        'libros_recomendados': preparar_tarjetas(libros_recomendados),
+        'libros_sugeridos': preparar_tarjetas(libros_sugeridos),
     }
     return render(request, 'sril/recomendaciones.html', context)
 
@@ -0,0 +1,154 @@
+# sril/vistos.py
+"""
+Libros ya vistos por un usuario (puntuados o en su historial de lectura),
+como conjunto de bits.
+
+``Vistos`` reparte los ids en bloques de 65536 (al estilo de los roaring
+bitmaps) y guarda cada bloque como un entero de Python usado como mapa de
+bits: un usuario con libros de ids dispersos solo ocupa los bloques que
+usa, y comprobar un id es un desplazamiento de bits. El cálculo de las
+recomendaciones y el detalle de un libro filtran con él en memoria, sin las
+consultas ``libro_id__in=...`` que crecen con el historial.
+
+El conjunto se guarda serializado en ``VistosUsuario``, en la base de datos
+y no en la caché por proceso, para que el worker y todos los procesos web
+vean el mismo. Las señales de ``Puntuacion`` e ``HistorialLectura`` lo
+actualizan en la misma transacción que la escritura y crean la fila con su
+primer libro; para un usuario sin fila se lee de las tablas de origen.
+"""
+import struct
+
+from django.db import transaction
+
+BITS_BLOQUE = 16
+MASCARA = (1 << BITS_BLOQUE) - 1
+_CABECERA = struct.Struct('<II')
+
+
+class Vistos:
+    """Conjunto de ids de libro como ``{bloque: mapa de bits}``"""
+
+    def __init__(self, bloques=None):
+        self.bloques = dict(bloques or {})
+
+    @classmethod
+    def desde_ids(cls, libro_ids):
+        vistos = cls()
+        for libro_id in libro_ids:
+            vistos.agregar(libro_id)
+        return vistos
+
+    def agregar(self, libro_id):
+        bloque = libro_id >> BITS_BLOQUE
+        self.bloques[bloque] = self.bloques.get(bloque, 0) | (1 << (libro_id & MASCARA))
+
+    def quitar(self, libro_id):
+        bloque = libro_id >> BITS_BLOQUE
+        bits = self.bloques.get(bloque, 0) & ~(1 << (libro_id & MASCARA))
+        if bits:
+            self.bloques[bloque] = bits
+        else:
+            self.bloques.pop(bloque, None)
+
+    def a_bytes(self):
+        """``(bloque, longitud)`` en 8 bytes seguidos del mapa de bits de cada bloque"""
+        partes = []
+        for bloque in sorted(self.bloques):
+            bits = self.bloques[bloque]
+            longitud = (bits.bit_length() + 7) // 8
+            partes.append(_CABECERA.pack(bloque, longitud) + bits.to_bytes(longitud, 'little'))
+        return b''.join(partes)
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        vistos, posicion, datos = cls(), 0, bytes(datos)
+        while posicion < len(datos):
+            bloque, longitud = _CABECERA.unpack_from(datos, posicion)
+            posicion += _CABECERA.size
+            vistos.bloques[bloque] = int.from_bytes(datos[posicion:posicion + longitud], 'little')
+            posicion += longitud
+        return vistos
+
+    def __contains__(self, libro_id):
+        return bool((self.bloques.get(libro_id >> BITS_BLOQUE, 0) >> (libro_id & MASCARA)) & 1)
+
+    def __len__(self):
+        return sum(bits.bit_count() for bits in self.bloques.values())
+
+    def __iter__(self):
+        for bloque in sorted(self.bloques):
+            bits, base = self.bloques[bloque], bloque << BITS_BLOQUE
+            while bits:
+                menor = bits & -bits
+                yield base + menor.bit_length() - 1
+                bits ^= menor
+
+    def como_array(self):
+        """Los ids como array de NumPy, desempaquetando cada bloque de una vez"""
+        import numpy as np
+
+        partes = [np.array([], dtype=np.int64)]
+        for bloque in sorted(self.bloques):
+            bits = self.bloques[bloque]
+            octetos = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+            partes.append(np.flatnonzero(np.unpackbits(octetos, bitorder='little')) + (bloque << BITS_BLOQUE))
+        return np.concatenate(partes).astype(np.int64)
+
+
+def construir_vistos(usuario_id):
+    """Los libros vistos por el usuario, leídos de las tablas de origen"""
+    from .models import HistorialLectura, Puntuacion
+
+    vistos = Vistos.desde_ids(Puntuacion.objects.filter(usuario_id=usuario_id).values_list('libro_id', flat=True))
+    for libro_id in HistorialLectura.objects.filter(usuario_id=usuario_id).values_list('libro_id', flat=True):
+        vistos.agregar(libro_id)
+    return vistos
+
+
+def vistos_usuario(usuario_id):
+    """Los libros vistos por el usuario: una consulta por clave primaria"""
+    from .models import VistosUsuario
+
+    bits = VistosUsuario.objects.filter(usuario_id=usuario_id).values_list('bits', flat=True).first()
+    if bits is not None:
+        return Vistos.desde_bytes(bits)
+    # Sin fila aún (no ha puntuado ni leído nada): la lectura no escribe
+    return construir_vistos(usuario_id)
+
+
+def marcar_visto(usuario_id, libro_id):
+    """Añadir ``libro_id`` al conjunto guardado del usuario"""
+    from .models import VistosUsuario
+
+    with transaction.atomic():
+        fila = VistosUsuario.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        if fila is None:
+            # Se construye ya con la fila recién escrita en esta transacción
+            VistosUsuario.objects.bulk_create(
+                [VistosUsuario(usuario_id=usuario_id, bits=construir_vistos(usuario_id).a_bytes())],
+                ignore_conflicts=True,
+            )
+            return
+        vistos = Vistos.desde_bytes(fila.bits)
+        if libro_id not in vistos:
+            vistos.agregar(libro_id)
+            VistosUsuario.objects.filter(usuario_id=usuario_id).update(bits=vistos.a_bytes())
+
+
+def desmarcar_visto(usuario_id, libro_id):
+    """Quitar ``libro_id`` si el usuario ya no lo tiene puntuado ni en su historial"""
+    from .models import HistorialLectura, Puntuacion, VistosUsuario
+
+    with transaction.atomic():
+        fila = VistosUsuario.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        # Sin fila (o borrándose el usuario) no hay nada que quitar
+        if fila is None:
+            return
+        vistos = Vistos.desde_bytes(fila.bits)
+        if libro_id not in vistos:
+            return
+        relacion = {'usuario_id': usuario_id, 'libro_id': libro_id}
+        if Puntuacion.objects.filter(**relacion).exists() or HistorialLectura.objects.filter(**relacion).exists():
+            return
+        vistos.quitar(libro_id)
+        VistosUsuario.objects.filter(usuario_id=usuario_id).update(bits=vistos.a_bytes())